@@ -0,0 +1,182 @@
+"""
+并发激活压力测试
+
+准备若干个未激活的许可证，用不同的机器码同时发起大量 /validate 请求，
+检查每个许可证激活成功的设备数恰好等于席位数（默认 1）、数据库中的激活记录与成功的请求一致。
+发现超出席位的激活时以非零状态退出。
+
+    # 进程内多线程
+    python benchmarks/activation_race.py --requests 5000 --concurrency 64
+
+    # 两个服务器进程共享同一个数据库，通过 HTTP 并发激活
+    python benchmarks/activation_race.py --driver http --servers 2 --keys 10
+
+    # 每个许可证 5 个席位
+    python benchmarks/activation_race.py --seats 5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from server_bench import (BENCH_ADMIN_KEY, _import_server_module, seed_database,
+                          start_server)
+
+
+def _fire(send, jobs, concurrency: int):
+    """concurrency 个线程在同一时刻开始，依次发送 jobs 中的 (license_key, machine_code)"""
+    results = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency)
+    job_iter = iter(jobs)
+
+    def worker(index):
+        local = []
+        post = send(index)
+        barrier.wait()
+        while True:
+            with lock:
+                job = next(job_iter, None)
+            if job is None:
+                break
+            try:
+                body = post(job[0], job[1])
+            except Exception as e:
+                body = {'valid': False, 'message': f'请求失败: {e}'}
+            local.append((job[0], job[1], body))
+        with lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - started
+
+
+def inprocess_sender(db_path: str):
+    server = _import_server_module('server')
+    server.app.config['DATABASE'] = db_path
+    server.app.config['ADMIN_KEY'] = BENCH_ADMIN_KEY
+    server.app.config['RATE_LIMIT_ENABLED'] = False  # 所有请求都针对少数几个许可证
+    server.app.config['MAINTENANCE_ENABLED'] = False
+    server.init_db()
+
+    def send(index):
+        client = server.app.test_client()
+
+        def post(license_key, machine_code):
+            return client.post('/validate', json={'license_key': license_key,
+                                                  'machine_code': machine_code}).get_json()
+        return post
+    return send
+
+
+def http_sender(base_urls):
+    import requests
+
+    def send(index):
+        session = requests.Session()
+        base_url = base_urls[index % len(base_urls)]
+
+        def post(license_key, machine_code):
+            response = session.post(f'{base_url}/validate', timeout=60,
+                                    json={'license_key': license_key, 'machine_code': machine_code})
+            return response.json()
+        return post
+    return send
+
+
+def check(db_path: str, results, seats: int) -> dict:
+    """对比成功的请求和数据库中的激活记录，返回每个许可证的检查结果"""
+    storage = _import_server_module('storage')
+    winners = defaultdict(set)
+    messages = defaultdict(int)
+    for license_key, machine_code, body in results:
+        if body.get('valid'):
+            winners[license_key].add(machine_code)
+        else:
+            messages[body.get('message')] += 1
+
+    db = storage.Database(db_path)
+    with db.connection() as conn:
+        rows = conn.execute('''
+            SELECT l.license_key, l.activation_count, group_concat(a.machine_code, char(10))
+            FROM licenses l LEFT JOIN activations a ON a.license_id = l.id
+            GROUP BY l.id
+        ''').fetchall()
+    db.close()
+
+    problems = []
+    for license_key, activation_count, machines in rows:
+        won = winners.get(license_key, set())
+        machines = set(machines.split('\n')) if machines else set()
+        if len(won) != seats:
+            problems.append(f'{license_key}: {len(won)} 台设备激活成功，席位数为 {seats}')
+        elif machines != won:
+            problems.append(f'{license_key}: 数据库中的激活设备 {sorted(machines)} 与激活成功的设备不一致')
+        elif activation_count != seats:
+            problems.append(f'{license_key}: activation_count 为 {activation_count}，应为 {seats}')
+    return {
+        'licenses': len(rows),
+        'succeeded': sum(len(v) for v in winners.values()),
+        'rejected': dict(messages),
+        'problems': problems,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并发激活压力测试')
+    parser.add_argument('--driver', choices=['inprocess', 'http'], default='inprocess',
+                        help='进程内测试客户端，或启动本地服务器通过 HTTP 请求')
+    parser.add_argument('--servers', type=int, default=2, help='http 方式启动的服务器进程数')
+    parser.add_argument('--keys', type=int, default=1, help='被同时激活的许可证数量')
+    parser.add_argument('--seats', type=int, default=1, help='每个许可证的席位数')
+    parser.add_argument('--requests', type=int, default=2000, help='激活请求总数，每个请求使用不同的机器码')
+    parser.add_argument('--concurrency', type=int, default=64, help='并发线程数')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='license-race-')
+    db_path = os.path.join(workdir, 'licenses.db')
+    seed_database(db_path, args.keys, bound_ratio=0, expired_ratio=0, max_activations=args.seats)
+    storage = _import_server_module('storage')
+    db = storage.Database(db_path)
+    with db.connection() as conn:
+        keys = [row[0] for row in conn.execute('SELECT license_key FROM licenses ORDER BY id')]
+    db.close()
+    jobs = [(keys[i % len(keys)], f'race-machine-{i}') for i in range(args.requests)]
+
+    procs = []
+    try:
+        if args.driver == 'inprocess':
+            os.chdir(workdir)  # server.log 写入临时目录
+            send = inprocess_sender(db_path)
+        else:
+            base_urls = []
+            for _ in range(args.servers):
+                proc, base_url = start_server(db_path, workdir)
+                procs.append(proc)
+                base_urls.append(base_url)
+            send = http_sender(base_urls)
+
+        results, elapsed = _fire(send, jobs, args.concurrency)
+        report = check(db_path, results, args.seats)
+        report['requests'] = len(results)
+        report['elapsed_seconds'] = round(elapsed, 3)
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        sys.exit(1 if report['problems'] else 0)
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
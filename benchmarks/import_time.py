@@ -0,0 +1,98 @@
+"""
+导入耗时基准
+
+使用 python -X importtime 在独立进程中测量导入语句的耗时，
+超出预算或加载了不应加载的重量级模块时以非零状态退出，可用于 CI 守护。
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --statement "import license_generator.cli" --budget-ms 80
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARKER = '--- import benchmark start ---'
+
+# 仅使用验证器的程序不应加载的模块
+DEFAULT_FORBIDDEN = ['PyQt6', 'requests', 'wmi', 'cryptography']
+
+# 子进程：导入前写入标记，导入后输出已加载的模块
+_CHILD = '''
+import sys
+sys.stderr.write({marker!r} + "\\n")
+{statement}
+sys.stderr.flush()
+print(__import__("json").dumps(sorted(sys.modules)))
+'''
+
+
+def measure(statement: str) -> dict:
+    """运行一次导入并解析 -X importtime 的输出"""
+    code = _CHILD.format(marker=MARKER, statement=statement)
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, env=env, cwd=ROOT,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+
+    lines = proc.stderr.splitlines()
+    lines = lines[lines.index(MARKER) + 1:]
+    total_us = 0
+    modules = []
+    for line in lines:
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if self_us.strip() == 'self [us]':
+            continue
+        modules.append((name.strip(), int(self_us)))
+        # 顶层条目的累计耗时之和即为整条导入语句的耗时
+        if not name[1:].startswith(' '):
+            total_us += int(cumulative_us)
+    modules.sort(key=lambda item: item[1], reverse=True)
+    return {
+        'total_ms': total_us / 1000,
+        'top_modules': [{'module': m, 'self_ms': us / 1000} for m, us in modules[:10]],
+        'loaded': json.loads(proc.stdout),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='导入耗时基准')
+    parser.add_argument('--statement', default='from license_system import LicenseValidator',
+                        help='要测量的导入语句')
+    parser.add_argument('--budget-ms', type=float, default=50.0, help='耗时预算（毫秒，取多次运行的中位数）')
+    parser.add_argument('--runs', type=int, default=5, help='运行次数')
+    parser.add_argument('--forbid', action='append', default=None,
+                        help='不允许被加载的模块，可重复指定，默认为 PyQt6/requests/wmi/cryptography')
+    args = parser.parse_args()
+    forbidden = args.forbid if args.forbid is not None else DEFAULT_FORBIDDEN
+
+    results = [measure(args.statement) for _ in range(args.runs)]
+    totals = sorted(r['total_ms'] for r in results)
+    median = totals[len(totals) // 2]
+    loaded = results[0]['loaded']
+    leaked = sorted({m.split('.')[0] for m in loaded} & set(forbidden))
+
+    report = {
+        'statement': args.statement,
+        'runs': args.runs,
+        'median_ms': round(median, 3),
+        'min_ms': round(totals[0], 3),
+        'max_ms': round(totals[-1], 3),
+        'budget_ms': args.budget_ms,
+        'forbidden_loaded': leaked,
+        'top_modules': results[0]['top_modules'],
+        'passed': median <= args.budget_ms and not leaked,
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sys.exit(0 if report['passed'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,488 @@
+"""
+许可证服务器负载测试
+
+在本机准备指定规模的 licenses.db，按配置的请求比例压测
+/validate、/admin/generate、/admin/licenses 和 /admin/deactivate，
+以 JSON 输出吞吐量和 p50/p95/p99 延迟，便于比较不同版本。完全离线运行。
+
+    # 使用 Flask 测试客户端在进程内压测
+    python benchmarks/server_bench.py --licenses 100000 --driver inprocess
+
+    # 启动本地服务器，用多线程或 asyncio 客户端压测
+    python benchmarks/server_bench.py --licenses 1000000 --driver threaded --concurrency 16
+    python benchmarks/server_bench.py --driver asyncio --concurrency 64 --output result.json
+
+    # 压测已在运行的服务器（需要已有数据）
+    python benchmarks/server_bench.py --url http://127.0.0.1:5000 --admin-key xxx --driver threaded
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_DIR = os.path.join(ROOT, 'license_server')
+
+DEFAULT_MIX = 'validate=90,list=5,generate=3,deactivate=2'
+BENCH_ADMIN_KEY = 'bench-admin-key'
+
+
+def _import_server_module(name: str):
+    """license_server 以脚本方式运行，模块之间使用顶层导入"""
+    if SERVER_DIR not in sys.path:
+        sys.path.insert(0, SERVER_DIR)
+    return __import__(name)
+
+
+# ---------------------------------------------------------------------------
+# 数据准备
+# ---------------------------------------------------------------------------
+
+def seed_database(path: str, count: int, bound_ratio: float = 0.5,
+                  expired_ratio: float = 0.05, chunk_size: int = 50000, max_activations: int = 1):
+    """
+    创建数据库并写入 count 条许可证
+
+    bound_ratio 比例的许可证预先激活到 bench-machine-<id>，
+    expired_ratio 比例的许可证已过期。
+    """
+    storage = _import_server_module('storage')
+    migrations = _import_server_module('migrations')
+
+    db = storage.Database(path, pragmas={'synchronous': 'OFF'})
+    migrations.migrate(db)
+    now = int(time.time())
+    rng = random.Random(42)
+
+    with db.connection() as conn:
+        start_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM licenses').fetchone()[0]
+    for offset in range(0, count, chunk_size):
+        rows, activations = [], []
+        for i in range(start_id + offset + 1, start_id + min(offset + chunk_size, count) + 1):
+            if rng.random() < bound_ratio:
+                activations.append((i, f'bench-machine-{i}', now, now))
+            if rng.random() < expired_ratio:
+                expires_at = now - rng.randint(1, 365) * 86400
+            else:
+                expires_at = now + rng.randint(30, 730) * 86400
+            rows.append((i, str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                         now, expires_at, max_activations))
+        with db.transaction() as conn:
+            conn.executemany('''
+                INSERT INTO licenses (id, license_key, created_at, expires_at, max_activations)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            conn.executemany('''
+                INSERT INTO activations (license_id, machine_code, first_seen, last_seen)
+                VALUES (?, ?, ?, ?)
+            ''', activations)
+    db.close()
+
+
+def sample_licenses(path: str, size: int = 20000):
+    """随机抽取一部分许可证作为压测用的密钥池"""
+    storage = _import_server_module('storage')
+    db = storage.Database(path)
+    with db.connection() as conn:
+        max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM licenses').fetchone()[0]
+        rows = conn.execute('''
+            SELECT id, license_key,
+                   (SELECT machine_code FROM activations WHERE license_id = licenses.id LIMIT 1)
+            FROM licenses
+            WHERE id IN (SELECT abs(random()) % ? + 1 FROM licenses LIMIT ?)
+        ''', (max(max_id, 1), size)).fetchall()
+    db.close()
+    return max_id, rows
+
+
+# ---------------------------------------------------------------------------
+# 请求组合
+# ---------------------------------------------------------------------------
+
+class Workload:
+    """按权重随机生成请求，返回 (操作名, 方法, 路径, 请求体)"""
+
+    def __init__(self, mix: dict, samples, max_id: int, miss_ratio: float = 0.05, seed: int = None):
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.samples = samples
+        self.max_id = max(max_id, 1)
+        self.miss_ratio = miss_ratio
+        self.rng = random.Random(seed)
+
+    def next_request(self):
+        op = self.rng.choices(self.operations, self.weights)[0]
+        return (op,) + getattr(self, f'_{op}')()
+
+    def _validate(self):
+        if not self.samples or self.rng.random() < self.miss_ratio:
+            body = {'license_key': str(uuid.uuid4()), 'machine_code': 'bench-unknown'}
+        else:
+            license_id, license_key, machine_code = self.rng.choice(self.samples)
+            body = {'license_key': license_key,
+                    'machine_code': machine_code or f'bench-machine-{license_id}'}
+        return 'POST', '/validate', body
+
+    def _generate(self):
+        return 'POST', '/admin/generate', {}
+
+    def _list(self):
+        after = self.rng.randint(0, self.max_id)
+        return 'GET', f'/admin/licenses?limit=100&after={after}', None
+
+    def _deactivate(self):
+        if not self.samples:
+            return 'POST', '/admin/deactivate', {'license_key': str(uuid.uuid4())}
+        return 'POST', '/admin/deactivate', {'license_key': self.rng.choice(self.samples)[1]}
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for item in value.split(','):
+        name, weight = item.split('=')
+        if name not in ('validate', 'generate', 'list', 'deactivate'):
+            raise argparse.ArgumentTypeError(f'未知操作: {name}')
+        mix[name] = float(weight)
+    return mix
+
+
+class Recorder:
+    """线程安全地收集每个操作的延迟（秒）和错误数"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, op: str, latency: float, ok: bool):
+        with self._lock:
+            self.latencies.setdefault(op, []).append(latency)
+            if not ok:
+                self.errors[op] = self.errors.get(op, 0) + 1
+
+    def merge(self, other: 'Recorder'):
+        for op, values in other.latencies.items():
+            self.latencies.setdefault(op, []).extend(values)
+        for op, n in other.errors.items():
+            self.errors[op] = self.errors.get(op, 0) + n
+
+
+# ---------------------------------------------------------------------------
+# 压测驱动
+# ---------------------------------------------------------------------------
+
+def _run_threads(worker, concurrency: int, duration: float) -> float:
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=worker, args=(i, deadline)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started
+
+
+def run_inprocess(make_workload, recorder, concurrency: int, duration: float, db_path: str):
+    """使用 Flask 测试客户端在进程内压测，不经过网络协议栈"""
+    server = _import_server_module('server')
+    server.app.config['DATABASE'] = db_path
+    server.app.config['ADMIN_KEY'] = BENCH_ADMIN_KEY
+    server.app.config['RATE_LIMIT_ENABLED'] = False  # 压测请求都来自同一 IP
+    server.app.config['MAINTENANCE_ENABLED'] = False  # 备份等后台任务会干扰测量
+    server.init_db()
+    headers = {'X-Admin-Key': BENCH_ADMIN_KEY}
+
+    def worker(index, deadline):
+        client = server.app.test_client()
+        workload = make_workload(index)
+        while time.perf_counter() < deadline:
+            op, method, path, body = workload.next_request()
+            started = time.perf_counter()
+            response = client.open(path, method=method, json=body, headers=headers)
+            response.get_data()
+            recorder.add(op, time.perf_counter() - started, response.status_code == 200)
+
+    return _run_threads(worker, concurrency, duration)
+
+
+def run_threaded(make_workload, recorder, concurrency: int, duration: float, base_url: str,
+                 admin_key: str):
+    """每个线程一个 keep-alive Session，通过 HTTP 压测"""
+    import requests
+
+    headers = {'X-Admin-Key': admin_key}
+
+    def worker(index, deadline):
+        session = requests.Session()
+        workload = make_workload(index)
+        while time.perf_counter() < deadline:
+            op, method, path, body = workload.next_request()
+            started = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, json=body, headers=headers,
+                                           timeout=30)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            recorder.add(op, time.perf_counter() - started, ok)
+        session.close()
+
+    return _run_threads(worker, concurrency, duration)
+
+
+class _AsyncHttpConnection:
+    """仅依赖标准库的最小 HTTP/1.1 客户端，支持 keep-alive 和 chunked 响应"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method: str, path: str, headers: dict, body: bytes) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}',
+                 f'Content-Length: {len(body)}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif 'content-length' in response_headers:
+            await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            await self.reader.read()
+            response_headers['connection'] = 'close'
+
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.reader = self.writer = None
+
+
+def run_asyncio(make_workload, recorder, concurrency: int, duration: float, base_url: str,
+                admin_key: str):
+    """单线程 asyncio 事件循环，每个协程一个连接"""
+    url = urlsplit(base_url)
+    headers = {'X-Admin-Key': admin_key, 'Content-Type': 'application/json'}
+
+    async def worker(index, deadline):
+        connection = _AsyncHttpConnection(url.hostname, url.port or 80)
+        workload = make_workload(index)
+        while time.perf_counter() < deadline:
+            op, method, path, body = workload.next_request()
+            payload = json.dumps(body).encode('utf-8') if body is not None else b''
+            started = time.perf_counter()
+            try:
+                ok = await connection.request(method, path, headers, payload) == 200
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                ok = False
+                await connection.close()
+            recorder.add(op, time.perf_counter() - started, ok)
+        await connection.close()
+
+    async def run_all():
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(worker(i, deadline) for i in range(concurrency)))
+
+    started = time.perf_counter()
+    asyncio.run(run_all())
+    return time.perf_counter() - started
+
+
+# ---------------------------------------------------------------------------
+# 本地服务器
+# ---------------------------------------------------------------------------
+
+_SERVER_BOOTSTRAP = '''
+import sys, logging
+sys.path.insert(0, {server_dir!r})
+from werkzeug.serving import WSGIRequestHandler
+WSGIRequestHandler.protocol_version = "HTTP/1.1"  # 允许客户端复用连接
+import server
+server.app.config["ADMIN_KEY"] = {admin_key!r}
+server.app.config["RATE_LIMIT_ENABLED"] = False  # 压测请求都来自同一 IP
+server.app.config["MAINTENANCE_ENABLED"] = False  # 备份等后台任务会干扰测量
+server.init_db()
+logging.getLogger().setLevel(logging.WARNING)
+logging.getLogger("werkzeug").setLevel(logging.ERROR)
+server.app.run(host="127.0.0.1", port={port}, threaded=True)
+'''
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_path: str, workdir: str, port: int = None, timeout: float = 30):
+    """在子进程中启动服务器，返回 (进程, 地址)"""
+    port = port or _free_port()
+    code = _SERVER_BOOTSTRAP.format(server_dir=SERVER_DIR, admin_key=BENCH_ADMIN_KEY, port=port)
+    env = dict(os.environ, LICENSE_DB_PATH=db_path)
+    proc = subprocess.Popen([sys.executable, '-c', code], cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('服务器启动失败')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return proc, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError('等待服务器启动超时')
+
+
+# ---------------------------------------------------------------------------
+# 报告
+# ---------------------------------------------------------------------------
+
+def _percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        'requests': count,
+        'errors': errors,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(values) / count * 1000, 3) if count else 0.0,
+        'p50_ms': round(_percentile(values, 50) * 1000, 3),
+        'p95_ms': round(_percentile(values, 95) * 1000, 3),
+        'p99_ms': round(_percentile(values, 99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def build_report(args, recorder: Recorder, elapsed: float) -> dict:
+    all_latencies = [v for values in recorder.latencies.values() for v in values]
+    return {
+        'config': {
+            'driver': args.driver,
+            'licenses': args.licenses,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'mix': args.mix,
+            'miss_ratio': args.miss_ratio,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'elapsed_s': round(elapsed, 3),
+        'total': summarize(all_latencies, sum(recorder.errors.values()), elapsed),
+        'operations': {
+            op: summarize(values, recorder.errors.get(op, 0), elapsed)
+            for op, values in sorted(recorder.latencies.items())
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='许可证服务器负载测试')
+    parser.add_argument('--driver', choices=['inprocess', 'threaded', 'asyncio'], default='inprocess',
+                        help='压测方式')
+    parser.add_argument('--licenses', type=int, default=10000, help='准备的许可证数量（1k 到 1M）')
+    parser.add_argument('--db', help='数据库路径，已存在时直接使用，默认在临时目录中新建')
+    parser.add_argument('--url', help='压测已在运行的服务器，而不是启动本地服务器')
+    parser.add_argument('--admin-key', default=BENCH_ADMIN_KEY, help='配合 --url 使用的管理员密钥')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发数（线程或协程）')
+    parser.add_argument('--duration', type=float, default=10.0, help='压测时长（秒）')
+    parser.add_argument('--warmup', type=float, default=1.0, help='预热时长（秒），不计入结果')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'各操作的权重，默认 {DEFAULT_MIX}')
+    parser.add_argument('--miss-ratio', type=float, default=0.05, help='验证请求中不存在的密钥比例')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+    parser.add_argument('--output', help='将 JSON 报告写入文件，默认输出到终端')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='license-bench-')
+    db_path = os.path.abspath(args.db or os.path.join(workdir, 'licenses.db'))
+    server_proc = None
+    try:
+        if args.url is None and not os.path.exists(db_path):
+            started = time.perf_counter()
+            seed_database(db_path, args.licenses)
+            print(f'已写入 {args.licenses} 条许可证，耗时 {time.perf_counter() - started:.1f}s',
+                  file=sys.stderr)
+
+        max_id, samples = sample_licenses(db_path) if args.url is None else (args.licenses, [])
+
+        def make_workload(index):
+            seed = None if args.seed is None else args.seed + index
+            return Workload(args.mix, samples, max_id, args.miss_ratio, seed)
+
+        if args.driver == 'inprocess':
+            os.chdir(workdir)  # server.log 写入临时目录
+            run = lambda rec, duration: run_inprocess(make_workload, rec, args.concurrency,
+                                                      duration, db_path)
+        else:
+            base_url, admin_key = args.url, args.admin_key
+            if base_url is None:
+                server_proc, base_url = start_server(db_path, workdir)
+                admin_key = BENCH_ADMIN_KEY
+            driver = run_threaded if args.driver == 'threaded' else run_asyncio
+            run = lambda rec, duration: driver(make_workload, rec, args.concurrency, duration,
+                                               base_url.rstrip('/'), admin_key)
+
+        if args.warmup > 0:
+            run(Recorder(), args.warmup)
+        recorder = Recorder()
+        elapsed = run(recorder, args.duration)
+
+        report = json.dumps(build_report(args, recorder, elapsed), indent=2, ensure_ascii=False)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(report + '\n')
+        else:
+            print(report)
+    finally:
+        if server_proc is not None:
+            server_proc.terminate()
+            server_proc.wait()
+
+
+if __name__ == '__main__':
+    main()
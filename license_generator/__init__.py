@@ -1,4 +1,22 @@
-from .gui import LicenseGeneratorWindow
-from .cli import LicenseGenerator
+import importlib
 
-__all__ = ['LicenseGeneratorWindow', 'LicenseGenerator'] 
\ No newline at end of file
+__all__ = ['LicenseGeneratorWindow', 'LicenseGenerator']
+
+# 按需导入：命令行工具不会加载 PyQt6
+_lazy_attrs = {
+    'LicenseGeneratorWindow': '.gui',
+    'LicenseGenerator': '.cli',
+}
+
+
+def __getattr__(name):
+    module = _lazy_attrs.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,29 +1,52 @@
+import os
 import argparse
-import requests
 import json
 from datetime import datetime, timedelta
+from license_system.transport import get_transport
+
+# 批量操作上传文件的扩展名与 Content-Type，其他扩展名按每行一个密钥处理
+BULK_CONTENT_TYPES = {
+    '.csv': 'text/csv',
+    '.ndjson': 'application/x-ndjson',
+    '.jsonl': 'application/x-ndjson',
+}
 
 class LicenseGenerator:
-    def __init__(self, server_url: str, admin_key: str):
+    def __init__(self, server_url: str, admin_key: str, read_timeout: float = 60,
+                 max_retries: int = 3):
+        """
+        Args:
+            server_url: 许可证服务器地址
+            admin_key: 管理员密钥
+            read_timeout: 等待服务器响应的超时时间（秒）
+            max_retries: 网络错误时的最大重试次数
+        """
         self.server_url = server_url
         self.admin_key = admin_key
+        # 同一进程内的所有管理操作复用一个 keep-alive 连接池
+        self.transport = get_transport(server_url, read_timeout=read_timeout,
+                                       max_retries=max_retries)
         
-    def generate_license(self, expires_days: int = None) -> str:
+    def generate_license(self, expires_days: int = None, product: int = 0, edition: int = 0,
+                         max_activations: int = 1) -> str:
         """
         生成新的许可证
         
         Args:
             expires_days: 许可证有效期（天数），None表示永久有效
+            product: 写入密钥的产品编号
+            edition: 写入密钥的版本类型编号
+            max_activations: 可同时激活的设备数量
         """
         expires_at = None
         if expires_days:
             expires_at = (datetime.now() + timedelta(days=expires_days)).strftime('%Y-%m-%d %H:%M:%S')
             
-        response = requests.post(
-            f"{self.server_url}/admin/generate",
+        response = self.transport.post(
+            '/admin/generate',
             headers={'X-Admin-Key': self.admin_key},
-            json={'expires_at': expires_at},
-            verify=False
+            json={'expires_at': expires_at, 'product': product, 'edition': edition,
+                  'max_activations': max_activations}
         )
         
         if response.status_code == 200:
@@ -32,50 +55,231 @@ class LicenseGenerator:
                 return result['license_key']
         raise Exception(f"生成许可证失败: {response.text}")
         
-    def list_licenses(self) -> list:
-        """获取所有许可证列表"""
-        response = requests.get(
-            f"{self.server_url}/admin/licenses",
+    def generate_licenses(self, count: int, expires_days: int = None, metadata: dict = None,
+                          product: int = 0, edition: int = 0, max_activations: int = 1):
+        """
+        批量生成许可证，服务器以 NDJSON 流式返回，逐个产出密钥
+        
+        Args:
+            count: 生成数量
+            expires_days: 许可证有效期（天数），None表示永久有效
+            metadata: 所有许可证共用的附加信息
+            product: 写入密钥的产品编号
+            edition: 写入密钥的版本类型编号
+            max_activations: 每个许可证可同时激活的设备数量
+        """
+        expires_at = None
+        if expires_days:
+            expires_at = (datetime.now() + timedelta(days=expires_days)).strftime('%Y-%m-%d %H:%M:%S')
+            
+        with self.transport.post(
+            '/admin/generate',
             headers={'X-Admin-Key': self.admin_key},
-            verify=False
-        )
+            json={'count': count, 'expires_at': expires_at, 'metadata': metadata,
+                  'product': product, 'edition': edition, 'max_activations': max_activations},
+            stream=True
+        ) as response:
+            if response.status_code != 200:
+                raise Exception(f"生成许可证失败: {response.text}")
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                item = json.loads(line)
+                if 'error' in item:
+                    raise Exception(f"生成许可证失败（已生成 {item.get('created', 0)} 个）: {item['error']}")
+                yield item['license_key']
         
-        if response.status_code == 200:
-            return response.json()
-        raise Exception(f"获取许可证列表失败: {response.text}")
+    def list_licenses(self, page_size: int = 500, **filters):
+        """
+        按页获取许可证列表，逐条产出，不会一次性加载全部记录
+        
+        Args:
+            page_size: 每次请求的记录数
+            filters: 服务器支持的过滤条件，如 active=1、expired=0、bound=1、seats_full=1、machine_code=xxx
+        """
+        after = 0
+        while True:
+            response = self.transport.get(
+                '/admin/licenses',
+                headers={'X-Admin-Key': self.admin_key},
+                params=dict(filters, limit=page_size, after=after)
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"获取许可证列表失败: {response.text}")
+            page = response.json()
+            yield from page['items']
+            
+            after = page['next_cursor']
+            if after is None:
+                return
         
     def deactivate_license(self, license_key: str) -> bool:
         """禁用许可证"""
-        response = requests.post(
-            f"{self.server_url}/admin/deactivate",
+        response = self.transport.post(
+            '/admin/deactivate',
             headers={'X-Admin-Key': self.admin_key},
             json={'license_key': license_key},
-            verify=False
+            idempotent=True
+        )
+        
+        if response.status_code == 200:
+            return response.json().get('success', False)
+        return False
+        
+    def _post_bulk(self, path: str, description: str, body: dict, input_path: str = None) -> dict:
+        """
+        发送批量操作请求
+
+        指定 input_path 时以文件对象作为请求体边读边发送，不把文件读入内存，
+        body 中的参数通过查询参数传递；否则 body 作为 JSON 请求体。
+        """
+        headers = {'X-Admin-Key': self.admin_key}
+        if input_path:
+            extension = os.path.splitext(input_path)[1].lower()
+            headers['Content-Type'] = BULK_CONTENT_TYPES.get(extension, 'text/plain')
+            with open(input_path, 'rb') as f:
+                response = self.transport.post(path, headers=headers, params=body, data=f)
+        else:
+            response = self.transport.post(path, headers=headers, json=body)
+        
+        if response.status_code == 200:
+            return response.json()
+        try:
+            error = response.json().get('error', response.text)
+        except ValueError:
+            error = response.text
+        raise Exception(f"{description}失败: {error}")
+        
+    def bulk_deactivate(self, filters: dict = None, input_path: str = None,
+                        all_licenses: bool = False) -> dict:
+        """
+        批量禁用许可证，服务器在一个事务中完成
+        
+        Args:
+            filters: 过滤条件，如 {'metadata.reseller': 'acme'}
+            input_path: 密钥列表文件（.csv、.ndjson/.jsonl 或每行一个密钥），指定后忽略 filters
+            all_licenses: 未指定过滤条件时必须为 True，表示禁用全部许可证
+            
+        Returns:
+            {'matched': 匹配数, 'affected': 实际禁用数, 'received': 文件中的密钥数}
+        """
+        body = {} if input_path else {'filter': filters or {}, 'all': all_licenses}
+        return self._post_bulk('/admin/bulk/deactivate', '批量禁用许可证', body, input_path)
+        
+    def extend_licenses(self, days: int = None, expires_at: str = None, filters: dict = None,
+                        input_path: str = None, all_licenses: bool = False) -> dict:
+        """
+        批量修改许可证有效期
+        
+        Args:
+            days: 在原过期时间上增加的天数，永久许可证不受影响
+            expires_at: 直接设置的过期时间（YYYY-MM-DD[ HH:MM:SS]），空字符串表示永久有效
+            filters/input_path/all_licenses: 同 bulk_deactivate
+        """
+        body = {'days': days} if days is not None else {'expires_at': expires_at}
+        if not input_path:
+            body.update({'filter': filters or {}, 'all': all_licenses})
+        return self._post_bulk('/admin/bulk/extend', '批量修改有效期', body, input_path)
+        
+    def import_licenses(self, input_path: str) -> dict:
+        """
+        从 .csv 或 .ndjson/.jsonl 文件导入其他系统的许可证，已存在的密钥被跳过
+        
+        Returns:
+            {'received', 'imported', 'skipped', 'duplicates', 'invalid', 'errors'}
+        """
+        return self._post_bulk('/admin/bulk/import', '导入许可证', {}, input_path)
+        
+    def list_activations(self, license_key: str) -> dict:
+        """获取许可证的席位数和已激活的设备"""
+        response = self.transport.get(
+            '/admin/activations',
+            headers={'X-Admin-Key': self.admin_key},
+            params={'license_key': license_key}
+        )
+        
+        if response.status_code == 200:
+            return response.json()
+        raise Exception(f"获取激活记录失败: {response.json().get('error', response.text)}")
+        
+    def release_activation(self, license_key: str, machine_code: str) -> bool:
+        """释放设备占用的席位"""
+        response = self.transport.post(
+            '/admin/release',
+            headers={'X-Admin-Key': self.admin_key},
+            json={'license_key': license_key, 'machine_code': machine_code},
+            idempotent=True
         )
         
         if response.status_code == 200:
             return response.json().get('success', False)
         return False
+        
+    def transfer_activation(self, license_key: str, from_machine_code: str, to_machine_code: str) -> bool:
+        """将席位从一台设备转移到另一台设备"""
+        response = self.transport.post(
+            '/admin/transfer',
+            headers={'X-Admin-Key': self.admin_key},
+            json={'license_key': license_key, 'from_machine_code': from_machine_code,
+                  'to_machine_code': to_machine_code}
+        )
+        
+        if response.status_code == 200:
+            return response.json().get('success', False)
+        raise Exception(f"转移席位失败: {response.json().get('error', response.text)}")
 
 def main():
     parser = argparse.ArgumentParser(description='许可证生成工具')
     parser.add_argument('--server', default='http://localhost:5000', help='许可证服务器地址')
     parser.add_argument('--admin-key', required=True, help='管理员密钥')
-    parser.add_argument('--action', choices=['generate', 'list', 'deactivate'], required=True, help='操作类型')
+    parser.add_argument('--action', choices=['generate', 'list', 'deactivate', 'activations', 'release', 'transfer',
+                                             'bulk-deactivate', 'extend', 'import'],
+                        required=True, help='操作类型')
     parser.add_argument('--expires', type=int, help='许可证有效期（天数）')
-    parser.add_argument('--license-key', help='要禁用的许可证密钥')
+    parser.add_argument('--license-key', help='要禁用或管理席位的许可证密钥')
+    parser.add_argument('--count', type=int, help='批量生成的许可证数量')
+    parser.add_argument('--output', help='批量生成时保存密钥的文件，默认输出到终端')
+    parser.add_argument('--product', type=int, default=0, help='写入密钥的产品编号（0-4095）')
+    parser.add_argument('--edition', type=int, default=0, help='写入密钥的版本类型编号（0-15）')
+    parser.add_argument('--seats', type=int, default=1, help='每个许可证可同时激活的设备数量')
+    parser.add_argument('--machine-code', help='要释放席位或转出席位的设备机器码')
+    parser.add_argument('--to-machine-code', help='转移席位的目标设备机器码')
+    parser.add_argument('--filter', action='append', default=[], metavar='NAME=VALUE',
+                        help='列出或批量修改许可证时的过滤条件，如 active=1、expired=0、bound=1、'
+                             'metadata.reseller=xxx，可重复指定')
+    parser.add_argument('--input', help='批量操作读取的文件：密钥列表或要导入的许可证（.csv、.ndjson/.jsonl）')
+    parser.add_argument('--all', action='store_true', help='未指定过滤条件时，确认批量修改全部许可证')
+    parser.add_argument('--days', type=int, help='批量延长有效期的天数')
+    parser.add_argument('--expires-at', help='批量设置的过期时间（YYYY-MM-DD），空字符串表示永久有效')
     
     args = parser.parse_args()
     generator = LicenseGenerator(args.server, args.admin_key)
     
     try:
         if args.action == 'generate':
-            license_key = generator.generate_license(args.expires)
-            print(f"生成的许可证密钥: {license_key}")
+            if args.count:
+                keys = generator.generate_licenses(args.count, args.expires, product=args.product,
+                                                   edition=args.edition, max_activations=args.seats)
+                if args.output:
+                    written = 0
+                    with open(args.output, 'w', encoding='utf-8') as f:
+                        for license_key in keys:
+                            f.write(license_key + '\n')
+                            written += 1
+                    print(f"已生成 {written} 个许可证密钥，保存到 {args.output}")
+                else:
+                    for license_key in keys:
+                        print(license_key)
+            else:
+                license_key = generator.generate_license(args.expires, args.product, args.edition,
+                                                         args.seats)
+                print(f"生成的许可证密钥: {license_key}")
             
         elif args.action == 'list':
-            licenses = generator.list_licenses()
-            print(json.dumps(licenses, indent=2, ensure_ascii=False))
+            filters = dict(f.split('=', 1) for f in args.filter)
+            for item in generator.list_licenses(**filters):
+                print(json.dumps(item, ensure_ascii=False))
             
         elif args.action == 'deactivate':
             if not args.license_key:
@@ -84,6 +288,58 @@ def main():
             success = generator.deactivate_license(args.license_key)
             print(f"禁用许可证 {args.license_key}: {'成功' if success else '失败'}")
             
+        elif args.action == 'activations':
+            if not args.license_key:
+                print("错误: 需要提供许可证密钥")
+                return
+            result = generator.list_activations(args.license_key)
+            print(f"许可证 {result['license_key']} 已用席位: {result['seats_used']}/{result['max_activations']}")
+            for item in result['activations']:
+                print(f"  {item['machine_code']}  首次激活 {item['first_seen']}  最后验证 {item['last_seen']}")
+            
+        elif args.action == 'release':
+            if not args.license_key or not args.machine_code:
+                print("错误: 需要提供许可证密钥和机器码")
+                return
+            success = generator.release_activation(args.license_key, args.machine_code)
+            print(f"释放设备 {args.machine_code} 的席位: {'成功' if success else '失败'}")
+            
+        elif args.action == 'transfer':
+            if not args.license_key or not args.machine_code or not args.to_machine_code:
+                print("错误: 需要提供许可证密钥、原设备机器码和目标设备机器码")
+                return
+            generator.transfer_activation(args.license_key, args.machine_code, args.to_machine_code)
+            print(f"席位已从设备 {args.machine_code} 转移到 {args.to_machine_code}")
+            
+        elif args.action in ('bulk-deactivate', 'extend'):
+            filters = dict(f.split('=', 1) for f in args.filter)
+            if args.action == 'bulk-deactivate':
+                result = generator.bulk_deactivate(filters, args.input, args.all)
+                done = '禁用'
+            else:
+                if (args.days is None) == (args.expires_at is None):
+                    print("错误: 需要提供 --days 或 --expires-at 之一")
+                    return
+                result = generator.extend_licenses(args.days, args.expires_at, filters,
+                                                   args.input, args.all)
+                done = '修改有效期'
+            if 'received' in result:
+                print(f"文件中的密钥: {result['received']}")
+            print(f"匹配 {result['matched']} 个许可证，{done} {result['affected']} 个")
+            
+        elif args.action == 'import':
+            if not args.input:
+                print("错误: 需要提供 --input 文件")
+                return
+            result = generator.import_licenses(args.input)
+            print(f"读取 {result['received']} 行，导入 {result['imported']} 个，"
+                  f"跳过已存在 {result['skipped']} 个，输入中重复 {result.get('duplicates', 0)} 行，"
+                  f"无效 {result['invalid']} 行")
+            for error in result['errors']:
+                print(f"  第 {error['line']} 行: {error['error']}")
+            if result.get('hint'):
+                print(f"提示: {result['hint']}")
+            
     except Exception as e:
         print(f"错误: {str(e)}")
 
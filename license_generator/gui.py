@@ -1,11 +1,20 @@
+import os
 import sys
-import requests
+import csv
+import json
+import time
 import logging
+import threading
 from datetime import datetime
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QPushButton, QTextEdit, QLabel, QLineEdit, QMessageBox,
-                            QDateTimeEdit, QHBoxLayout, QCheckBox)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QDateTime
+                            QDateTimeEdit, QHBoxLayout, QCheckBox, QTabWidget, QTableView,
+                            QComboBox, QHeaderView, QMenu, QAbstractItemView, QSpinBox,
+                            QProgressBar, QFileDialog)
+from PyQt6.QtCore import (Qt, QThread, pyqtSignal, pyqtSlot, QDateTime, QObject, QTimer,
+                          QAbstractTableModel, QModelIndex)
+from PyQt6.QtGui import QColor
+from license_system.transport import get_transport
 
 # 配置日志
 logging.basicConfig(
@@ -17,80 +26,614 @@ logging.basicConfig(
     ]
 )
 
-class GenerateThread(QThread):
-    """后台生成许可证的线程"""
-    success = pyqtSignal(dict)  # 成功信号
-    error = pyqtSignal(str)     # 错误信号
+BATCH_REQUEST_SIZE = 1000     # 批量生成时每个请求生成的数量，取消在两个请求之间生效
+BATCH_MAX_COUNT = 1000000     # 界面上允许一次批量生成的最大数量
+PROGRESS_INTERVAL = 0.1       # 进度信号的最小间隔（秒），避免大量信号阻塞界面线程
+EXPORT_BUFFER_SIZE = 1 << 20  # 导出文件的写缓冲大小
+EXPORT_FORMATS = {'CSV': 'csv', 'JSON': 'json'}
+SINGLE_KEYS_FILE = 'license_keys.txt'  # 单个生成的密钥追加保存的文件
+
+class KeyExportWriter:
+    """
+    生成结果的导出文件
+
+    写入经过 1 MB 的缓冲，每个生成请求结束后刷新一次，而不是每个密钥打开一次文件。
+    JSON 格式输出为数组，关闭时写入结尾的 ]；text 格式每行一个密钥，用于单个生成时追加保存。
+    """
     
-    def __init__(self, server_url, admin_key, expires_at=None):
-        super().__init__()
+    def __init__(self, path, export_format='csv', append=False):
+        """
+        Args:
+            path: 导出文件路径
+            export_format: csv、json 或 text
+            append: 追加到已有文件末尾，json 格式不支持
+        """
+        if append and export_format == 'json':
+            raise ValueError('JSON 格式不支持追加写入')
+        self.path = path
+        self.format = export_format
+        self.count = 0
+        existing = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self._file = open(path, 'a' if append else 'w', encoding='utf-8', newline='',
+                          buffering=EXPORT_BUFFER_SIZE)
+        if export_format == 'csv':
+            self._csv = csv.writer(self._file)
+            if not existing:
+                self._csv.writerow(['license_key', 'expires_at'])
+        elif export_format == 'json':
+            self._file.write('[')
+            
+    def write(self, item):
+        if self.format == 'csv':
+            self._csv.writerow([item['license_key'], item.get('expires_at') or ''])
+        elif self.format == 'text':
+            self._file.write(f"密钥: {item['license_key']} | 有效期至: {item.get('expires_at') or '永久有效'}\n")
+        else:
+            self._file.write((',\n' if self.count else '\n') + json.dumps(item, ensure_ascii=False))
+        self.count += 1
+        
+    def flush(self):
+        self._file.flush()
+        
+    def close(self):
+        if self._file is None:
+            return
+        if self.format == 'json':
+            self._file.write('\n]\n')
+        self._file.close()
+        self._file = None
+
+class BatchJob:
+    """
+    一次批量生成任务
+
+    取消或出错后保留已生成的数量和打开的导出文件，继续时从剩余数量接着生成并追加到同一个文件。
+    """
+    
+    def __init__(self, server_url, admin_key, total, expires_at, writer):
         self.server_url = server_url
         self.admin_key = admin_key
+        self.total = total
         self.expires_at = expires_at
+        self.writer = writer
+        self.generated = 0
+        # 由界面线程设置，工作线程在两个请求之间检查
+        self.cancel_event = threading.Event()
         
-    def run(self):
+    @property
+    def remaining(self):
+        return self.total - self.generated
+
+class GenerateWorker(QObject):
+    """
+    常驻的许可证生成工作对象
+
+    移动到独立线程后在窗口的整个生命周期内复用，所有请求共用进程内的连接池。
+    批量生成时使用服务器的批量接口，每个请求生成 BATCH_REQUEST_SIZE 个并以 NDJSON 流式返回。
+    """
+    success = pyqtSignal(dict)                 # 单个许可证生成成功
+    error = pyqtSignal(str)                    # 单个许可证生成失败
+    finished = pyqtSignal()                    # 单个许可证的请求结束
+    batch_progress = pyqtSignal(int, int)      # (已生成, 总数)
+    batch_stopped = pyqtSignal(int, int, str)  # (已生成, 总数, 错误信息，正常结束或取消时为空)
+    
+    @pyqtSlot(str, str, object)
+    def generate_one(self, server_url, admin_key, expires_at):
         try:
+            import requests
+
             # 准备请求数据
             json_data = {}
-            if self.expires_at:
-                json_data['expires_at'] = self.expires_at.strftime("%Y-%m-%d %H:%M:%S")
-            
-            logging.info(f"准备发送请求到: {self.server_url}")
-            logging.info(f"请求数据: {json_data}")
+            if expires_at:
+                json_data['expires_at'] = expires_at.strftime("%Y-%m-%d %H:%M:%S")
             
-            # 设置请求会话
-            session = requests.Session()
-            session.verify = False
+            logging.info(f"准备发送请求到: {server_url}")
             
-            # 设置重试次数
-            max_retries = 3
-            retry_count = 0
+            # 复用进程内共享的连接池，网络错误由传输层按退避策略重试
+            transport = get_transport(server_url, read_timeout=30)
+            try:
+                response = transport.post(
+                    '/admin/generate',
+                    headers={'X-Admin-Key': admin_key},
+                    json=json_data
+                )
+            except requests.exceptions.ConnectionError:
+                self.error.emit("无法连接到服务器，请检查服务器地址和网络连接")
+                return
+            except requests.exceptions.Timeout:
+                self.error.emit("请求超时，请检查网络连接")
+                return
+            except requests.exceptions.RequestException as e:
+                self.error.emit(f"请求失败: {str(e)}")
+                return
+                
+            logging.info(f"服务器响应状态码: {response.status_code}")
             
-            while retry_count < max_retries:
-                try:
-                    # 发送请求
-                    response = session.post(
-                        f'{self.server_url}/admin/generate',
-                        headers={'X-Admin-Key': self.admin_key},
-                        json=json_data,
-                        timeout=30  # 增加超时时间
-                    )
-                    
-                    logging.info(f"服务器响应状态码: {response.status_code}")
-                    logging.info(f"服务器响应内容: {response.text}")
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        if result.get('success'):
-                            self.success.emit(result)
-                            return
-                        else:
-                            self.error.emit(f"生成失败: {result.get('error', '未知错误')}")
-                            return
-                    else:
-                        self.error.emit(f"服务器响应错误: {response.status_code}\n{response.text}")
-                        return
-                        
-                except requests.exceptions.RequestException as e:
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        logging.warning(f"请求失败，正在进行第 {retry_count} 次重试: {str(e)}")
-                        continue
-                    else:
-                        logging.error(f"重试 {max_retries} 次后仍然失败")
-                        if isinstance(e, requests.exceptions.ConnectionError):
-                            self.error.emit("无法连接到服务器，请检查服务器地址和网络连接")
-                        elif isinstance(e, requests.exceptions.Timeout):
-                            self.error.emit("请求超时，请检查网络连接")
-                        else:
-                            self.error.emit(f"请求失败: {str(e)}")
-                        return
+            if response.status_code == 200:
+                result = response.json()
+                if result.get('success'):
+                    self.success.emit(result)
+                else:
+                    self.error.emit(f"生成失败: {result.get('error', '未知错误')}")
+            else:
+                self.error.emit(f"服务器响应错误: {response.status_code}\n{response.text}")
                         
         except Exception as e:
             logging.error(f"生成许可证失败: {str(e)}")
             self.error.emit(f"生成许可证失败: {str(e)}")
+        finally:
+            self.finished.emit()
+            
+    @pyqtSlot(object)
+    def run_batch(self, job):
+        """生成 job 中剩余的许可证，直到完成、被取消或出错"""
+        import requests
+
+        transport = get_transport(job.server_url, read_timeout=60)
+        expires_at = job.expires_at.strftime("%Y-%m-%d %H:%M:%S") if job.expires_at else None
+        last_progress = 0
+        error = ''
+        try:
+            while job.remaining > 0 and not job.cancel_event.is_set():
+                # 已发出的请求总会读完，服务器生成的每个密钥都写入导出文件
+                with transport.post(
+                    '/admin/generate',
+                    headers={'X-Admin-Key': job.admin_key},
+                    json={'count': min(BATCH_REQUEST_SIZE, job.remaining), 'expires_at': expires_at},
+                    stream=True
+                ) as response:
+                    if response.status_code != 200:
+                        raise Exception(f"服务器响应错误: {response.status_code}\n{response.text}")
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        item = json.loads(line)
+                        if 'error' in item:
+                            raise Exception(f"生成失败: {item['error']}")
+                        job.writer.write(item)
+                        job.generated += 1
+                        now = time.monotonic()
+                        if now - last_progress >= PROGRESS_INTERVAL:
+                            last_progress = now
+                            self.batch_progress.emit(job.generated, job.total)
+                job.writer.flush()
+        except requests.exceptions.ConnectionError:
+            error = "无法连接到服务器，请检查服务器地址和网络连接"
+        except Exception as e:
+            error = str(e)
+        if error:
+            logging.error(f"批量生成许可证失败（已生成 {job.generated} 个）: {error}")
+            job.writer.flush()
+        self.batch_progress.emit(job.generated, job.total)
+        self.batch_stopped.emit(job.generated, job.total, error)
+
+# 许可证浏览页的列：(字段, 表头, 服务器排序字段，None 表示不可排序)
+BROWSER_COLUMNS = [
+    ('license_key', '许可证密钥', 'license_key'),
+    ('status', '状态', None),
+    ('expires_at', '过期时间', 'expires_at'),
+    ('seats', '席位', None),
+    ('machine_code', '设备', None),
+    ('created_at', '创建时间', 'created_at'),
+    ('last_seen_at', '最后验证', 'last_seen_at'),
+]
+BROWSER_FIELDS = 'license_key,is_active,expires_at,max_activations,seats_used,machine_code,created_at,last_seen_at'
+BROWSER_PAGE_SIZE = 200       # 每次向服务器请求的记录数
+SEARCH_DEBOUNCE_MS = 300      # 搜索框停止输入多久后才发起查询
+STATUS_COLUMN = 1
+
+
+def _browser_row(item, now):
+    """将服务器返回的记录转换为表格中显示的一行，在工作线程中完成格式化"""
+    if not item.get('is_active'):
+        status = '已禁用'
+    elif item.get('expires_at') and item['expires_at'] < now:
+        status = '已过期'
+    else:
+        status = '有效'
+    return (
+        item['license_key'],
+        status,
+        item.get('expires_at') or '永久有效',
+        f"{item.get('seats_used', 0)}/{item.get('max_activations', 1)}",
+        item.get('machine_code') or '',
+        item.get('created_at') or '',
+        item.get('last_seen_at') or '',
+    )
+
+class LicenseBrowserWorker(QObject):
+    """
+    许可证浏览页的后台工作对象
+
+    移动到独立线程后常驻，依次处理界面发来的翻页和禁用请求，网络请求不会阻塞界面。
+    """
+    page_loaded = pyqtSignal(int, list, object)  # (请求序号, 表格行, 下一页游标)
+    page_failed = pyqtSignal(int, str)           # (请求序号, 错误信息)
+    deactivated = pyqtSignal(list, dict)         # (许可证密钥, 服务器返回的结果)
+    deactivate_failed = pyqtSignal(str)
+    
+    def __init__(self):
+        super().__init__()
+        # 界面线程发出新查询时更新，排队中已过时的翻页请求直接跳过
+        self.latest_request = 0
+        
+    @pyqtSlot(int, str, str, dict)
+    def fetch_page(self, request_id, server_url, admin_key, params):
+        if request_id < self.latest_request:
+            return
+        import requests
+
+        try:
+            transport = get_transport(server_url, read_timeout=30)
+            response = transport.get(
+                '/admin/licenses',
+                headers={'X-Admin-Key': admin_key},
+                params=params
+            )
+            if response.status_code != 200:
+                self.page_failed.emit(request_id, f"服务器响应错误: {response.status_code}\n{response.text}")
+                return
+            page = response.json()
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            rows = [_browser_row(item, now) for item in page['items']]
+            self.page_loaded.emit(request_id, rows, page['next_cursor'])
+        except requests.exceptions.ConnectionError:
+            self.page_failed.emit(request_id, "无法连接到服务器，请检查服务器地址和网络连接")
+        except Exception as e:
+            logging.error(f"获取许可证列表失败: {str(e)}")
+            self.page_failed.emit(request_id, f"获取许可证列表失败: {str(e)}")
+            
+    @pyqtSlot(str, str, list)
+    def deactivate(self, server_url, admin_key, license_keys):
+        """通过批量接口在一个请求中禁用选中的许可证"""
+        import requests
+
+        try:
+            transport = get_transport(server_url, read_timeout=30)
+            response = transport.post(
+                '/admin/bulk/deactivate',
+                headers={'X-Admin-Key': admin_key, 'Content-Type': 'text/plain'},
+                data='\n'.join(license_keys).encode('utf-8')
+            )
+            if response.status_code == 200:
+                self.deactivated.emit(license_keys, response.json())
+            else:
+                self.deactivate_failed.emit(f"服务器响应错误: {response.status_code}\n{response.text}")
+        except requests.exceptions.ConnectionError:
+            self.deactivate_failed.emit("无法连接到服务器，请检查服务器地址和网络连接")
+        except Exception as e:
+            logging.error(f"禁用许可证失败: {str(e)}")
+            self.deactivate_failed.emit(f"禁用许可证失败: {str(e)}")
+
+class LicenseTableModel(QAbstractTableModel):
+    """
+    按需分页加载的许可证表格模型
+
+    只保存已经滚动到的记录。视图滚动到底部时通过 canFetchMore/fetchMore 请求下一页，
+    由工作线程按服务器返回的游标获取；排序和过滤都交给服务器处理，模型本身从不遍历全部许可证。
+    """
+    fetch_requested = pyqtSignal(int, str, str, dict)
+    loading_changed = pyqtSignal(bool)
+    load_failed = pyqtSignal(str)
+    
+    def __init__(self, worker, connection):
+        """
+        Args:
+            worker: LicenseBrowserWorker
+            connection: 返回 (服务器地址, 管理员密钥) 的函数，未填写时返回空字符串
+        """
+        super().__init__()
+        self.worker = worker
+        self.connection = connection
+        self.filters = {}
+        self.sort_field = '-created_at'
+        
+        self._rows = []
+        self._cursor = None
+        self._has_more = False
+        self._loading = False
+        self._request_id = 0
+        
+        self.fetch_requested.connect(worker.fetch_page)
+        worker.page_loaded.connect(self._on_page_loaded)
+        worker.page_failed.connect(self._on_page_failed)
+        
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+        
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(BROWSER_COLUMNS)
+        
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return row[index.column()]
+        if role == Qt.ItemDataRole.ForegroundRole and row[STATUS_COLUMN] != '有效':
+            return QColor('#9E9E9E')
+        return None
+        
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return BROWSER_COLUMNS[section][1]
+        return None
+        
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._has_more
+        
+    def fetchMore(self, parent=QModelIndex()):
+        if not parent.isValid() and self._has_more and not self._loading:
+            self._request_page()
+            
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        field = BROWSER_COLUMNS[column][2]
+        if field is None:
+            return
+        prefix = '-' if order == Qt.SortOrder.DescendingOrder else ''
+        if self.sort_field != prefix + field:
+            self.sort_field = prefix + field
+            self.reload()
+            
+    def set_filters(self, filters):
+        if filters != self.filters:
+            self.filters = filters
+            self.reload()
+            
+    def reload(self):
+        """丢弃已加载的记录，按当前的排序和过滤条件从第一页重新加载"""
+        self.beginResetModel()
+        self._rows = []
+        self._cursor = None
+        self._has_more = False
+        self._request_id += 1
+        self._set_loading(False)
+        self.endResetModel()
+        self._request_page()
+        
+    @property
+    def loading(self):
+        return self._loading
+        
+    def sort_column(self):
+        """当前排序对应的列和顺序"""
+        field = self.sort_field.lstrip('-')
+        column = next(i for i, c in enumerate(BROWSER_COLUMNS) if c[2] == field)
+        order = Qt.SortOrder.DescendingOrder if self.sort_field.startswith('-') else Qt.SortOrder.AscendingOrder
+        return column, order
+        
+    def license_key(self, row):
+        return self._rows[row][0]
+        
+    def mark_deactivated(self, license_keys):
+        """禁用成功后更新已加载的行，不重新查询"""
+        keys = set(license_keys)
+        for i, row in enumerate(self._rows):
+            if row[0] in keys and row[STATUS_COLUMN] != '已禁用':
+                self._rows[i] = row[:STATUS_COLUMN] + ('已禁用',) + row[STATUS_COLUMN + 1:]
+                self.dataChanged.emit(self.index(i, 0), self.index(i, len(BROWSER_COLUMNS) - 1))
+                
+    def _set_loading(self, loading):
+        if self._loading != loading:
+            self._loading = loading
+            self.loading_changed.emit(loading)
+            
+    def _request_page(self):
+        server_url, admin_key = self.connection()
+        if not server_url or not admin_key:
+            return
+        params = dict(self.filters, limit=BROWSER_PAGE_SIZE, fields=BROWSER_FIELDS, sort=self.sort_field)
+        if self._cursor is not None:
+            params['after'] = self._cursor
+        self._set_loading(True)
+        self.worker.latest_request = self._request_id
+        self.fetch_requested.emit(self._request_id, server_url, admin_key, params)
+        
+    def _on_page_loaded(self, request_id, rows, cursor):
+        if request_id != self._request_id:
+            return
+        if rows:
+            first = len(self._rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._rows.extend(rows)
+            self.endInsertRows()
+        self._cursor = cursor
+        self._has_more = cursor is not None
+        self._set_loading(False)
+        
+    def _on_page_failed(self, request_id, message):
+        if request_id != self._request_id:
+            return
+        # 出错后不再自动翻页，点击刷新重试
+        self._has_more = False
+        self._set_loading(False)
+        self.load_failed.emit(message)
+
+class LicenseBrowserTab(QWidget):
+    """许可证浏览页：搜索、过滤、服务器端排序，禁用选中的许可证"""
+    deactivate_requested = pyqtSignal(str, str, list)
+    
+    def __init__(self, connection):
+        super().__init__()
+        self.connection = connection
+        
+        # 网络请求在常驻的工作线程中执行
+        self.worker_thread = QThread()
+        self.worker = LicenseBrowserWorker()
+        self.worker.moveToThread(self.worker_thread)
+        self.worker_thread.start()
+        self.deactivate_requested.connect(self.worker.deactivate)
+        self.worker.deactivated.connect(self.handle_deactivated)
+        self.worker.deactivate_failed.connect(self.handle_error)
+        
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 10, 0, 0)
+        
+        # 搜索和过滤条件
+        filter_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("搜索许可证密钥前缀或机器码")
+        self.search_input.setClearButtonEnabled(True)
+        filter_layout.addWidget(self.search_input, 1)
+        
+        self.status_filter = QComboBox()
+        for text, value in [("全部状态", None), ("有效", '1'), ("已禁用", '0')]:
+            self.status_filter.addItem(text, value)
+        filter_layout.addWidget(self.status_filter)
+        
+        self.expiry_filter = QComboBox()
+        for text, value in [("全部有效期", None), ("未过期", '0'), ("已过期", '1')]:
+            self.expiry_filter.addItem(text, value)
+        filter_layout.addWidget(self.expiry_filter)
+        
+        self.bound_filter = QComboBox()
+        for text, value in [("全部设备", None), ("已激活", '1'), ("未激活", '0')]:
+            self.bound_filter.addItem(text, value)
+        filter_layout.addWidget(self.bound_filter)
+        
+        refresh_btn = QPushButton("刷新")
+        refresh_btn.clicked.connect(self.refresh)
+        filter_layout.addWidget(refresh_btn)
+        layout.addLayout(filter_layout)
+        
+        # 输入停止一段时间后才查询，避免每敲一个字符就请求一次服务器
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.filter_timer.timeout.connect(self.apply_filters)
+        self.search_input.textChanged.connect(self.filter_timer.start)
+        for combo in (self.status_filter, self.expiry_filter, self.bound_filter):
+            combo.currentIndexChanged.connect(self.filter_timer.start)
+        
+        # 许可证表格
+        self.model = LicenseTableModel(self.worker, connection)
+        self.model.loading_changed.connect(self.update_status)
+        self.model.rowsInserted.connect(self.update_status)
+        self.model.modelReset.connect(self.update_status)
+        self.model.load_failed.connect(self.handle_error)
+        
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.table.setWordWrap(False)
+        self.table.verticalHeader().setVisible(False)
+        # 固定行高，视图不必逐行计算高度
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.horizontalHeader().setSortIndicator(5, Qt.SortOrder.DescendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.horizontalHeader().sortIndicatorChanged.connect(self.restore_sort_indicator)
+        self.table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.table.customContextMenuRequested.connect(self.show_context_menu)
+        layout.addWidget(self.table)
+        
+        bottom_layout = QHBoxLayout()
+        self.status_label = QLabel()
+        bottom_layout.addWidget(self.status_label, 1)
+        self.deactivate_btn = QPushButton("禁用选中的许可证")
+        self.deactivate_btn.clicked.connect(self.deactivate_selected)
+        bottom_layout.addWidget(self.deactivate_btn)
+        layout.addLayout(bottom_layout)
+        
+        self.loaded = False
+        
+    def ensure_loaded(self):
+        """首次切换到浏览页时加载第一页"""
+        if not self.loaded:
+            self.refresh()
+            
+    def refresh(self):
+        server_url, admin_key = self.connection()
+        if not server_url or not admin_key:
+            QMessageBox.warning(self, "错误", "请输入服务器地址和管理员密钥")
+            return
+        self.loaded = True
+        self.filter_timer.stop()
+        self.model.filters = self.current_filters()
+        self.model.reload()
+        
+    def current_filters(self):
+        filters = {}
+        search = self.search_input.text().strip()
+        if search:
+            filters['search'] = search
+        for name, combo in (('active', self.status_filter), ('expired', self.expiry_filter),
+                            ('bound', self.bound_filter)):
+            if combo.currentData() is not None:
+                filters[name] = combo.currentData()
+        return filters
+        
+    def apply_filters(self):
+        if self.loaded:
+            self.model.set_filters(self.current_filters())
+            
+    def restore_sort_indicator(self, column, order):
+        """点击不支持排序的列时，表头恢复显示当前的排序"""
+        if BROWSER_COLUMNS[column][2] is None:
+            header = self.table.horizontalHeader()
+            header.blockSignals(True)
+            header.setSortIndicator(*self.model.sort_column())
+            header.blockSignals(False)
+            
+    def update_status(self, *args):
+        text = f"已加载 {self.model.rowCount()} 个许可证"
+        if self.model.canFetchMore():
+            text += "，滚动到底部加载更多"
+        if self.model.loading:
+            text += "，正在加载..."
+        self.status_label.setText(text)
+        
+    def selected_keys(self):
+        rows = sorted({index.row() for index in self.table.selectionModel().selectedRows()})
+        return [self.model.license_key(row) for row in rows]
+        
+    def show_context_menu(self, pos):
+        if not self.table.indexAt(pos).isValid():
+            return
+        keys = self.selected_keys()
+        menu = QMenu(self)
+        copy_action = menu.addAction("复制密钥")
+        deactivate_action = menu.addAction(f"禁用 {len(keys)} 个许可证" if len(keys) > 1 else "禁用许可证")
+        action = menu.exec(self.table.viewport().mapToGlobal(pos))
+        if action == copy_action:
+            QApplication.clipboard().setText('\n'.join(keys))
+        elif action == deactivate_action:
+            self.deactivate_selected()
+            
+    def deactivate_selected(self):
+        keys = self.selected_keys()
+        if not keys:
+            return
+        server_url, admin_key = self.connection()
+        message = f"确定要禁用许可证 {keys[0]} 吗？" if len(keys) == 1 else f"确定要禁用选中的 {len(keys)} 个许可证吗？"
+        if QMessageBox.question(self, "确认", message) != QMessageBox.StandardButton.Yes:
+            return
+        logging.info(f"禁用许可证 {len(keys)} 个")
+        self.deactivate_btn.setEnabled(False)
+        self.deactivate_requested.emit(server_url, admin_key, keys)
+        
+    def handle_deactivated(self, license_keys, result):
+        self.deactivate_btn.setEnabled(True)
+        self.model.mark_deactivated(license_keys)
+        self.status_label.setText(f"已禁用 {result.get('affected', 0)} 个许可证")
+        logging.info(f"禁用许可证完成: {result}")
+        
+    def handle_error(self, error_msg):
+        self.deactivate_btn.setEnabled(True)
+        self.update_status()
+        QMessageBox.warning(self, "错误", error_msg)
+        logging.error(error_msg)
+        
+    def shutdown(self):
+        """等待正在进行的请求完成后停止工作线程"""
+        self.worker_thread.quit()
+        self.worker_thread.wait()
 
 class LicenseGeneratorWindow(QMainWindow):
+    generate_requested = pyqtSignal(str, str, object)
+    batch_requested = pyqtSignal(object)
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("许可证生成器")
@@ -123,6 +666,36 @@ class LicenseGeneratorWindow(QMainWindow):
         admin_key_layout.addWidget(self.admin_key_input)
         layout.addLayout(admin_key_layout)
         
+        # 生成和浏览分为两个标签页，共用上面的服务器地址和管理员密钥
+        self.tabs = QTabWidget()
+        layout.addWidget(self.tabs)
+        generate_tab = QWidget()
+        generate_layout = QVBoxLayout(generate_tab)
+        generate_layout.setSpacing(15)
+        generate_layout.setContentsMargins(0, 10, 0, 0)
+        self.tabs.addTab(generate_tab, "生成许可证")
+        
+        self.browser = LicenseBrowserTab(self.connection)
+        self.tabs.addTab(self.browser, "许可证浏览")
+        self.tabs.currentChanged.connect(self.tab_changed)
+        
+        # 生成请求在常驻的工作线程中执行
+        self.worker_thread = QThread()
+        self.worker = GenerateWorker()
+        self.worker.moveToThread(self.worker_thread)
+        self.worker_thread.start()
+        self.generate_requested.connect(self.worker.generate_one)
+        self.batch_requested.connect(self.worker.run_batch)
+        self.worker.success.connect(self.handle_success)
+        self.worker.error.connect(self.handle_error)
+        self.worker.finished.connect(self.handle_finished)
+        self.worker.batch_progress.connect(self.handle_batch_progress)
+        self.worker.batch_stopped.connect(self.handle_batch_stopped)
+        self.batch_job = None
+        self.batch_running = False
+        # 单个生成的密钥保存文件，首次生成时打开，窗口关闭前一直复用
+        self.single_writer = None
+        
         # 有效期设置
         expiry_layout = QHBoxLayout()
         expiry_label = QLabel("有效期设置:")
@@ -138,7 +711,7 @@ class LicenseGeneratorWindow(QMainWindow):
         self.expiry_date.setEnabled(False)
         expiry_layout.addWidget(self.expiry_date)
         expiry_layout.addStretch()
-        layout.addLayout(expiry_layout)
+        generate_layout.addLayout(expiry_layout)
         
         # 生成按钮
         self.generate_btn = QPushButton("生成新的许可证")
@@ -162,11 +735,56 @@ class LicenseGeneratorWindow(QMainWindow):
             }
         """)
         self.generate_btn.clicked.connect(self.generate_license)
-        layout.addWidget(self.generate_btn)
+        generate_layout.addWidget(self.generate_btn)
+        
+        # 批量生成设置
+        batch_layout = QHBoxLayout()
+        batch_label = QLabel("批量生成:")
+        batch_label.setMinimumWidth(100)
+        batch_layout.addWidget(batch_label)
+        
+        self.batch_count = QSpinBox()
+        self.batch_count.setRange(1, BATCH_MAX_COUNT)
+        self.batch_count.setSingleStep(1000)
+        self.batch_count.setValue(10000)
+        self.batch_count.setSuffix(" 个")
+        batch_layout.addWidget(self.batch_count)
+        
+        self.export_format = QComboBox()
+        self.export_format.addItems(list(EXPORT_FORMATS))
+        self.export_format.currentTextChanged.connect(self.export_format_changed)
+        batch_layout.addWidget(self.export_format)
+        
+        self.export_path = QLineEdit()
+        self.export_path.setPlaceholderText("导出文件，默认保存到当前目录")
+        batch_layout.addWidget(self.export_path, 1)
+        
+        self.browse_btn = QPushButton("选择...")
+        self.browse_btn.clicked.connect(self.choose_export_path)
+        batch_layout.addWidget(self.browse_btn)
+        generate_layout.addLayout(batch_layout)
+        
+        batch_control_layout = QHBoxLayout()
+        self.batch_btn = QPushButton("开始批量生成")
+        self.batch_btn.clicked.connect(self.start_batch)
+        batch_control_layout.addWidget(self.batch_btn)
+        
+        self.cancel_batch_btn = QPushButton("取消")
+        self.cancel_batch_btn.clicked.connect(self.cancel_batch)
+        batch_control_layout.addWidget(self.cancel_batch_btn)
+        
+        self.batch_progress = QProgressBar()
+        self.batch_progress.setFormat("%v / %m")
+        batch_control_layout.addWidget(self.batch_progress, 1)
+        
+        self.batch_status = QLabel()
+        batch_control_layout.addWidget(self.batch_status)
+        generate_layout.addLayout(batch_control_layout)
+        self.update_batch_controls()
         
         # 结果显示区域
         result_label = QLabel("生成记录:")
-        layout.addWidget(result_label)
+        generate_layout.addWidget(result_label)
         
         self.result_text = QTextEdit()
         self.result_text.setReadOnly(True)
@@ -179,7 +797,7 @@ class LicenseGeneratorWindow(QMainWindow):
                 font-family: Consolas, Monaco, monospace;
             }
         """)
-        layout.addWidget(self.result_text)
+        generate_layout.addWidget(self.result_text)
         
         # 底部按钮布局
         bottom_layout = QHBoxLayout()
@@ -218,10 +836,33 @@ class LicenseGeneratorWindow(QMainWindow):
         open_log_btn.clicked.connect(self.open_log)
         bottom_layout.addWidget(open_log_btn)
         
-        layout.addLayout(bottom_layout)
+        generate_layout.addLayout(bottom_layout)
         
         logging.info("许可证生成器界面初始化完成")
         
+    def connection(self):
+        """当前填写的服务器地址和管理员密钥"""
+        return self.server_input.text().strip(), self.admin_key_input.text().strip()
+        
+    def tab_changed(self, index):
+        if self.tabs.widget(index) is self.browser:
+            server_url, admin_key = self.connection()
+            if server_url and admin_key:
+                self.browser.ensure_loaded()
+                
+    def closeEvent(self, event):
+        # 正在批量生成时读完当前请求后停止，已生成的密钥都写入导出文件
+        if self.batch_job is not None:
+            self.batch_job.cancel_event.set()
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+        self.close_batch_job()
+        if self.single_writer is not None:
+            self.single_writer.close()
+            self.single_writer = None
+        self.browser.shutdown()
+        super().closeEvent(event)
+        
     def toggle_expiry(self, state):
         self.expiry_date.setEnabled(state == Qt.CheckState.Checked)
         
@@ -247,12 +888,7 @@ class LicenseGeneratorWindow(QMainWindow):
         
         logging.info(f"开始生成许可证，服务器地址: {server_url}")
         
-        # 创建并启动生成线程
-        self.generate_thread = GenerateThread(server_url, admin_key, expires_at)
-        self.generate_thread.success.connect(self.handle_success)
-        self.generate_thread.error.connect(self.handle_error)
-        self.generate_thread.finished.connect(self.handle_finished)
-        self.generate_thread.start()
+        self.generate_requested.emit(server_url, admin_key, expires_at)
     
     def handle_success(self, result):
         license_key = result['license_key']
@@ -265,10 +901,16 @@ class LicenseGeneratorWindow(QMainWindow):
                       f"有效期至: {expires_at}\n")
         self.result_text.append(success_msg)
         
-        # 保存到文件
-        with open('license_keys.txt', 'a', encoding='utf-8') as f:
-            f.write(f"密钥: {license_key} | 有效期至: {expires_at}\n")
-        self.result_text.append("密钥已保存到 license_keys.txt 文件\n")
+        # 保存到文件，每个密钥写入后立即刷新，程序异常退出也不会丢失
+        try:
+            if self.single_writer is None:
+                self.single_writer = KeyExportWriter(SINGLE_KEYS_FILE, 'text', append=True)
+            self.single_writer.write({'license_key': license_key, 'expires_at': expires_at})
+            self.single_writer.flush()
+            self.result_text.append(f"密钥已保存到 {SINGLE_KEYS_FILE} 文件\n")
+        except OSError as e:
+            logging.error(f"保存许可证密钥失败: {str(e)}")
+            self.result_text.append(f"密钥保存失败: {str(e)}\n")
         self.result_text.append("-" * 50 + "\n")
         
         logging.info(f"许可证生成成功: {license_key}")
@@ -278,9 +920,116 @@ class LicenseGeneratorWindow(QMainWindow):
         logging.error(f"生成失败: {error_msg}")
     
     def handle_finished(self):
-        self.generate_btn.setEnabled(True)
+        self.generate_btn.setEnabled(not self.batch_running)
         self.generate_btn.setText("生成新的许可证")
         logging.info("生成过程结束")
+        
+    def export_format_changed(self, text):
+        """切换导出格式时同步修改文件扩展名"""
+        path = self.export_path.text().strip()
+        if path:
+            self.export_path.setText(os.path.splitext(path)[0] + '.' + EXPORT_FORMATS[text])
+            
+    def choose_export_path(self):
+        extension = EXPORT_FORMATS[self.export_format.currentText()]
+        path, _ = QFileDialog.getSaveFileName(
+            self, "选择导出文件", self.export_path.text() or f"license_keys.{extension}",
+            f"{self.export_format.currentText()} 文件 (*.{extension})"
+        )
+        if path:
+            self.export_path.setText(path)
+            
+    def start_batch(self):
+        """开始新的批量生成任务，或继续已暂停的任务"""
+        job = self.batch_job
+        if job is not None:
+            job.cancel_event.clear()
+            logging.info(f"继续批量生成，剩余 {job.remaining} 个")
+        else:
+            server_url, admin_key = self.connection()
+            if not server_url or not admin_key:
+                QMessageBox.warning(self, "错误", "请输入服务器地址和管理员密钥")
+                return
+            expires_at = None
+            if self.enable_expiry.isChecked():
+                expires_at = self.expiry_date.dateTime().toPyDateTime()
+                
+            export_format = EXPORT_FORMATS[self.export_format.currentText()]
+            path = self.export_path.text().strip()
+            if not path:
+                path = f"license_keys_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+                self.export_path.setText(path)
+            try:
+                writer = KeyExportWriter(path, export_format)
+            except OSError as e:
+                QMessageBox.warning(self, "错误", f"无法创建导出文件: {str(e)}")
+                return
+                
+            job = BatchJob(server_url, admin_key, self.batch_count.value(), expires_at, writer)
+            self.batch_job = job
+            self.batch_progress.setRange(0, job.total)
+            self.batch_progress.setValue(0)
+            logging.info(f"开始批量生成 {job.total} 个许可证，导出到 {path}")
+            
+        self.batch_started = (time.monotonic(), job.generated)
+        self.batch_running = True
+        self.update_batch_controls()
+        self.batch_requested.emit(job)
+        
+    def cancel_batch(self):
+        """生成中时在当前请求完成后暂停；已暂停时放弃剩余数量并关闭导出文件"""
+        if self.batch_job is None:
+            return
+        if self.batch_running:
+            self.batch_job.cancel_event.set()
+            self.cancel_batch_btn.setEnabled(False)
+            self.batch_status.setText("正在取消...")
+        else:
+            self.result_text.append(f"已放弃剩余的 {self.batch_job.remaining} 个，"
+                                    f"已生成的 {self.batch_job.generated} 个保存在 {self.batch_job.writer.path}\n")
+            self.close_batch_job()
+            
+    def handle_batch_progress(self, generated, total):
+        self.batch_progress.setValue(generated)
+        started, started_count = self.batch_started
+        elapsed = time.monotonic() - started
+        if elapsed > 0 and generated > started_count:
+            self.batch_status.setText(f"{(generated - started_count) / elapsed:.0f} 个/秒")
+            
+    def handle_batch_stopped(self, generated, total, error):
+        self.batch_running = False
+        job = self.batch_job
+        if generated >= total:
+            self.result_text.append(f"批量生成完成！{generated} 个许可证已导出到 {job.writer.path}\n")
+            logging.info(f"批量生成完成: {generated} 个")
+            self.close_batch_job()
+        else:
+            reason = error or "已取消"
+            self.result_text.append(f"批量生成暂停（{reason}）: 已生成 {generated}/{total} 个，"
+                                    f"可以继续生成剩余的 {total - generated} 个\n")
+            self.update_batch_controls()
+            if error:
+                QMessageBox.warning(self, "错误", f"批量生成失败: {error}")
+                
+    def close_batch_job(self):
+        if self.batch_job is not None:
+            self.batch_job.writer.close()
+            self.batch_job = None
+        self.update_batch_controls()
+        
+    def update_batch_controls(self):
+        paused = self.batch_job is not None and not self.batch_running
+        idle = self.batch_job is None
+        self.batch_btn.setEnabled(not self.batch_running)
+        self.batch_btn.setText("继续生成" if paused else "开始批量生成")
+        self.cancel_batch_btn.setEnabled(not idle)
+        self.cancel_batch_btn.setText("放弃剩余" if paused else "取消")
+        for widget in (self.batch_count, self.export_format, self.export_path, self.browse_btn):
+            widget.setEnabled(idle)
+        # 单个生成的请求会排在批量任务之后，生成期间暂不可用
+        self.generate_btn.setEnabled(not self.batch_running)
+        if idle or paused:
+            self.batch_status.setText("")
             
     def clear_results(self):
         self.result_text.clear()
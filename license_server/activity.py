@@ -0,0 +1,123 @@
+import time
+import logging
+import threading
+
+WRITE_MODES = ('batched', 'sync')
+
+
+class ActivationRecorder:
+    """
+    激活次数的写回缓冲
+
+    batched 模式下，每次成功验证只在内存中累加激活次数和最后验证时间（许可证和设备各一份），
+    由后台线程按时间或数量阈值在单个事务中批量写入数据库；
+    sync 模式下每次验证立即写库，适用于需要精确计数的部署。
+    """
+
+    def __init__(self, db, mode: str = 'batched', flush_interval: float = 1.0,
+                 max_pending: int = 1000):
+        """
+        Args:
+            db: Database 连接池
+            mode: 写入模式，'batched' 或 'sync'
+            flush_interval: 批量写入的最长间隔（秒）
+            max_pending: 待写入的（许可证, 设备）数量达到该值时立即写入
+        """
+        if mode not in WRITE_MODES:
+            raise ValueError(f"未知的写入模式: {mode}")
+        self.db = db
+        self.mode = mode
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending = {}  # (license_key, machine_code) -> [count, last_seen]
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动后台写入线程"""
+        if self.mode != 'batched' or self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name='activation-flusher', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程并写入所有剩余数据"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def record(self, license_key: str, machine_code: str):
+        """记录已激活设备的一次成功验证"""
+        last_seen = int(time.time())
+        if self.mode == 'sync':
+            self._write([(1, last_seen, license_key, machine_code)])
+            return
+
+        key = (license_key, machine_code)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = [1, last_seen]
+            else:
+                entry[0] += 1
+                entry[1] = last_seen
+            pending = len(self._pending)
+        if pending >= self.max_pending:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """将缓冲的计数写入数据库，返回写入的（许可证, 设备）数量"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+
+        rows = [(count, last_seen, license_key, machine_code)
+                for (license_key, machine_code), (count, last_seen) in pending.items()]
+        try:
+            self._write(rows)
+        except Exception as e:
+            logging.error(f"写入激活次数失败: {str(e)}")
+            self._merge_back(pending)
+            return 0
+        return len(rows)
+
+    def _write(self, rows):
+        with self.db.transaction() as conn:
+            conn.executemany('''
+                UPDATE licenses
+                SET activation_count = activation_count + ?, last_seen_at = ?
+                WHERE license_key = ?
+            ''', [row[:3] for row in rows])
+            conn.executemany('''
+                UPDATE activations
+                SET last_seen = ?
+                WHERE license_id = (SELECT id FROM licenses WHERE license_key = ?) AND machine_code = ?
+            ''', [row[1:] for row in rows])
+
+    def _merge_back(self, pending):
+        """写入失败时将计数放回缓冲区，等待下次重试"""
+        with self._lock:
+            for key, (count, last_seen) in pending.items():
+                entry = self._pending.get(key)
+                if entry is None:
+                    self._pending[key] = [count, last_seen]
+                else:
+                    entry[0] += count
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            started = time.monotonic()
+            flushed = self.flush()
+            if flushed:
+                logging.debug(f"写入 {flushed} 条激活记录，耗时 {time.monotonic() - started:.3f}s")
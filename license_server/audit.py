@@ -0,0 +1,200 @@
+import time
+import random
+import logging
+import threading
+from collections import deque
+
+DEFAULT_AUDIT_DB_PATH = 'audit.db'
+
+# 预定义的聚合窗口（秒）
+WINDOWS = {
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+
+
+class AuditLog:
+    """
+    验证事件审计日志
+
+    每次验证（许可证、机器码、客户端 IP、结果、时间）先放入内存中的有界队列，
+    由后台线程批量写入独立的 SQLite 数据库，/validate 不会等待磁盘写入。
+    队列超过 high_watermark 后只按 overload_sample_rate 抽样保留成功的验证（失败的验证全部保留），
+    队列满时直接丢弃新事件，保证过载时不拖慢验证请求。
+    """
+
+    def __init__(self, db, max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, high_watermark: float = 0.5,
+                 overload_sample_rate: float = 0.1, retention_days: int = 90):
+        """
+        Args:
+            db: 审计数据库的 Database 连接池
+            max_queue: 内存队列的最大长度
+            batch_size: 每个事务最多写入的事件数
+            flush_interval: 批量写入的最长间隔（秒）
+            high_watermark: 队列占用比例超过该值时开始抽样
+            overload_sample_rate: 抽样时保留成功验证事件的比例
+            retention_days: 审计记录保留天数，0 表示不清理
+        """
+        self.db = db
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.high_watermark = int(max_queue * high_watermark)
+        self.overload_sample_rate = overload_sample_rate
+        self.retention_days = retention_days
+
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._last_purge = 0.0
+
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.failed = 0
+
+        self._init_schema()
+
+    def _init_schema(self):
+        with self.db.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS audit_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts INTEGER NOT NULL,
+                    license_key TEXT,
+                    machine_code TEXT,
+                    client_ip TEXT,
+                    outcome TEXT NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_audit_events_key_ts
+                ON audit_events (license_key, ts)
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_audit_events_ts ON audit_events (ts)')
+
+    def start(self):
+        """启动后台写入线程"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程，写入队列中剩余的事件并关闭数据库"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self.db.close()
+
+    def record(self, license_key, machine_code, client_ip, outcome: str):
+        """记录一次验证，不做任何 I/O"""
+        event = (int(time.time()), license_key, machine_code, client_ip, outcome)
+        with self._lock:
+            size = len(self._queue)
+            if size >= self.max_queue:
+                self.dropped += 1
+                return
+            if size >= self.high_watermark and outcome == 'ok' \
+                    and random.random() >= self.overload_sample_rate:
+                self.sampled_out += 1
+                return
+            self._queue.append(event)
+        if size + 1 == self.batch_size:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """将队列中的事件写入数据库，返回写入数量"""
+        total = 0
+        while True:
+            with self._lock:
+                n = min(self.batch_size, len(self._queue))
+                if not n:
+                    break
+                batch = [self._queue.popleft() for _ in range(n)]
+            try:
+                with self.db.transaction() as conn:
+                    conn.executemany('''
+                        INSERT INTO audit_events (ts, license_key, machine_code, client_ip, outcome)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', batch)
+            except Exception as e:
+                # 审计日志尽力而为，写入失败时丢弃该批次，避免队列无限增长
+                logging.error(f"写入审计日志失败: {str(e)}")
+                with self._lock:
+                    self.failed += len(batch)
+                continue
+            with self._lock:
+                self.written += len(batch)
+            total += len(batch)
+        return total
+
+    def purge(self, before: int) -> int:
+        """删除早于 before（Unix 时间戳）的记录"""
+        with self.db.transaction() as conn:
+            return conn.execute('DELETE FROM audit_events WHERE ts < ?', (before,)).rowcount
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            if self.retention_days and time.time() - self._last_purge > 3600:
+                self._last_purge = time.time()
+                try:
+                    purged = self.purge(int(time.time()) - self.retention_days * 86400)
+                    if purged:
+                        logging.info(f"清理过期审计记录 {purged} 条")
+                except Exception as e:
+                    logging.error(f"清理审计记录失败: {str(e)}")
+
+    def aggregate(self, window: int, since: int, until: int, license_key: str = None,
+                  limit: int = 1000):
+        """
+        按时间窗口汇总每个许可证的验证情况
+
+        Returns:
+            按窗口起始时间和许可证排序的列表，每项包含窗口起始时间、验证次数、
+            成功次数、不同机器码数量和不同 IP 数量
+        """
+        clauses, params = ['ts >= ?', 'ts < ?'], [since, until]
+        if license_key:
+            clauses.append('license_key = ?')
+            params.append(license_key)
+        with self.db.connection() as conn:
+            rows = conn.execute(f'''
+                SELECT (ts / ?) * ? AS window_start, license_key, COUNT(*),
+                       SUM(outcome = 'ok'), COUNT(DISTINCT machine_code), COUNT(DISTINCT client_ip)
+                FROM audit_events
+                WHERE {' AND '.join(clauses)}
+                GROUP BY window_start, license_key
+                ORDER BY window_start, license_key
+                LIMIT ?
+            ''', [window, window] + params + [limit]).fetchall()
+        return [{
+            'window_start': window_start,
+            'license_key': key,
+            'attempts': attempts,
+            'succeeded': succeeded,
+            'failed': attempts - succeeded,
+            'machines': machines,
+            'ips': ips,
+        } for window_start, key, attempts, succeeded, machines, ips in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'queued': len(self._queue),
+                'max_queue': self.max_queue,
+                'written': self.written,
+                'dropped': self.dropped,
+                'sampled_out': self.sampled_out,
+                'failed': self.failed,
+            }
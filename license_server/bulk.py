@@ -0,0 +1,221 @@
+import csv
+import json
+
+from timestamps import now, parse_timestamp
+
+# 请求体的 Content-Type 与输入格式的对应关系
+INPUT_FORMATS = {
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'text/csv': 'csv',
+    'text/plain': 'text',
+}
+
+# executemany 每次从输入中取出的行数，输入按块读取，内存占用与总行数无关
+STAGE_CHUNK_SIZE = 5000
+
+# 导入时最多返回的错误明细数量
+MAX_REPORTED_ERRORS = 20
+
+_TRUE_VALUES = {'1', 'true', 'yes'}
+_FALSE_VALUES = {'0', 'false', 'no'}
+
+
+def input_format(mimetype: str):
+    """根据 Content-Type 返回输入格式，不支持时返回 None"""
+    return INPUT_FORMATS.get(mimetype)
+
+
+def read_lines(stream):
+    """逐行读取请求体并解码，跳过空行"""
+    for line in stream:
+        line = line.decode('utf-8-sig').strip()
+        if line:
+            yield line
+
+
+def iter_keys(lines, fmt: str):
+    """
+    从上传的密钥列表中逐个取出许可证密钥
+
+    ndjson 每行为密钥字符串或带 license_key 字段的对象；csv 有 license_key 列时取该列，
+    否则取第一列；text 每行一个密钥。
+
+    Raises:
+        ValueError: 某一行无法解析
+    """
+    if fmt == 'csv':
+        reader = csv.reader(lines)
+        header = next(reader, None)
+        if header is None:
+            return
+        column = header.index('license_key') if 'license_key' in header else 0
+        if 'license_key' not in header and header:
+            yield header[0]
+        for row in reader:
+            if len(row) > column and row[column].strip():
+                yield row[column].strip()
+        return
+
+    for number, line in enumerate(lines, 1):
+        if fmt == 'ndjson':
+            try:
+                item = json.loads(line)
+            except ValueError:
+                raise ValueError(f"第 {number} 行不是有效的 JSON")
+            if isinstance(item, dict):
+                item = item.get('license_key')
+            if not isinstance(item, str) or not item:
+                raise ValueError(f"第 {number} 行缺少许可证密钥")
+            yield item
+        else:
+            yield line
+
+
+def _parse_bool(value) -> int:
+    if isinstance(value, bool) or isinstance(value, int):
+        return 1 if value else 0
+    value = str(value).strip().lower()
+    if value in _TRUE_VALUES:
+        return 1
+    if value in _FALSE_VALUES:
+        return 0
+    raise ValueError('is_active 必须是 1/0 或 true/false')
+
+
+class ImportReader:
+    """
+    将上传的许可证逐行转换为 temp.bulk_import 的行
+
+    支持的字段: license_key（必填）、created_at、expires_at、is_active、max_activations、
+    metadata（csv 中为 JSON 字符串）、machine_code（导入时已激活的设备）。
+    无法解析的行被跳过，并记录行号和原因。
+    """
+
+    def __init__(self, lines, fmt: str, normalize):
+        """
+        Args:
+            lines: read_lines() 产出的文本行
+            fmt: ndjson 或 csv
+            normalize: 返回密钥规范形式的函数，密钥不可用时返回 None
+        """
+        self.lines = lines
+        self.fmt = fmt
+        self.normalize = normalize
+        self.received = 0
+        self.invalid = 0
+        self.errors = []
+
+    def _records(self):
+        if self.fmt == 'csv':
+            for number, record in enumerate(csv.DictReader(self.lines), 2):
+                yield number, record
+            return
+        for number, line in enumerate(self.lines, 1):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield number, record
+
+    def _convert(self, record, imported_at: int):
+        if not isinstance(record, dict):
+            raise ValueError('不是有效的 JSON 对象')
+        license_key = record.get('license_key')
+        if not license_key or not isinstance(license_key, str):
+            raise ValueError('缺少许可证密钥')
+        canonical = self.normalize(license_key.strip())
+        if canonical is None:
+            raise ValueError(f"许可证密钥格式不正确: {license_key}")
+
+        created_at = parse_timestamp(record.get('created_at') or None) or imported_at
+        expires_at = parse_timestamp(record.get('expires_at') or None)
+        is_active = _parse_bool(record['is_active']) if record.get('is_active') not in (None, '') else 1
+        max_activations = record.get('max_activations') or 1
+        try:
+            max_activations = int(max_activations)
+        except (TypeError, ValueError):
+            max_activations = 0
+        if max_activations < 1:
+            raise ValueError('max_activations 必须是正整数')
+
+        metadata = record.get('metadata')
+        if isinstance(metadata, str):
+            metadata = json.loads(metadata) if metadata.strip() else None
+        if metadata is not None:
+            metadata = json.dumps(metadata, ensure_ascii=False)
+        machine_code = record.get('machine_code')
+        if machine_code is not None and not isinstance(machine_code, str):
+            raise ValueError('machine_code 必须是字符串')
+        machine_code = machine_code.strip() if machine_code else None
+        return (canonical, created_at, expires_at, is_active, max_activations, metadata, machine_code)
+
+    def __iter__(self):
+        imported_at = now()
+        for number, record in self._records():
+            self.received += 1
+            try:
+                yield self._convert(record, imported_at)
+            except ValueError as e:
+                self.invalid += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append({'line': number, 'error': str(e)})
+
+
+def _chunks(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= STAGE_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stage_keys(conn, keys) -> int:
+    """
+    将密钥写入当前连接的临时表 temp.bulk_keys，返回收到的密钥数量
+
+    之后的 UPDATE 用 license_key IN (SELECT license_key FROM temp.bulk_keys) 一次完成。
+    """
+    conn.execute('DROP TABLE IF EXISTS temp.bulk_keys')
+    conn.execute('CREATE TEMP TABLE bulk_keys (license_key TEXT PRIMARY KEY)')
+    received = 0
+    for chunk in _chunks((key,) for key in keys):
+        conn.executemany('INSERT OR IGNORE INTO temp.bulk_keys (license_key) VALUES (?)', chunk)
+        received += len(chunk)
+    return received
+
+
+def stage_licenses(conn, rows) -> int:
+    """
+    将待导入的许可证写入当前连接的临时表 temp.bulk_import，返回写入的许可证数量
+
+    输入中重复的密钥只保留第一条，收到的行数与返回值之差即为输入中的重复行。
+    """
+    conn.execute('DROP TABLE IF EXISTS temp.bulk_import')
+    conn.execute('''
+        CREATE TEMP TABLE bulk_import (
+            license_key TEXT PRIMARY KEY,
+            created_at INTEGER NOT NULL,
+            expires_at INTEGER,
+            is_active INTEGER NOT NULL,
+            max_activations INTEGER NOT NULL,
+            metadata TEXT,
+            machine_code TEXT
+        )
+    ''')
+    staged = 0
+    for chunk in _chunks(rows):
+        staged += conn.executemany('''
+            INSERT OR IGNORE INTO temp.bulk_import
+            (license_key, created_at, expires_at, is_active, max_activations, metadata, machine_code)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', chunk).rowcount
+    return staged
+
+
+def drop_staging(conn):
+    conn.execute('DROP TABLE IF EXISTS temp.bulk_keys')
+    conn.execute('DROP TABLE IF EXISTS temp.bulk_import')
@@ -0,0 +1,148 @@
+import time
+import threading
+from collections import OrderedDict
+
+GENERATION_KEY = 'license_generation'
+
+
+def read_generation(conn) -> int:
+    """读取许可证数据的变更代数"""
+    row = conn.execute(
+        'SELECT value FROM meta WHERE name = ?', (GENERATION_KEY,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def bump_generation(conn) -> int:
+    """
+    在当前事务中递增变更代数并返回新值
+
+    所有会影响验证结果的写操作（生成、禁用、激活、释放席位）都必须调用，
+    其他进程据此得知需要清空各自的缓存。
+    """
+    conn.execute(
+        'UPDATE meta SET value = value + 1 WHERE name = ?', (GENERATION_KEY,)
+    )
+    return read_generation(conn)
+
+
+class LicenseCache:
+    """
+    许可证记录的进程内 LRU/TTL 缓存
+
+    缓存许可证的状态和已激活的设备，命中时无需查询数据库。
+    多进程部署时，通过 PRAGMA data_version 检测其他连接的提交，
+    再比较 meta 表中的变更代数决定是否整体失效。
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300):
+        """
+        Args:
+            max_size: 最多缓存的许可证数量
+            ttl: 缓存条目的存活时间（秒）
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = None
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def sync(self, conn):
+        """
+        检查其他连接或进程是否修改了许可证数据
+
+        PRAGMA data_version 只反映其他连接的提交，且不需要读取数据页，
+        因此每次查询前调用的开销很小。
+        """
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if getattr(conn, 'cache_data_version', None) == data_version:
+            return
+        conn.cache_data_version = data_version
+
+        generation = read_generation(conn)
+        with self._lock:
+            if generation != self.generation:
+                if self.generation is not None:
+                    self._clear_locked()
+                self.generation = generation
+
+    def get(self, license_key: str):
+        """返回缓存的记录和当前代数，未命中时记录为 None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(license_key)
+            if entry is not None:
+                expires, row = entry
+                if expires > now:
+                    self._entries.move_to_end(license_key)
+                    self.hits += 1
+                    return row, self.generation
+                del self._entries[license_key]
+            self.misses += 1
+            return None, self.generation
+
+    def put(self, license_key: str, row, generation):
+        """
+        写入缓存
+
+        若读取期间代数已变化（数据被修改），则丢弃该记录，避免缓存旧数据。
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[license_key] = (time.monotonic() + self.ttl, row)
+            self._entries.move_to_end(license_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, license_key: str = None, generation: int = None):
+        """
+        在本进程修改数据后使缓存失效
+
+        Args:
+            license_key: 被修改的许可证，None 表示全部失效
+            generation: 修改事务中 bump_generation() 返回的新代数
+        """
+        self.invalidate_many(None if license_key is None else [license_key], generation)
+
+    def invalidate_many(self, license_keys, generation: int = None):
+        """同一事务修改了多个许可证时使用，参数含义同 invalidate()"""
+        with self._lock:
+            if generation is not None:
+                if self.generation is not None and generation - self.generation != 1:
+                    # 期间还有其他进程的修改未同步，全部失效
+                    license_keys = None
+                self.generation = generation
+            if license_keys is None:
+                self._clear_locked()
+                return
+            for license_key in license_keys:
+                if self._entries.pop(license_key, None) is not None:
+                    self.invalidations += 1
+
+    def _clear_locked(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """返回缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'generation': self.generation,
+            }
@@ -0,0 +1,50 @@
+import zlib
+
+# wbits=31 生成带 gzip 头的数据流
+_GZIP_WBITS = 31
+
+
+def gzip_bytes(data: bytes, level: int = 6) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _GZIP_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def gzip_stream(chunks, level: int = 6):
+    """
+    逐块压缩流式响应
+
+    每块之后执行 Z_SYNC_FLUSH，客户端可以边接收边解压，不必等待整个响应结束。
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _GZIP_WBITS)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response, accept_encoding: str, min_size: int = 1024):
+    """客户端接受 gzip 时压缩响应，小于 min_size 的非流式响应保持原样"""
+    if 'gzip' not in accept_encoding.lower():
+        return response
+    if response.status_code < 200 or response.status_code >= 300 or 'Content-Encoding' in response.headers:
+        return response
+
+    if response.is_streamed:
+        response.response = gzip_stream(response.response)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(gzip_bytes(data))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers.add('Vary', 'Accept-Encoding')
+    return response
@@ -0,0 +1,222 @@
+import os
+import json
+import math
+import time
+import hashlib
+import logging
+import threading
+
+SNAPSHOT_MAGIC = b'LKBF1\n'
+
+
+class BloomFilter:
+    """
+    固定大小的布隆过滤器
+
+    位数组大小和哈希函数个数由预期容量和目标误判率计算；
+    哈希使用一次 blake2b 的两个 64 位分量做双重哈希。
+    """
+
+    def __init__(self, capacity: int, fp_rate: float, bits: bytearray = None, hashes: int = None):
+        self.capacity = max(1, capacity)
+        self.fp_rate = fp_rate
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2)))
+        self.hashes = hashes or max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+
+    @staticmethod
+    def _hash(key: str):
+        value = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest(), 'little')
+        return value & 0xFFFFFFFFFFFFFFFF, (value >> 64) | 1
+
+    def update(self, keys):
+        """批量加入密钥"""
+        bits, size, hashes, digest = self.bits, self.size, range(self.hashes), self._hash
+        for key in keys:
+            h1, h2 = digest(key)
+            for i in hashes:
+                p = (h1 + i * h2) % size
+                bits[p >> 3] |= 1 << (p & 7)
+
+    def add(self, key: str):
+        self.update((key,))
+
+    def __contains__(self, key: str) -> bool:
+        # 不存在的密钥通常在前一两个位置就能确定，逐个计算位置以便提前返回
+        h1, h2 = self._hash(key)
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            p = (h1 + i * h2) % size
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+    def fill_ratio(self) -> float:
+        """已置位的比例，用于估算当前的实际误判率"""
+        value = int.from_bytes(self.bits, 'little')
+        ones = value.bit_count() if hasattr(value, 'bit_count') else bin(value).count('1')
+        return ones / self.size
+
+
+class KeyFilter:
+    """
+    已签发许可证密钥的布隆过滤器
+
+    布隆过滤器没有漏判，不在过滤器中的密钥一定不存在，/validate 可以直接拒绝，无需查询数据库。
+    过滤器覆盖 id 不超过 max_id 的所有许可证：licenses.id 是 AUTOINCREMENT 且写事务串行提交，
+    其他进程新增的许可证总是 id > max_id，sync() 发现数据库变化时增量补齐，不会误拒有效密钥。
+    """
+
+    def __init__(self, capacity: int = 1000000, fp_rate: float = 0.001, snapshot_path: str = None):
+        """
+        Args:
+            capacity: 预期的许可证数量，决定内存占用（约 capacity * 1.44 * log2(1/fp_rate) 位）
+            fp_rate: 目标误判率
+            snapshot_path: 快照文件路径，为空则不持久化
+        """
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.snapshot_path = snapshot_path
+
+        self.filter = None
+        self.max_id = 0
+        self.count = 0
+        self.source = None
+        self.build_seconds = 0.0
+
+        self.checked = 0
+        self.rejected = 0
+        self._saturation_warned = False
+        self._lock = threading.Lock()
+
+    def load_or_build(self, db):
+        """优先加载与数据库一致的快照，否则全量构建，最后补齐快照之后新增的许可证"""
+        started = time.perf_counter()
+        with db.connection() as conn:
+            total = conn.execute('SELECT COUNT(*) FROM licenses').fetchone()[0]
+            # 数量超过配置的容量时按两倍预留，避免误判率随后续生成迅速升高
+            capacity = max(self.capacity, total * 2)
+            if not self._load_snapshot(conn, capacity):
+                self.filter = BloomFilter(capacity, self.fp_rate)
+                self.max_id = 0
+                self.count = 0
+                self.source = 'database'
+            self.catch_up(conn)
+        self.build_seconds = time.perf_counter() - started
+        logging.info(f"许可证密钥过滤器就绪（{self.source}），共 {self.count} 个密钥，"
+                     f"耗时 {self.build_seconds:.2f}s")
+
+    def _load_snapshot(self, conn, capacity: int) -> bool:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                if f.readline() != SNAPSHOT_MAGIC:
+                    raise ValueError('快照格式不正确')
+                header = json.loads(f.readline())
+                bits = bytearray(f.read())
+        except (OSError, ValueError) as e:
+            logging.warning(f"读取密钥过滤器快照失败，将重新构建: {str(e)}")
+            return False
+
+        # 快照参数与当前配置不同，或数据库已被替换（max_id 对应的密钥不一致）时重新构建
+        if header.get('fp_rate') != self.fp_rate or header.get('capacity', 0) < capacity:
+            return False
+        row = conn.execute('SELECT license_key FROM licenses WHERE id = ?',
+                           (header['max_id'],)).fetchone()
+        if header['max_id'] and (row is None or row[0] != header['last_key']):
+            return False
+
+        bloom = BloomFilter(header['capacity'], header['fp_rate'], bits, header['hashes'])
+        if len(bits) != (bloom.size + 7) // 8:
+            return False
+        self.filter = bloom
+        self.max_id = header['max_id']
+        self.count = header['count']
+        self.source = 'snapshot'
+        return True
+
+    def save_snapshot(self, db):
+        """将过滤器写入快照文件（先写临时文件再替换）"""
+        if not self.snapshot_path or self.filter is None:
+            return
+        with self._lock:
+            bits = bytes(self.filter.bits)
+            header = {
+                'capacity': self.filter.capacity,
+                'fp_rate': self.filter.fp_rate,
+                'hashes': self.filter.hashes,
+                'max_id': self.max_id,
+                'count': self.count,
+            }
+        with db.connection() as conn:
+            row = conn.execute('SELECT license_key FROM licenses WHERE id = ?',
+                               (header['max_id'],)).fetchone()
+        header['last_key'] = row[0] if row else None
+
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(SNAPSHOT_MAGIC)
+                f.write(json.dumps(header).encode('utf-8') + b'\n')
+                f.write(bits)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logging.warning(f"写入密钥过滤器快照失败: {str(e)}")
+
+    def catch_up(self, conn) -> int:
+        """加入 id 大于 max_id 的已提交许可证，返回新增数量"""
+        with self._lock:
+            added = 0
+            cursor = conn.execute('SELECT id, license_key FROM licenses WHERE id > ? ORDER BY id',
+                                  (self.max_id,))
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                self.filter.update(license_key for _, license_key in rows)
+                self.max_id = rows[-1][0]
+                added += len(rows)
+            self.count += added
+        if added and self.count > self.filter.capacity and not self._saturation_warned:
+            self._saturation_warned = True
+            logging.warning(f"许可证数量 {self.count} 已超过密钥过滤器容量 {self.filter.capacity}，"
+                            "误判率会上升，重启后将按新的数量重建")
+        return added
+
+    def sync(self, conn):
+        """其他连接提交过数据时补齐新增的许可证"""
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if getattr(conn, 'keyfilter_data_version', None) == data_version:
+            return
+        self.catch_up(conn)
+        conn.keyfilter_data_version = data_version
+
+    def might_contain(self, license_key) -> bool:
+        """返回 False 时密钥一定不存在"""
+        found = str(license_key) in self.filter
+        self.checked += 1
+        if not found:
+            self.rejected += 1
+        return found
+
+    def stats(self) -> dict:
+        bloom = self.filter
+        fill = bloom.fill_ratio()
+        return {
+            'source': self.source,
+            'build_seconds': round(self.build_seconds, 3),
+            'keys': self.count,
+            'max_id': self.max_id,
+            'capacity': bloom.capacity,
+            'target_fp_rate': bloom.fp_rate,
+            'estimated_fp_rate': fill ** bloom.hashes,
+            'fill_ratio': round(fill, 4),
+            'bits': bloom.size,
+            'hashes': bloom.hashes,
+            'memory_bytes': len(bloom.bits),
+            'checked': self.checked,
+            'rejected': self.rejected,
+        }
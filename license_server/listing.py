@@ -0,0 +1,267 @@
+import io
+import re
+import csv
+import json
+
+from timestamps import TIME_FIELDS, now, parse_timestamp, format_timestamp
+
+# 可查询的字段及其在输出中的顺序
+LICENSE_FIELDS = (
+    'id', 'license_key', 'machine_code', 'created_at', 'expires_at',
+    'is_active', 'max_activations', 'seats_used', 'activation_count', 'last_seen_at', 'metadata',
+)
+DEFAULT_FIELDS = LICENSE_FIELDS[1:]
+
+# 来自 activations 表的字段。相关子查询与分页查询在同一条语句中执行，
+# 每行只是一次 (license_id, machine_code) 索引上的范围查找，不会产生 N+1 次查询。
+# machine_code 为最早激活的设备，单席位许可证与原来的绑定设备一致。
+COMPUTED_FIELDS = {
+    'machine_code': '(SELECT machine_code FROM activations WHERE license_id = licenses.id '
+                    'ORDER BY id LIMIT 1)',
+    'seats_used': '(SELECT COUNT(*) FROM activations WHERE license_id = licenses.id)',
+}
+
+# parse_filters 支持的过滤参数，另外 metadata.<name> 按附加信息中的字段过滤
+FILTER_PARAMS = (
+    'active', 'expired', 'bound', 'seats_full', 'created_after', 'created_before', 'machine_code',
+    'search',
+)
+METADATA_FILTER_PREFIX = 'metadata.'
+_METADATA_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# 可排序的字段及排序表达式，每个表达式都有对应的索引（迁移 v4），按 (排序值, id) 做键集分页，
+# 翻到任何位置都只需读取一页。永久有效的许可证排在最晚过期之后，从未验证过的排在最前。
+SORT_FIELDS = {
+    'id': 'id',
+    'license_key': 'license_key',
+    'created_at': 'created_at',
+    'expires_at': 'COALESCE(expires_at, 253402300799)',
+    'last_seen_at': 'COALESCE(last_seen_at, 0)',
+}
+
+# 密钥前缀搜索的上界后缀，大于任何密钥中可能出现的字符
+_PREFIX_END = '\U0010ffff'
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+_TRUE_VALUES = {'1', 'true', 'yes'}
+_FALSE_VALUES = {'0', 'false', 'no'}
+
+
+def _parse_bool(name: str, value: str) -> bool:
+    value = value.strip().lower()
+    if value in _TRUE_VALUES:
+        return True
+    if value in _FALSE_VALUES:
+        return False
+    raise ValueError(f"参数 {name} 必须是 1/0 或 true/false")
+
+
+def _parse_time(name: str, value: str) -> int:
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        raise ValueError(f"参数 {name} 的时间格式应为 YYYY-MM-DD[ HH:MM:SS]")
+
+
+def parse_fields(value: str = None) -> tuple:
+    """解析逗号分隔的字段投影参数"""
+    if not value:
+        return DEFAULT_FIELDS
+    fields = tuple(f.strip() for f in value.split(',') if f.strip())
+    unknown = [f for f in fields if f not in LICENSE_FIELDS]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(unknown)}")
+    return fields
+
+
+def parse_filters(args) -> tuple:
+    """
+    将查询参数转换为 WHERE 子句
+
+    支持的参数: active, expired, bound, seats_full, created_after, created_before, machine_code,
+    search（许可证密钥前缀，按原样、大写和小写匹配，或已激活设备的机器码），
+    以及 metadata.<name>（附加信息中该字段等于给定值，如 metadata.reseller=acme）
+
+    Returns:
+        (条件列表, 参数列表)
+    """
+    clauses, params = [], []
+
+    if args.get('active'):
+        # 被禁用的许可证通常只占少数。提示查询计划 is_active 索引只适合查找被禁用的许可证，
+        # 否则没有统计信息时按其他字段排序会先用该索引取出几乎所有行再排序
+        if _parse_bool('active', args['active']):
+            clauses.append('likely(is_active = 1)')
+        else:
+            clauses.append('unlikely(is_active = 0)')
+    if args.get('expired'):
+        if _parse_bool('expired', args['expired']):
+            clauses.append('expires_at IS NOT NULL AND expires_at < ?')
+        else:
+            clauses.append('(expires_at IS NULL OR expires_at >= ?)')
+        params.append(now())
+    if args.get('bound'):
+        bound = 'EXISTS (SELECT 1 FROM activations WHERE license_id = licenses.id)'
+        clauses.append(bound if _parse_bool('bound', args['bound']) else f'NOT {bound}')
+    if args.get('seats_full'):
+        operator = '>=' if _parse_bool('seats_full', args['seats_full']) else '<'
+        clauses.append(f"{COMPUTED_FIELDS['seats_used']} {operator} max_activations")
+    if args.get('created_after'):
+        clauses.append('created_at >= ?')
+        params.append(_parse_time('created_after', args['created_after']))
+    if args.get('created_before'):
+        clauses.append('created_at < ?')
+        params.append(_parse_time('created_before', args['created_before']))
+    if args.get('machine_code'):
+        clauses.append('id IN (SELECT license_id FROM activations WHERE machine_code = ?)')
+        params.append(args['machine_code'])
+    if args.get('search'):
+        # 前缀按范围比较，可以使用 license_key 的唯一索引；base32 密钥为大写，导入的 UUID 等密钥通常为小写，
+        # 同时按大写和小写匹配
+        search = args['search'].strip()
+        prefixes = list(dict.fromkeys([search, search.upper(), search.lower()]))
+        ranges = ['(license_key >= ? AND license_key < ?)'] * len(prefixes)
+        clauses.append('(' + ' OR '.join(ranges) + ' OR id IN '
+                       '(SELECT license_id FROM activations WHERE machine_code = ?))')
+        for prefix in prefixes:
+            params.extend([prefix, prefix + _PREFIX_END])
+        params.append(search)
+    for name in args:
+        if not name.startswith(METADATA_FILTER_PREFIX) or not args.get(name):
+            continue
+        field = name[len(METADATA_FILTER_PREFIX):]
+        if not _METADATA_NAME.match(field):
+            raise ValueError(f"无效的附加信息字段: {field}")
+        clauses.append('CAST(json_extract(metadata, ?) AS TEXT) = ?')
+        params.extend([f'$.{field}', args[name]])
+    return clauses, params
+
+
+def unknown_filters(args) -> list:
+    """返回 parse_filters 不认识的参数名，批量修改时拒绝拼错的条件，避免扩大修改范围"""
+    return [name for name in args
+            if name not in FILTER_PARAMS and not name.startswith(METADATA_FILTER_PREFIX)]
+
+
+def parse_sort(value: str = None) -> tuple:
+    """解析排序参数，如 expires_at 或 -expires_at（降序），返回 (字段, 是否降序)"""
+    if not value:
+        return 'id', False
+    descending = value.startswith('-')
+    field = value.lstrip('-')
+    if field not in SORT_FIELDS:
+        raise ValueError(f"不支持按 {field} 排序，可选: {', '.join(SORT_FIELDS)}")
+    return field, descending
+
+
+def encode_cursor(sort: str, position):
+    """将 iter_pages 产出的位置转换为 API 返回的 next_cursor，按 id 排序时仍为整数"""
+    if sort == 'id':
+        return position
+    return f'{position[0]}:{position[1]}'
+
+
+def decode_cursor(sort: str, cursor):
+    """解析请求中的 after 参数，为空时返回 None（从第一页开始）"""
+    if not cursor:
+        return None
+    try:
+        if sort == 'id':
+            return int(cursor)
+        value, last_id = cursor.rsplit(':', 1)
+        return (value if sort == 'license_key' else int(value)), int(last_id)
+    except ValueError:
+        raise ValueError(f"无效的分页游标: {cursor}")
+
+
+def iter_pages(db, fields, clauses, params, after=0, page_size: int = DEFAULT_PAGE_SIZE,
+               limit: int = None, sort: str = 'id', descending: bool = False):
+    """
+    按排序字段做键集分页，逐页产出 (最后一行的位置, 行列表)
+
+    按 id 排序时位置为 id，否则为 (排序值, id)；after 为 None 时从第一页开始。
+    每页单独借用连接，客户端读取缓慢时不会长期占用连接。
+    limit 为 None 时遍历全部匹配的记录。
+    """
+    expression = SORT_FIELDS[sort]
+    operator, direction = ('<', 'DESC') if descending else ('>', 'ASC')
+    columns = ', '.join(('id', expression) + tuple(COMPUTED_FIELDS.get(f, f) for f in fields))
+    if sort == 'id':
+        keyset, order = f'id {operator} ?', f'id {direction}'
+    else:
+        # 第一个条件确定索引扫描的起点，排序值相同的行再按 id 区分
+        keyset = f'{expression} {operator}= ? AND ({expression} {operator} ? OR id {operator} ?)'
+        order = f'{expression} {direction}, id {direction}'
+
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        where, values = list(clauses), list(params)
+        if after is not None:
+            where.insert(0, keyset)
+            values[:0] = [after] if sort == 'id' else [after[0], after[0], after[1]]
+        sql = (f'SELECT {columns} FROM licenses WHERE {" AND ".join(where) or "1"} '
+               f'ORDER BY {order} LIMIT ?')
+        with db.connection() as conn:
+            rows = conn.execute(sql, values + [size]).fetchall()
+        if not rows:
+            return
+        after = rows[-1][0] if sort == 'id' else (rows[-1][1], rows[-1][0])
+        yield after, [row[2:] for row in rows]
+        if len(rows) < size:
+            return
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def _format_row(fields, row) -> list:
+    """将数据库中的时间戳转换为 API 使用的时间字符串"""
+    row = list(row)
+    for i, field in enumerate(fields):
+        if field in TIME_FIELDS:
+            row[i] = format_timestamp(row[i])
+    return row
+
+
+def row_to_dict(fields, row) -> dict:
+    item = dict(zip(fields, _format_row(fields, row)))
+    if item.get('metadata'):
+        item['metadata'] = json.loads(item['metadata'])
+    return item
+
+
+def stream_json_array(pages, fields):
+    """以 JSON 数组形式流式输出，兼容旧版一次性返回全部记录的接口"""
+    yield '['
+    first = True
+    for _, rows in pages:
+        chunk = []
+        for row in rows:
+            chunk.append(json.dumps(row_to_dict(fields, row), ensure_ascii=False))
+        if chunk:
+            yield ('' if first else ',') + ','.join(chunk)
+            first = False
+    yield ']'
+
+
+def stream_ndjson(pages, fields):
+    for _, rows in pages:
+        yield ''.join(
+            json.dumps(row_to_dict(fields, row), ensure_ascii=False) + '\n'
+            for row in rows
+        )
+
+
+def stream_csv(pages, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for _, rows in pages:
+        writer.writerows(_format_row(fields, row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,353 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+
+from cache import bump_generation
+
+# 按执行顺序排列的维护任务
+JOBS = ('backup', 'expiry_sweep', 'checkpoint', 'optimize', 'vacuum')
+
+# 只在空闲时执行的任务，超过两个周期仍未等到空闲时照常执行
+IDLE_JOBS = frozenset({'checkpoint', 'optimize', 'vacuum'})
+
+# meta 表中记录各任务上次执行时间的键，多个进程共享数据库时同一任务只由一个进程执行
+CLAIM_KEY_PREFIX = 'maintenance.'
+
+# PRAGMA optimize 需要补充统计信息时，ANALYZE 每个索引最多扫描的行数
+ANALYSIS_LIMIT = 1000
+
+
+class _BackupCancelled(Exception):
+    """服务器停止时中断正在进行的备份"""
+
+
+class MaintenanceScheduler:
+    """
+    数据库后台维护
+
+    一个后台线程按各自的间隔执行以下任务，每个任务的耗时、处理的页数和结果通过 stats() 查看：
+
+    - backup: 用 sqlite3 在线备份 API 每次复制 step_pages 页，复制期间持有读事务固定快照，
+      既不阻塞验证请求的读写，也不会因为并发写入而从头开始；完成后原子重命名，只保留最新的 keep 份
+    - expiry_sweep: 在一个事务中将过期超过宽限期的许可证标记为禁用
+    - checkpoint: PASSIVE 模式的 WAL 检查点，不等待读写事务
+    - optimize: PRAGMA optimize，按需更新查询计划的统计信息
+    - vacuum: auto_vacuum=INCREMENTAL 的数据库分批释放空闲页，每批一个短事务
+
+    后三项只在持续 idle_seconds 没有请求时执行。
+    """
+
+    def __init__(self, db, backup_dir: str, backup_interval: float = 86400, backup_keep: int = 7,
+                 backup_step_pages: int = 256, backup_step_sleep: float = 0.005,
+                 expiry_interval: float = 3600, expiry_grace_days: int = 30,
+                 checkpoint_interval: float = 300, optimize_interval: float = 3600,
+                 vacuum_interval: float = 3600, vacuum_step_pages: int = 256,
+                 idle_seconds: float = 5, on_change=None, tick: float = 1.0):
+        """
+        Args:
+            db: 许可证数据库的 Database 连接池
+            backup_dir: 备份目录
+            backup_interval: 自动备份间隔（秒），0 表示只在手动触发时备份
+            backup_keep: 保留的备份数量
+            backup_step_pages: 备份每一步复制的页数
+            backup_step_sleep: 备份每一步之间的间隔（秒）
+            expiry_interval: 过期清理间隔（秒），0 表示不自动清理
+            expiry_grace_days: 过期超过该天数的许可证才会被禁用
+            checkpoint_interval: WAL 检查点间隔（秒）
+            optimize_interval: PRAGMA optimize 间隔（秒）
+            vacuum_interval: 增量清理间隔（秒）
+            vacuum_step_pages: 增量清理每个事务释放的页数
+            idle_seconds: 持续这么久没有请求视为空闲
+            on_change: 过期清理修改了许可证后调用 on_change(generation)
+            tick: 检查是否有到期任务的间隔（秒）
+        """
+        self.db = db
+        self.backup_dir = backup_dir
+        self.backup_keep = max(1, backup_keep)
+        self.backup_step_pages = backup_step_pages
+        self.backup_step_sleep = backup_step_sleep
+        self.expiry_grace_days = expiry_grace_days
+        self.vacuum_step_pages = vacuum_step_pages
+        self.idle_seconds = idle_seconds
+        self.on_change = on_change
+        self.tick = tick
+
+        name = os.path.splitext(os.path.basename(db.path))[0] or 'licenses'
+        self._backup_prefix = name
+        self._backup_pattern = re.compile(rf'^{re.escape(name)}-\d{{8}}-\d{{6}}\.db$')
+
+        intervals = {
+            'backup': backup_interval,
+            'expiry_sweep': expiry_interval,
+            'checkpoint': checkpoint_interval,
+            'optimize': optimize_interval,
+            'vacuum': vacuum_interval,
+        }
+        self._jobs = {name: {
+            'interval': intervals[name],
+            'last_run': None,
+            'duration': None,
+            'pages': None,
+            'status': None,
+            'error': None,
+            'runs': 0,
+            'failures': 0,
+        } for name in JOBS}
+        # 本进程上次确认任务是否到期的时间；空闲任务在启动一个周期之后才第一次执行
+        started = time.time()
+        self._checked = {name: started if name in IDLE_JOBS else 0.0 for name in JOBS}
+        self._requested = set()
+        self._running = None
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.last_activity = time.monotonic()
+
+    def start(self):
+        """启动后台维护线程"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='db-maintenance', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程，正在进行的备份被中断并删除临时文件"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def touch(self):
+        """记录一次请求，用于判断是否空闲"""
+        self.last_activity = time.monotonic()
+
+    def idle(self) -> bool:
+        return time.monotonic() - self.last_activity >= self.idle_seconds
+
+    def run_now(self, name: str):
+        """
+        请求尽快执行指定任务，不等待间隔和空闲
+
+        Raises:
+            ValueError: 未知的任务名
+        """
+        if name not in self._jobs:
+            raise ValueError(f"未知的维护任务: {name}，可选: {', '.join(JOBS)}")
+        with self._lock:
+            self._requested.add(name)
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.tick)
+            self._wakeup.clear()
+            for name in JOBS:
+                if self._stopped.is_set():
+                    break
+                try:
+                    if self._due(name):
+                        self.run_job(name)
+                except Exception as e:
+                    logging.error(f"维护任务 {name} 调度失败: {str(e)}")
+
+    def _due(self, name: str) -> bool:
+        with self._lock:
+            if name in self._requested:
+                self._requested.discard(name)
+                return True
+        interval = self._jobs[name]['interval']
+        if not interval:
+            return False
+        current = time.time()
+        checked = self._checked[name]
+        if current - checked < interval:
+            return False
+        if name in IDLE_JOBS and not self.idle() and current - checked < 2 * interval:
+            return False
+        last = self._claim(name, interval, current)
+        if last is not None:
+            # 其他进程（或重启前的本进程）已在这个周期内执行过
+            self._checked[name] = last
+            return False
+        self._checked[name] = current
+        return True
+
+    def _claim(self, name: str, interval: float, current: float):
+        """在 meta 表中登记本次执行，返回 None 表示由本进程执行，否则返回上次执行的时间"""
+        key = CLAIM_KEY_PREFIX + name
+        with self.db.transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO meta (name, value) VALUES (?, 0)', (key,))
+            last = conn.execute('SELECT value FROM meta WHERE name = ?', (key,)).fetchone()[0]
+            if current - last < interval:
+                return last
+            conn.execute('UPDATE meta SET value = ? WHERE name = ?', (int(current), key))
+        return None
+
+    def run_job(self, name: str) -> dict:
+        """在当前线程中执行一个任务，返回该任务的状态"""
+        job = self._jobs[name]
+        with self._lock:
+            self._running = name
+        started = time.perf_counter()
+        try:
+            details = getattr(self, name)()
+            status, error = details.pop('status', 'ok'), None
+        except _BackupCancelled:
+            details, status, error = {}, 'cancelled', None
+        except Exception as e:
+            logging.error(f"维护任务 {name} 失败: {str(e)}")
+            details, status, error = {}, 'error', str(e)
+        duration = time.perf_counter() - started
+        with self._lock:
+            self._running = None
+            job.update(details)
+            job['last_run'] = int(time.time())
+            job['duration'] = round(duration, 3)
+            job['status'] = status
+            job['error'] = error
+            job['runs'] += 1
+            if status == 'error':
+                job['failures'] += 1
+            return dict(job)
+
+    def backup(self) -> dict:
+        """在线备份到 backup_dir，返回复制的页数和备份文件"""
+        os.makedirs(self.backup_dir, exist_ok=True)
+        filename = f"{self._backup_prefix}-{time.strftime('%Y%m%d-%H%M%S')}.db"
+        path = os.path.join(self.backup_dir, filename)
+        tmp_path = path + '.tmp'
+        progress = {'steps': 0, 'pages': 0}
+
+        def on_progress(status, remaining, total):
+            progress['steps'] += 1
+            progress['pages'] = total
+            if self._stopped.is_set():
+                raise _BackupCancelled()
+            # backup() 的 sleep 参数只在源数据库忙时生效，步与步之间的停顿在这里完成
+            if remaining and self.backup_step_sleep:
+                time.sleep(self.backup_step_sleep)
+
+        try:
+            target = sqlite3.connect(tmp_path, isolation_level=None)
+            try:
+                with self.db.connection() as source:
+                    # 在读事务中复制：WAL 模式下快照固定，其他连接的写入不会让备份从头开始
+                    source.execute('BEGIN')
+                    try:
+                        source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+                        source.backup(target, pages=self.backup_step_pages, progress=on_progress)
+                    finally:
+                        source.execute('ROLLBACK')
+                # 备份文件单独使用，不需要 -wal 文件
+                target.execute('PRAGMA journal_mode=DELETE')
+            finally:
+                target.close()
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        removed = self._rotate_backups()
+        logging.info(f"数据库已备份到 {path}，共 {progress['pages']} 页")
+        return {
+            'pages': progress['pages'],
+            'steps': progress['steps'],
+            'path': path,
+            'size': os.path.getsize(path),
+            'removed': removed,
+        }
+
+    def backups(self) -> list:
+        """返回现有的备份文件，最新的在前"""
+        try:
+            names = [name for name in os.listdir(self.backup_dir) if self._backup_pattern.match(name)]
+        except FileNotFoundError:
+            return []
+        return sorted(names, reverse=True)
+
+    def _rotate_backups(self) -> list:
+        removed = []
+        for name in self.backups()[self.backup_keep:]:
+            try:
+                os.remove(os.path.join(self.backup_dir, name))
+                removed.append(name)
+            except OSError as e:
+                logging.warning(f"删除旧备份失败: {name}: {str(e)}")
+        return removed
+
+    def expiry_sweep(self) -> dict:
+        """将过期超过宽限期的许可证标记为禁用"""
+        cutoff = int(time.time()) - self.expiry_grace_days * 86400
+        with self.db.transaction() as conn:
+            deactivated = conn.execute('''
+                UPDATE licenses SET is_active = 0
+                WHERE is_active = 1 AND expires_at IS NOT NULL AND expires_at < ?
+            ''', (cutoff,)).rowcount
+            generation = bump_generation(conn) if deactivated else None
+        if deactivated:
+            logging.info(f"禁用过期许可证 {deactivated} 个")
+            if self.on_change:
+                self.on_change(generation)
+        return {'deactivated': deactivated}
+
+    def checkpoint(self) -> dict:
+        """PASSIVE 检查点，返回 WAL 中的页数和已写回数据库的页数"""
+        with self.db.connection() as conn:
+            busy, wal_pages, pages = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+        return {'pages': pages, 'wal_pages': wal_pages, 'busy': bool(busy)}
+
+    def optimize(self) -> dict:
+        # 连接池后进先出，取到的通常是刚处理过查询的连接，optimize 据此判断需要分析的表
+        with self.db.connection() as conn:
+            conn.execute(f'PRAGMA analysis_limit={ANALYSIS_LIMIT}')
+            conn.execute('PRAGMA optimize')
+        return {}
+
+    def vacuum(self) -> dict:
+        """分批释放空闲页，有新请求时停止，剩余的留到下次"""
+        with self.db.connection() as conn:
+            mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if mode != 2:
+            return {'status': 'skipped', 'note': '数据库未启用 auto_vacuum=INCREMENTAL',
+                    'pages': 0, 'free_pages': free}
+
+        freed = 0
+        started = time.monotonic()
+        while free and not self._stopped.is_set():
+            if freed and self.last_activity > started:
+                break
+            step = min(free, self.vacuum_step_pages)
+            with self.db.transaction() as conn:
+                # Python 每次执行只推进一步，每步释放一页
+                for _ in range(step):
+                    conn.execute('PRAGMA incremental_vacuum')
+                free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            freed += step
+        return {'pages': freed, 'free_pages': free}
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = {}
+            for name, job in self._jobs.items():
+                jobs[name] = dict(job)
+                checked = max(self._checked[name], job['last_run'] or 0)
+                # 尚未确认过的任务在下一次检查时执行
+                jobs[name]['next_run'] = int(checked + job['interval']) if job['interval'] and checked else None
+            running = self._running
+        return {
+            'running': running,
+            'idle': self.idle(),
+            'jobs': jobs,
+            'backup_dir': self.backup_dir,
+            'backups': self.backups(),
+        }
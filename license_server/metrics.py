@@ -0,0 +1,224 @@
+import re
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+
+# 请求延迟的直方图分桶（秒）
+REQUEST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# SQL 语句耗时的直方图分桶（秒）
+SQL_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(names, values, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else str(int(value))
+    return str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        lines = self._header()
+        for labels, value in series:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def set(self, value, *labels):
+        """同步由其他组件维护的累计值"""
+        with self._lock:
+            self._series[labels] = value
+
+
+class Gauge(_Metric):
+    """可任意设置的瞬时值"""
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._series[labels] = value
+
+
+class Histogram(_Metric):
+    """
+    固定分桶的直方图
+
+    每个标签组合保存各桶的（非累计）计数和总和，observe() 只做一次二分查找和两次加法，
+    累计计数在导出时计算。
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # 最后两项分别是 +Inf 桶和总和
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        lines = self._header()
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(values[-1])}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """进程内的指标集合，以 Prometheus 文本格式导出"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=REQUEST_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+_TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?'
+                            r'([A-Za-z_][A-Za-z0-9_]*)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def statement_label(sql: str) -> str:
+    """
+    将 SQL 语句归类为 "操作 表名"（如 "select licenses"）作为指标标签
+
+    语句文本基本是常量，结果缓存后每次只需一次字典查找；
+    不直接使用语句文本，避免 IN 查询的占位符数量造成标签基数膨胀。
+    """
+    words = sql.split(None, 1)
+    if not words:
+        return 'unknown'
+    verb = words[0].lower()
+    if verb in ('pragma', 'begin', 'commit', 'rollback', 'savepoint', 'release'):
+        return verb
+    match = _TABLE_PATTERN.search(sql)
+    return f'{verb} {match.group(1).lower()}' if match else verb
+
+
+class ServerMetrics:
+    """许可证服务器的请求、SQL 和验证结果指标"""
+
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        self.requests = self.registry.histogram(
+            'license_http_request_duration_seconds', 'HTTP 请求处理耗时（流式响应为首字节前的耗时）',
+            ('method', 'route', 'status'))
+        self.sql = self.registry.histogram(
+            'license_sql_statement_duration_seconds', 'SQL 语句执行耗时（不含逐行读取结果）',
+            ('statement',), SQL_BUCKETS)
+        self.validations = self.registry.counter(
+            'license_validations_total', '许可证验证结果', ('outcome',))
+        self.cache_entries = self.registry.gauge('license_cache_entries', '许可证缓存条目数')
+        self.cache_events = self.registry.counter('license_cache_events_total', '许可证缓存事件数', ('event',))
+        self.audit_queued = self.registry.gauge('license_audit_queue_size', '等待写入的审计事件数')
+        self.audit_events = self.registry.counter('license_audit_events_total', '审计事件处理结果', ('result',))
+        self.key_filter_checks = self.registry.counter(
+            'license_key_filter_checks_total', '密钥过滤器检查次数', ('result',))
+        self.rate_limited = self.registry.counter(
+            'license_rate_limited_total', '因请求过快被拒绝的次数', ('scope',))
+        self.rate_limit_entries = self.registry.gauge(
+            'license_rate_limit_entries', '限流器跟踪的条目数', ('scope',))
+        self.requests_active = self.registry.gauge('license_requests_active', '正在处理的请求数')
+        self.requests_shed = self.registry.counter('license_requests_shed_total', '因服务器繁忙被拒绝的请求数')
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        self.requests.observe(seconds, method, route, status)
+
+    def observe_sql(self, sql: str, seconds: float):
+        self.sql.observe(seconds, statement_label(sql))
+
+    def record_validation(self, outcome: str, amount: int = 1):
+        self.validations.inc(outcome, amount=amount)
+
+    def update_cache(self, stats: dict):
+        """导出前同步许可证缓存的统计"""
+        self.cache_entries.set(stats['size'])
+        for event in ('hits', 'misses', 'evictions', 'invalidations'):
+            self.cache_events.set(stats[event], event)
+
+    def update_audit(self, stats: dict):
+        """导出前同步审计日志的统计"""
+        self.audit_queued.set(stats['queued'])
+        for result in ('written', 'dropped', 'sampled_out', 'failed'):
+            self.audit_events.set(stats[result], result)
+
+    def update_key_filter(self, checked: int, rejected: int):
+        """导出前同步密钥过滤器的检查次数"""
+        self.key_filter_checks.set(checked - rejected, 'passed')
+        self.key_filter_checks.set(rejected, 'rejected')
+
+    def update_rate_limits(self, by_ip: dict, by_key: dict):
+        """导出前同步限流器状态"""
+        for scope, stats in (('ip', by_ip), ('license', by_key)):
+            self.rate_limited.set(stats['limited'], scope)
+            self.rate_limit_entries.set(stats['entries'], scope)
+
+    def update_concurrency(self, stats: dict):
+        self.requests_active.set(stats['active'])
+        self.requests_shed.set(stats['rejected'])
+
+    def render(self) -> str:
+        return self.registry.render()
@@ -0,0 +1,173 @@
+import logging
+
+from cache import GENERATION_KEY
+
+
+def _initial_schema(conn):
+    """v1: 旧版 init_db 创建的表结构，兼容缺少后加列的旧数据库"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS licenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            license_key TEXT UNIQUE NOT NULL,
+            machine_code TEXT,
+            created_at DATETIME NOT NULL,
+            expires_at DATETIME,
+            is_active BOOLEAN DEFAULT 1,
+            activation_count INTEGER DEFAULT 0,
+            last_seen_at DATETIME,
+            metadata TEXT
+        )
+    ''')
+    # 许可证数据的变更代数，用于多进程间的缓存失效
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO meta (name, value) VALUES (?, 0)
+    ''', (GENERATION_KEY,))
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(licenses)')}
+    if 'last_seen_at' not in columns:
+        conn.execute('ALTER TABLE licenses ADD COLUMN last_seen_at DATETIME')
+    if 'metadata' not in columns:
+        conn.execute('ALTER TABLE licenses ADD COLUMN metadata TEXT')
+
+
+def _epoch_timestamps(conn):
+    """
+    v2: 时间字段改为 Unix 时间戳（整数秒），并为常用查询条件建立索引
+
+    旧数据以本地时间文本存储（部分为带微秒的 datetime 格式），
+    通过 strftime('%s', ..., 'utc') 换算；无法解析的创建时间以迁移时间代替。
+    """
+    conn.execute('''
+        CREATE TABLE licenses_v2 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            license_key TEXT UNIQUE NOT NULL,
+            machine_code TEXT,
+            created_at INTEGER NOT NULL,
+            expires_at INTEGER,
+            is_active INTEGER NOT NULL DEFAULT 1,
+            activation_count INTEGER NOT NULL DEFAULT 0,
+            last_seen_at INTEGER,
+            metadata TEXT
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO licenses_v2 (id, license_key, machine_code, created_at, expires_at,
+                                 is_active, activation_count, last_seen_at, metadata)
+        SELECT id, license_key, machine_code,
+               COALESCE(CAST(strftime('%s', created_at, 'utc') AS INTEGER),
+                        CAST(strftime('%s', 'now') AS INTEGER)),
+               CAST(strftime('%s', expires_at, 'utc') AS INTEGER),
+               COALESCE(is_active, 1),
+               COALESCE(activation_count, 0),
+               CAST(strftime('%s', last_seen_at, 'utc') AS INTEGER),
+               metadata
+        FROM licenses
+    ''')
+    conn.execute('DROP TABLE licenses')
+    conn.execute('ALTER TABLE licenses_v2 RENAME TO licenses')
+    conn.execute('CREATE INDEX idx_licenses_machine_code ON licenses (machine_code)')
+    conn.execute('CREATE INDEX idx_licenses_expires_at ON licenses (expires_at)')
+    conn.execute('CREATE INDEX idx_licenses_is_active ON licenses (is_active)')
+
+
+def _activations(conn):
+    """
+    v3: 多席位许可证
+
+    licenses 增加 max_activations（默认 1，与原来一个许可证只能绑定一台设备的行为一致），
+    设备绑定移到 activations 表，每台设备一行；原 machine_code 列中的绑定迁移为激活记录。
+    (license_id, machine_code) 唯一索引同时用于检查设备是否已激活和统计已用席位。
+    """
+    conn.execute('''
+        CREATE TABLE licenses_v3 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            license_key TEXT UNIQUE NOT NULL,
+            created_at INTEGER NOT NULL,
+            expires_at INTEGER,
+            is_active INTEGER NOT NULL DEFAULT 1,
+            max_activations INTEGER NOT NULL DEFAULT 1,
+            activation_count INTEGER NOT NULL DEFAULT 0,
+            last_seen_at INTEGER,
+            metadata TEXT
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO licenses_v3 (id, license_key, created_at, expires_at, is_active,
+                                 activation_count, last_seen_at, metadata)
+        SELECT id, license_key, created_at, expires_at, is_active,
+               activation_count, last_seen_at, metadata
+        FROM licenses
+    ''')
+    conn.execute('''
+        CREATE TABLE activations (
+            id INTEGER PRIMARY KEY,
+            license_id INTEGER NOT NULL REFERENCES licenses (id),
+            machine_code TEXT NOT NULL,
+            first_seen INTEGER NOT NULL,
+            last_seen INTEGER NOT NULL,
+            UNIQUE (license_id, machine_code)
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO activations (license_id, machine_code, first_seen, last_seen)
+        SELECT id, machine_code, COALESCE(last_seen_at, created_at), COALESCE(last_seen_at, created_at)
+        FROM licenses
+        WHERE machine_code IS NOT NULL
+    ''')
+    conn.execute('DROP TABLE licenses')
+    conn.execute('ALTER TABLE licenses_v3 RENAME TO licenses')
+    conn.execute('CREATE INDEX idx_licenses_expires_at ON licenses (expires_at)')
+    conn.execute('CREATE INDEX idx_licenses_is_active ON licenses (is_active)')
+    conn.execute('CREATE INDEX idx_activations_machine_code ON activations (machine_code)')
+
+
+def _sort_indexes(conn):
+    """
+    许可证列表按时间排序翻页时使用的索引，表达式与 listing.SORT_FIELDS 保持一致
+
+    索引显式包含 id，ORDER BY (排序值, id) 可以直接按索引顺序读取一页而不必排序全部匹配的行。
+    同时收集已有数据的统计信息，供查询计划在排序索引和过滤条件的索引之间选择。
+    """
+    conn.execute('CREATE INDEX idx_licenses_created_at ON licenses (created_at, id)')
+    conn.execute('CREATE INDEX idx_licenses_expires_sort ON licenses (COALESCE(expires_at, 253402300799), id)')
+    conn.execute('CREATE INDEX idx_licenses_last_seen_sort ON licenses (COALESCE(last_seen_at, 0), id)')
+    conn.execute('ANALYZE licenses')
+
+
+# (版本号, 说明, 迁移函数)，版本号必须连续递增，已发布的迁移不可修改
+MIGRATIONS = [
+    (1, '初始表结构', _initial_schema),
+    (2, '时间字段改为 Unix 时间戳并添加索引', _epoch_timestamps),
+    (3, '多席位许可证，绑定关系移到 activations 表', _activations),
+    (4, '许可证列表排序索引', _sort_indexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(db) -> int:
+    """
+    将数据库升级到最新版本，返回升级后的版本号
+
+    版本号记录在 PRAGMA user_version 中。每个迁移在独立的 IMMEDIATE 事务中执行，
+    多个工作进程同时启动时只有一个会真正执行迁移。
+    """
+    for version, description, apply in MIGRATIONS:
+        with db.transaction() as conn:
+            current = conn.execute('PRAGMA user_version').fetchone()[0]
+            if current >= version:
+                continue
+            logging.info(f"执行数据库迁移 v{version}: {description}")
+            apply(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+
+    with db.connection() as conn:
+        current = conn.execute('PRAGMA user_version').fetchone()[0]
+    if current > LATEST_VERSION:
+        logging.warning(f"数据库版本 v{current} 高于程序支持的 v{LATEST_VERSION}")
+    return current
@@ -0,0 +1,108 @@
+import math
+import time
+import threading
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """
+    按键（客户端 IP、许可证等）限流的令牌桶
+
+    每个键以 rate 个/秒的速度补充令牌，最多积累 burst 个。
+    空闲超过 burst / rate 秒的桶已经补满，与不存在等价，可以直接删除，
+    因此状态只与活跃的键数量成正比。条目按最近访问时间排序，每次调用顺带清理最旧的空闲条目。
+    """
+
+    def __init__(self, rate: float, burst: int, max_entries: int = 100000):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            burst: 桶容量，即允许的突发请求数
+            max_entries: 最多跟踪的键数量，超出时淘汰最久未访问的键
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        self.idle_ttl = burst / rate
+
+        self._buckets = OrderedDict()  # key -> [tokens, last_refill]
+        self._lock = threading.Lock()
+        self.limited = 0
+        self.evictions = 0
+
+    def acquire(self, key, cost: float = 1) -> float:
+        """
+        尝试消耗 cost 个令牌
+
+        Returns:
+            0 表示允许；否则为需要等待的秒数
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                self._buckets.move_to_end(key)
+
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            self.limited += 1
+            return (cost - bucket[0]) / self.rate
+
+    def _evict_idle(self, now: float):
+        buckets = self._buckets
+        while buckets:
+            key, (_, last) = next(iter(buckets.items()))
+            if now - last < self.idle_ttl and len(buckets) < self.max_entries:
+                break
+            del buckets[key]
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._buckets),
+                'rate': self.rate,
+                'burst': self.burst,
+                'limited': self.limited,
+                'evictions': self.evictions,
+            }
+
+
+class ConcurrencyLimiter:
+    """限制同时处理的请求数，已满时立即拒绝而不是排队等待"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.active >= self.limit:
+                self.rejected += 1
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'limit': self.limit, 'active': self.active, 'rejected': self.rejected}
+
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After 只接受整数秒，向上取整且至少为 1"""
+    return str(max(1, math.ceil(seconds)))
@@ -1,12 +1,114 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+import os
+import json
+import time
+import sys
 import sqlite3
-import datetime
+import uuid
+import atexit
 import logging
+import threading
 from flask_cors import CORS
+from storage import Database, DEFAULT_DB_PATH, immediate_transaction
+from cache import LicenseCache, bump_generation
+from activity import ActivationRecorder
+from timestamps import now, parse_timestamp, format_timestamp
+from compression import compress_response
+from metrics import ServerMetrics
+from audit import AuditLog, DEFAULT_AUDIT_DB_PATH, WINDOWS
+from keyfilter import KeyFilter
+from ratelimit import TokenBucketLimiter, ConcurrencyLimiter, retry_after_header
+from maintenance import MaintenanceScheduler, JOBS as MAINTENANCE_JOBS
+
+try:
+    from license_system import keycodec
+except ImportError:
+    # 直接在源码目录中运行服务器时，客户端包可能尚未安装
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from license_system import keycodec
+import bulk
+import listing
+import migrations
 
 app = Flask(__name__)
+app.config['DATABASE'] = os.environ.get('LICENSE_DB_PATH', DEFAULT_DB_PATH)
+app.config['LICENSE_CACHE_SIZE'] = 10000   # 缓存的许可证数量上限
+app.config['LICENSE_CACHE_TTL'] = 300      # 缓存条目存活时间（秒）
+app.config['ACTIVATION_WRITE_MODE'] = os.environ.get('ACTIVATION_WRITE_MODE', 'batched')  # batched 或 sync
+app.config['ACTIVATION_FLUSH_INTERVAL'] = 1.0  # 激活次数批量写入间隔（秒）
+app.config['ACTIVATION_FLUSH_SIZE'] = 1000     # 待写入许可证数达到该值时立即写入
+app.config['VALIDATE_BATCH_LIMIT'] = 1000      # 批量验证单次最多条目数
+app.config['GENERATE_BATCH_LIMIT'] = 100000    # 批量生成单次最多数量
+app.config['GENERATE_CHUNK_SIZE'] = 5000       # 批量生成时每个事务插入的数量
+app.config['TOKEN_PRIVATE_KEY'] = os.environ.get('LICENSE_TOKEN_KEY')  # 离线令牌签名私钥（PEM），为空则不签发
+app.config['TOKEN_TTL'] = 7 * 24 * 3600        # 离线令牌有效期（秒）
+app.config['ADMIN_GZIP'] = True                # 客户端支持时以 gzip 压缩管理接口的响应
+app.config['GZIP_MIN_SIZE'] = 1024             # 小于该字节数的响应不压缩
+app.config['METRICS_ENABLED'] = True           # 统计请求、SQL 耗时和验证结果，通过 /metrics 导出
+app.config['AUDIT_ENABLED'] = True             # 记录每次验证的审计日志
+app.config['AUDIT_DATABASE'] = os.environ.get('LICENSE_AUDIT_DB_PATH', DEFAULT_AUDIT_DB_PATH)  # 审计日志单独存放
+app.config['AUDIT_QUEUE_SIZE'] = 10000         # 等待写入的审计事件上限，超出后丢弃
+app.config['AUDIT_BATCH_SIZE'] = 500           # 每个事务写入的审计事件数
+app.config['AUDIT_FLUSH_INTERVAL'] = 1.0       # 审计事件批量写入间隔（秒）
+app.config['AUDIT_SAMPLE_RATE'] = 0.1          # 队列过半时成功验证事件的保留比例
+app.config['AUDIT_RETENTION_DAYS'] = 90        # 审计记录保留天数，0 表示永久保留
+app.config['KEY_FILTER_ENABLED'] = True        # 用布隆过滤器直接拒绝不存在的许可证密钥
+app.config['KEY_FILTER_CAPACITY'] = 1000000    # 过滤器预期容纳的密钥数量，决定内存占用
+app.config['KEY_FILTER_FP_RATE'] = 0.001       # 过滤器的目标误判率
+app.config['KEY_FILTER_SNAPSHOT'] = None       # 过滤器快照路径，默认为数据库路径加 .keys
+app.config['LICENSE_KEY_FORMAT'] = 'base32'    # 新许可证密钥的格式：base32（带校验位）或 uuid
+app.config['LICENSE_KEY_SECRET'] = os.environ.get('LICENSE_KEY_SECRET')  # 密钥 MAC 的服务器密钥，设置后不可更换
+app.config['LICENSE_KEY_CHECK'] = True         # 验证前检查密钥格式、校验位和 MAC
+app.config['RATE_LIMIT_ENABLED'] = True        # 对验证接口按客户端 IP 和许可证限流
+app.config['RATE_LIMIT_IP_RATE'] = 20          # 每个 IP 每秒可验证的次数（批量验证计为一次）
+app.config['RATE_LIMIT_IP_BURST'] = 60         # 每个 IP 允许的突发请求数
+app.config['RATE_LIMIT_KEY_RATE'] = 1          # 每个许可证每个席位每秒可验证的次数
+app.config['RATE_LIMIT_KEY_BURST'] = 10        # 每个许可证每个席位允许的突发验证数
+app.config['RATE_LIMIT_MAX_ENTRIES'] = 100000  # 每个限流器最多跟踪的 IP 或许可证数量
+app.config['MAX_CONCURRENT_REQUESTS'] = 64     # 同时处理的请求上限，超出时立即返回 503，0 表示不限制
+app.config['BUSY_RETRY_AFTER'] = 1             # 返回 503 时建议客户端等待的秒数
+app.config['MAINTENANCE_ENABLED'] = True       # 后台维护线程：在线备份、过期清理、WAL 检查点、优化和空闲页清理
+app.config['MAINTENANCE_IDLE_SECONDS'] = 5     # 持续这么久没有请求视为空闲，检查点、优化和空闲页清理只在空闲时执行
+app.config['BACKUP_DIR'] = os.environ.get('LICENSE_BACKUP_DIR')  # 备份目录，默认为数据库所在目录下的 backups
+app.config['BACKUP_INTERVAL'] = 24 * 3600      # 自动备份间隔（秒），0 表示只在手动触发时备份
+app.config['BACKUP_KEEP'] = 7                  # 保留的备份数量，更早的自动删除
+app.config['BACKUP_STEP_PAGES'] = 256          # 在线备份每一步复制的页数
+app.config['BACKUP_STEP_SLEEP'] = 0.005        # 在线备份每一步之间的间隔（秒）
+app.config['EXPIRY_SWEEP_INTERVAL'] = 3600     # 将过期许可证标记为禁用的间隔（秒），0 表示不清理
+app.config['EXPIRY_SWEEP_GRACE_DAYS'] = 30     # 过期超过该天数的许可证才会被禁用，期间仍可延期
+app.config['CHECKPOINT_INTERVAL'] = 300        # WAL 检查点间隔（秒）
+app.config['OPTIMIZE_INTERVAL'] = 3600         # PRAGMA optimize 间隔（秒）
+app.config['VACUUM_INTERVAL'] = 3600           # 增量释放空闲页的间隔（秒）
+app.config['VACUUM_STEP_PAGES'] = 256          # 增量释放空闲页时每个事务释放的页数
 CORS(app)
 
+_extensions_lock = threading.Lock()
+
+# 单条 IN 查询的最大参数数量，低于旧版 SQLite 的 999 上限
+LOOKUP_CHUNK_SIZE = 500
+
+MALFORMED_KEY_MESSAGE = '许可证密钥格式不正确'
+RATE_LIMITED_MESSAGE = '请求过于频繁，请稍后重试'
+SEATS_FULL_MESSAGE = '许可证的激活设备数已达上限'
+INVALID_PARAMS_MESSAGE = '参数格式不正确'
+
+# 按客户端 IP 限流的接口
+RATE_LIMITED_ENDPOINTS = frozenset({'validate_license', 'validate_license_batch'})
+# 服务器繁忙时仍然处理的接口，保证监控可用
+UNLIMITED_ENDPOINTS = frozenset({'export_metrics'})
+
+# _check_license 的错误消息对应的验证结果指标标签
+VALIDATION_OUTCOMES = {
+    None: 'ok',
+    MALFORMED_KEY_MESSAGE: 'malformed',
+    RATE_LIMITED_MESSAGE: 'rate_limited',
+    '许可证不存在': 'not_found',
+    '许可证已被禁用': 'disabled',
+    '许可证已过期': 'expired',
+    '许可证已绑定到其他设备': 'bound_elsewhere',
+    SEATS_FULL_MESSAGE: 'seats_full',
+}
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -17,112 +119,664 @@ logging.basicConfig(
     ]
 )
 
+def get_db() -> Database:
+    """获取进程内共享的数据库连接池"""
+    db = app.extensions.get('license_db')
+    if db is None:
+        metrics = get_metrics()
+        with _extensions_lock:
+            db = app.extensions.get('license_db')
+            if db is None:
+                db = Database(app.config['DATABASE'],
+                              observer=metrics.observe_sql if metrics else None)
+                # 每个进程首次使用数据库时升级表结构，替代已废弃的 before_first_request
+                migrations.migrate(db)
+                app.extensions['license_db'] = db
+                atexit.register(db.close)
+    return db
+
+def get_metrics():
+    """获取进程内的指标集合，未启用时返回 None"""
+    if not app.config['METRICS_ENABLED']:
+        return None
+    metrics = app.extensions.get('license_metrics')
+    if metrics is None:
+        with _extensions_lock:
+            metrics = app.extensions.get('license_metrics')
+            if metrics is None:
+                metrics = ServerMetrics()
+                app.extensions['license_metrics'] = metrics
+    return metrics
+
+def get_cache() -> LicenseCache:
+    """获取进程内的许可证缓存"""
+    cache = app.extensions.get('license_cache')
+    if cache is None:
+        with _extensions_lock:
+            cache = app.extensions.get('license_cache')
+            if cache is None:
+                cache = LicenseCache(app.config['LICENSE_CACHE_SIZE'],
+                                     app.config['LICENSE_CACHE_TTL'])
+                app.extensions['license_cache'] = cache
+    return cache
+
+def get_recorder() -> ActivationRecorder:
+    """获取激活次数的写回缓冲，首次调用时启动后台写入线程"""
+    recorder = app.extensions.get('activation_recorder')
+    if recorder is None:
+        db = get_db()
+        with _extensions_lock:
+            recorder = app.extensions.get('activation_recorder')
+            if recorder is None:
+                recorder = ActivationRecorder(
+                    db,
+                    mode=app.config['ACTIVATION_WRITE_MODE'],
+                    flush_interval=app.config['ACTIVATION_FLUSH_INTERVAL'],
+                    max_pending=app.config['ACTIVATION_FLUSH_SIZE'],
+                )
+                recorder.start()
+                app.extensions['activation_recorder'] = recorder
+                # atexit 按注册的逆序执行，保证在关闭连接池之前写入剩余计数
+                atexit.register(recorder.stop)
+    return recorder
+
+def get_signer():
+    """获取离线令牌签发器，未配置私钥时返回 None"""
+    if not app.config.get('TOKEN_PRIVATE_KEY'):
+        return None
+    signer = app.extensions.get('token_signer')
+    if signer is None:
+        with _extensions_lock:
+            signer = app.extensions.get('token_signer')
+            if signer is None:
+                # cryptography 仅在启用离线令牌时才需要
+                from tokens import TokenSigner
+                signer = TokenSigner.from_file(app.config['TOKEN_PRIVATE_KEY'],
+                                               app.config['TOKEN_TTL'])
+                app.extensions['token_signer'] = signer
+    return signer
+
+def get_audit_log():
+    """获取验证审计日志，首次调用时启动后台写入线程；未启用时返回 None"""
+    if not app.config['AUDIT_ENABLED']:
+        return None
+    audit = app.extensions.get('audit_log')
+    if audit is None:
+        metrics = get_metrics()
+        with _extensions_lock:
+            audit = app.extensions.get('audit_log')
+            if audit is None:
+                audit = AuditLog(
+                    Database(app.config['AUDIT_DATABASE'], pool_size=2,
+                             observer=metrics.observe_sql if metrics else None),
+                    max_queue=app.config['AUDIT_QUEUE_SIZE'],
+                    batch_size=app.config['AUDIT_BATCH_SIZE'],
+                    flush_interval=app.config['AUDIT_FLUSH_INTERVAL'],
+                    overload_sample_rate=app.config['AUDIT_SAMPLE_RATE'],
+                    retention_days=app.config['AUDIT_RETENTION_DAYS'],
+                )
+                audit.start()
+                app.extensions['audit_log'] = audit
+                atexit.register(audit.stop)
+    return audit
+
+def get_key_filter():
+    """获取许可证密钥过滤器，首次调用时从快照加载或从数据库构建；未启用时返回 None"""
+    if not app.config['KEY_FILTER_ENABLED']:
+        return None
+    key_filter = app.extensions.get('key_filter')
+    if key_filter is None:
+        db = get_db()
+        with _extensions_lock:
+            key_filter = app.extensions.get('key_filter')
+            if key_filter is None:
+                key_filter = KeyFilter(
+                    capacity=app.config['KEY_FILTER_CAPACITY'],
+                    fp_rate=app.config['KEY_FILTER_FP_RATE'],
+                    snapshot_path=app.config['KEY_FILTER_SNAPSHOT'] or f"{app.config['DATABASE']}.keys",
+                )
+                key_filter.load_or_build(db)
+                if key_filter.source == 'database':
+                    key_filter.save_snapshot(db)
+                app.extensions['key_filter'] = key_filter
+                # 在关闭连接池之前保存快照，下次启动只需补齐之后新增的许可证
+                atexit.register(key_filter.save_snapshot, db)
+    return key_filter
+
+def _refresh_key_filter(db: Database):
+    """
+    本进程新增许可证后更新过滤器
+
+    执行写入的连接看不到自己提交引起的 data_version 变化，不能依赖 sync()。
+    """
+    key_filter = get_key_filter()
+    if key_filter:
+        with db.connection() as conn:
+            key_filter.catch_up(conn)
+
+def get_rate_limiters():
+    """获取 (按 IP, 按许可证) 的限流器，未启用时返回 None"""
+    if not app.config['RATE_LIMIT_ENABLED']:
+        return None
+    limiters = app.extensions.get('rate_limiters')
+    if limiters is None:
+        with _extensions_lock:
+            limiters = app.extensions.get('rate_limiters')
+            if limiters is None:
+                max_entries = app.config['RATE_LIMIT_MAX_ENTRIES']
+                limiters = (
+                    TokenBucketLimiter(app.config['RATE_LIMIT_IP_RATE'],
+                                       app.config['RATE_LIMIT_IP_BURST'], max_entries),
+                    TokenBucketLimiter(app.config['RATE_LIMIT_KEY_RATE'],
+                                       app.config['RATE_LIMIT_KEY_BURST'], max_entries),
+                )
+                app.extensions['rate_limiters'] = limiters
+    return limiters
+
+def get_concurrency_limiter():
+    """获取全局并发限制，未启用时返回 None"""
+    if not app.config['MAX_CONCURRENT_REQUESTS']:
+        return None
+    limiter = app.extensions.get('concurrency_limiter')
+    if limiter is None:
+        with _extensions_lock:
+            limiter = app.extensions.get('concurrency_limiter')
+            if limiter is None:
+                limiter = ConcurrencyLimiter(app.config['MAX_CONCURRENT_REQUESTS'])
+                app.extensions['concurrency_limiter'] = limiter
+    return limiter
+
+def get_maintenance():
+    """获取数据库维护计划，首次调用时启动后台维护线程；未启用时返回 None"""
+    if not app.config['MAINTENANCE_ENABLED']:
+        return None
+    maintenance = app.extensions.get('license_maintenance')
+    if maintenance is None:
+        db = get_db()
+        with _extensions_lock:
+            maintenance = app.extensions.get('license_maintenance')
+            if maintenance is None:
+                backup_dir = app.config['BACKUP_DIR'] or os.path.join(
+                    os.path.dirname(os.path.abspath(app.config['DATABASE'])), 'backups')
+                maintenance = MaintenanceScheduler(
+                    db,
+                    backup_dir,
+                    backup_interval=app.config['BACKUP_INTERVAL'],
+                    backup_keep=app.config['BACKUP_KEEP'],
+                    backup_step_pages=app.config['BACKUP_STEP_PAGES'],
+                    backup_step_sleep=app.config['BACKUP_STEP_SLEEP'],
+                    expiry_interval=app.config['EXPIRY_SWEEP_INTERVAL'],
+                    expiry_grace_days=app.config['EXPIRY_SWEEP_GRACE_DAYS'],
+                    checkpoint_interval=app.config['CHECKPOINT_INTERVAL'],
+                    optimize_interval=app.config['OPTIMIZE_INTERVAL'],
+                    vacuum_interval=app.config['VACUUM_INTERVAL'],
+                    vacuum_step_pages=app.config['VACUUM_STEP_PAGES'],
+                    idle_seconds=app.config['MAINTENANCE_IDLE_SECONDS'],
+                    # 过期清理禁用的许可证可能很多，直接清空缓存
+                    on_change=lambda generation: get_cache().invalidate_many(None, generation),
+                )
+                maintenance.start()
+                app.extensions['license_maintenance'] = maintenance
+                # 在关闭连接池之前停止，正在进行的备份被中断
+                atexit.register(maintenance.stop)
+    return maintenance
+
+def _rate_limited(license_key, result=None) -> float:
+    """
+    按许可证限流，返回需要等待的秒数，0 表示允许
+
+    多席位许可证的每台设备都会定期验证，每次验证只消耗 1/max_activations 个令牌，
+    即速率和突发上限按席位数放大；result 为查询到的许可证记录，不存在时按单席位计算。
+    """
+    limiters = get_rate_limiters()
+    if not limiters:
+        return 0.0
+    seats = result[4] if result else 1
+    return limiters[1].acquire(license_key, 1 / max(1, seats))
+
 def init_db():
-    """初始化数据库"""
-    conn = sqlite3.connect('licenses.db')
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS licenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            license_key TEXT UNIQUE NOT NULL,
-            machine_code TEXT,
-            created_at DATETIME NOT NULL,
-            expires_at DATETIME,
-            is_active BOOLEAN DEFAULT 1,
-            activation_count INTEGER DEFAULT 0
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    """初始化数据库，执行尚未完成的迁移，并准备密钥过滤器"""
+    get_db()
+    get_key_filter()
+    get_maintenance()
     logging.info("数据库初始化完成")
 
-@app.before_first_request
-def setup():
-    init_db()
+def _record_validation(message, license_key, machine_code, error: bool = False):
+    """按 _check_license 返回的消息统计验证结果，并写入审计日志"""
+    outcome = 'error' if error else VALIDATION_OUTCOMES.get(message, 'invalid_request')
+    metrics = get_metrics()
+    if metrics:
+        metrics.record_validation(outcome)
+    audit = get_audit_log()
+    if audit:
+        audit.record(license_key, machine_code, request.remote_addr, outcome)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def track_activity():
+    """记录最近一次请求的时间，维护任务据此判断是否空闲；首次请求时启动维护线程"""
+    if request.endpoint in UNLIMITED_ENDPOINTS:
+        return None
+    maintenance = get_maintenance()
+    if maintenance:
+        maintenance.touch()
+    return None
+
+@app.before_request
+def shed_load():
+    """
+    服务器繁忙或客户端请求过快时立即拒绝，避免占用工作线程和数据库锁
+
+    超出并发上限返回 503，单个 IP 请求过快返回 429，均带 Retry-After。
+    """
+    if request.endpoint in UNLIMITED_ENDPOINTS:
+        return None
+    limiter = get_concurrency_limiter()
+    if limiter:
+        if not limiter.try_acquire():
+            response = jsonify({'error': '服务器繁忙，请稍后重试'})
+            response.headers['Retry-After'] = retry_after_header(app.config['BUSY_RETRY_AFTER'])
+            return response, 503
+        g.concurrency_limiter = limiter
+
+    limiters = get_rate_limiters()
+    if limiters and request.endpoint in RATE_LIMITED_ENDPOINTS:
+        wait = limiters[0].acquire(request.remote_addr)
+        if wait:
+            response = jsonify({'valid': False, 'message': RATE_LIMITED_MESSAGE})
+            response.headers['Retry-After'] = retry_after_header(wait)
+            return response, 429
+    return None
+
+@app.teardown_request
+def release_concurrency_slot(exc):
+    # 流式响应在输出结束后才执行 teardown，输出期间仍然占用名额
+    limiter = g.pop('concurrency_limiter', None)
+    if limiter is not None:
+        limiter.release()
+
+@app.after_request
+def record_request_metrics(response):
+    """记录每个路由的延迟和状态码，流式响应只统计到开始输出为止"""
+    metrics = get_metrics()
+    started = g.get('request_started')
+    if metrics and started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe_request(request.method, route, response.status_code,
+                                time.perf_counter() - started)
+    return response
+
+@app.after_request
+def compress_admin_response(response):
+    """压缩管理接口的大响应（如许可证列表、批量生成结果）"""
+    if app.config['ADMIN_GZIP'] and request.path.startswith('/admin/'):
+        response = compress_response(response, request.headers.get('Accept-Encoding', ''),
+                                     app.config['GZIP_MIN_SIZE'])
+    return response
+
+def _key_secret():
+    secret = app.config.get('LICENSE_KEY_SECRET')
+    return secret.encode('utf-8') if isinstance(secret, str) else secret
+
+def _new_license_key(product: int = 0, edition: int = 0) -> str:
+    """按配置的格式生成许可证密钥"""
+    if app.config['LICENSE_KEY_FORMAT'] == 'uuid':
+        return str(uuid.uuid4())
+    return keycodec.generate_key(product, edition, _key_secret())
+
+def _canonical_key(license_key):
+    """
+    返回许可证密钥的规范形式
+
+    格式、校验位或 MAC 不正确时返回 None，调用方无需查询缓存或数据库即可拒绝。
+    """
+    if not app.config['LICENSE_KEY_CHECK']:
+        return license_key
+    try:
+        info = keycodec.parse_key(license_key)
+    except keycodec.KeyFormatError:
+        return None
+    return info.key if keycodec.verify_mac(info, _key_secret()) else None
+
+def _query_licenses(conn, license_keys) -> dict:
+    """
+    从数据库读取许可证及其已激活的设备，返回
+    {license_key: (machines, expires_at, is_active, features, max_activations)}
+
+    一条 LEFT JOIN 查询同时取回许可证和激活记录，按 (license_id, machine_code) 索引查找。
+    """
+    found = {}
+    machines = {}
+    placeholders = ','.join('?' * len(license_keys))
+    for key, machine_code, expires_at, is_active, metadata, max_activations in conn.execute(f'''
+        SELECT l.license_key, a.machine_code, l.expires_at, l.is_active, l.metadata, l.max_activations
+        FROM licenses l LEFT JOIN activations a ON a.license_id = l.id
+        WHERE l.license_key IN ({placeholders})
+    ''', license_keys):
+        if key not in found:
+            metadata = json.loads(metadata) if metadata else {}
+            found[key] = (expires_at, is_active, tuple(metadata.get('features', ())), max_activations)
+            machines[key] = []
+        if machine_code is not None:
+            machines[key].append(machine_code)
+    return {key: (frozenset(machines[key]),) + row for key, row in found.items()}
+
+def _lookup_licenses(db: Database, license_keys) -> dict:
+    """
+    批量查询许可证记录，返回 {license_key: (machines, expires_at, is_active, features, max_activations)}
+
+    先查缓存，未命中的密钥用一条 IN 查询取回（按 SQLite 参数上限分块）。
+    """
+    cache = get_cache()
+    found = {}
+    with db.connection() as conn:
+        cache.sync(conn)
+        missing = []
+        generation = cache.generation
+        for key in license_keys:
+            row, _ = cache.get(key)
+            if row is None:
+                missing.append(key)
+            else:
+                found[key] = row
+        
+        # 不在过滤器中的密钥一定不存在，无需查询数据库
+        key_filter = get_key_filter() if missing else None
+        if key_filter:
+            key_filter.sync(conn)
+            missing = [key for key in missing if key_filter.might_contain(key)]
+        
+        for i in range(0, len(missing), LOOKUP_CHUNK_SIZE):
+            for key, row in _query_licenses(conn, missing[i:i + LOOKUP_CHUNK_SIZE]).items():
+                found[key] = row
+                cache.put(key, row, generation)
+    return found
+
+def _check_license(result, machine_code: str):
+    """
+    按存在、禁用、过期、席位的顺序检查许可证
+
+    已激活的设备总是通过；新设备只在还有空闲席位时通过，由 _activate_seats() 占用席位。
+
+    Returns:
+        (是否有效, 无效时的错误消息)
+    """
+    if not result:
+        return False, '许可证不存在'
+        
+    machines, expires_at, is_active = result[:3]
+    
+    # 检查是否已被禁用
+    if not is_active:
+        return False, '许可证已被禁用'
+        
+    # 检查是否已过期
+    if expires_at is not None and expires_at < now():
+        return False, '许可证已过期'
+    
+    # 新设备需要空闲席位；单席位许可证沿用原来的绑定提示
+    max_activations = result[4]
+    if machine_code not in machines and len(machines) >= max_activations:
+        if max_activations == 1:
+            return False, '许可证已绑定到其他设备'
+        return False, SEATS_FULL_MESSAGE
+    return True, None
+
+def _activate_seats(db: Database, activations) -> dict:
+    """
+    在一个事务中为新设备占用席位，activations 为 (license_key, machine_code) 列表
+
+    验证时读到的是缓存或事务外的快照，占用席位用一条带条件的 INSERT 完成：只有许可证仍然有效
+    且已用席位少于 max_activations 时才会插入。写事务是串行的，多个线程或进程同时激活同一个
+    许可证时最多只有 max_activations 台设备成功，其余的 INSERT 影响 0 行。
+
+    Returns:
+        未能激活的设备及原因 {(license_key, machine_code): 错误消息}
+    """
+    activated_at = now()
+    failed = {}
+    with db.transaction() as conn:
+        for license_key, machine_code in activations:
+            if conn.execute('''
+                INSERT OR IGNORE INTO activations (license_id, machine_code, first_seen, last_seen)
+                SELECT id, ?, ?, ? FROM licenses
+                WHERE license_key = ? AND is_active = 1
+                  AND (expires_at IS NULL OR expires_at >= ?)
+                  AND (SELECT COUNT(*) FROM activations WHERE license_id = licenses.id) < max_activations
+            ''', (machine_code, activated_at, activated_at, license_key, activated_at)).rowcount:
+                conn.execute('''
+                    UPDATE licenses SET activation_count = activation_count + 1, last_seen_at = ?
+                    WHERE license_key = ?
+                ''', (activated_at, license_key))
+                continue
+            
+            # 检查之后席位被其他请求占满或许可证被禁用，重新读取以返回准确的原因
+            valid, message = _check_license(
+                _query_licenses(conn, [license_key]).get(license_key), machine_code)
+            if valid:
+                # 同一设备的并发请求已完成激活，按一次普通验证计数
+                conn.execute('''
+                    UPDATE licenses SET activation_count = activation_count + 1, last_seen_at = ?
+                    WHERE license_key = ?
+                ''', (activated_at, license_key))
+            else:
+                failed[(license_key, machine_code)] = message
+        generation = bump_generation(conn)
+    get_cache().invalidate_many([license_key for license_key, _ in activations], generation)
+    return failed
+
+def _issue_token(license_key: str, machine_code: str, result):
+    """为验证通过的许可证签发离线令牌，未启用时返回 None"""
+    signer = get_signer()
+    if signer is None:
+        return None
+    return signer.issue(license_key, machine_code, result[1], list(result[3]))
 
 @app.route('/validate', methods=['POST'])
 def validate_license():
     """验证许可证"""
+    # 请求体无法解析时 except 中的审计记录也要用到
+    license_key = machine_code = None
     try:
         data = request.json
         license_key = data.get('license_key')
         machine_code = data.get('machine_code')
         
         if not license_key or not machine_code:
+            _record_validation('缺少必要参数', license_key, machine_code)
             return jsonify({
                 'valid': False,
                 'message': '缺少必要参数'
             })
-            
-        conn = sqlite3.connect('licenses.db')
-        c = conn.cursor()
-        
-        # 检查许可证是否存在且有效
-        c.execute('''
-            SELECT machine_code, expires_at, is_active, activation_count
-            FROM licenses
-            WHERE license_key = ?
-        ''', (license_key,))
-        
-        result = c.fetchone()
-        if not result:
+        if not isinstance(license_key, str) or not isinstance(machine_code, str):
+            _record_validation(INVALID_PARAMS_MESSAGE, None, None)
             return jsonify({
                 'valid': False,
-                'message': '许可证不存在'
+                'message': INVALID_PARAMS_MESSAGE
             })
             
-        saved_machine_code, expires_at, is_active, activation_count = result
-        
-        # 检查是否已被禁用
-        if not is_active:
+        # 格式错误或伪造的密钥直接拒绝
+        canonical_key = _canonical_key(license_key)
+        if canonical_key is None:
+            _record_validation(MALFORMED_KEY_MESSAGE, license_key, machine_code)
             return jsonify({
                 'valid': False,
-                'message': '许可证已被禁用'
+                'message': MALFORMED_KEY_MESSAGE
             })
+        license_key = canonical_key
             
-        # 检查是否已过期
-        if expires_at:
-            expires_at = datetime.datetime.strptime(expires_at, '%Y-%m-%d %H:%M:%S')
-            if expires_at < datetime.datetime.now():
-                return jsonify({
-                    'valid': False,
-                    'message': '许可证已过期'
-                })
+        db = get_db()
         
-        # 如果未绑定机器码，则绑定
-        if not saved_machine_code:
-            c.execute('''
-                UPDATE licenses
-                SET machine_code = ?, activation_count = 1
-                WHERE license_key = ?
-            ''', (machine_code, license_key))
-            conn.commit()
+        # 检查许可证是否存在且有效，优先使用缓存
+        result = _lookup_licenses(db, [license_key]).get(license_key)
+        
+        wait = _rate_limited(license_key, result)
+        if wait:
+            _record_validation(RATE_LIMITED_MESSAGE, license_key, machine_code)
+            response = jsonify({'valid': False, 'message': RATE_LIMITED_MESSAGE})
+            response.headers['Retry-After'] = retry_after_header(wait)
+            return response, 429
             
-        # 如果已绑定，检查是否匹配
-        elif saved_machine_code != machine_code:
+        valid, message = _check_license(result, machine_code)
+        
+        # 新设备占用一个席位；已激活的设备只更新激活次数（默认由后台线程批量写入）
+        if valid and machine_code not in result[0]:
+            message = _activate_seats(db, [(license_key, machine_code)]).get((license_key, machine_code))
+            valid = message is None
+        elif valid:
+            get_recorder().record(license_key, machine_code)
+        _record_validation(message, license_key, machine_code)
+        if not valid:
             return jsonify({
                 'valid': False,
-                'message': '许可证已绑定到其他设备'
+                'message': message
             })
-        else:
-            # 更新激活次数
-            c.execute('''
-                UPDATE licenses
-                SET activation_count = activation_count + 1
-                WHERE license_key = ?
-            ''', (license_key,))
-            conn.commit()
             
-        conn.close()
-        return jsonify({'valid': True})
+        response = {'valid': True}
+        token = _issue_token(license_key, machine_code, result)
+        if token:
+            response['token'] = token
+        return jsonify(response)
         
     except Exception as e:
         logging.error(f"验证许可证失败: {str(e)}")
+        _record_validation(None, license_key, machine_code, error=True)
         return jsonify({
             'valid': False,
             'message': str(e)
         })
 
+@app.route('/validate/batch', methods=['POST'])
+def validate_license_batch():
+    """批量验证许可证，按请求顺序返回每一项的结果"""
+    try:
+        items = request.json.get('items')
+        if not isinstance(items, list):
+            return jsonify({'error': '缺少必要参数'}), 400
+        if len(items) > app.config['VALIDATE_BATCH_LIMIT']:
+            return jsonify({'error': f"单次最多验证 {app.config['VALIDATE_BATCH_LIMIT']} 个许可证"}), 400
+            
+        db = get_db()
+        # 先检查密钥格式，只查询格式正确的密钥
+        canonical = {}
+        for item in items:
+            if isinstance(item, dict):
+                license_key = item.get('license_key')
+                if license_key and isinstance(license_key, str) and license_key not in canonical:
+                    canonical[license_key] = _canonical_key(license_key)
+        keys = {key for key in canonical.values() if key is not None}
+        rows = _lookup_licenses(db, list(keys))
+        
+        results = []
+        seats = {}        # 本批次占用席位后的设备集合
+        activations = []  # 需要占用席位的 (license_key, machine_code)
+        activated = []
+        pending = []
+        for item in items:
+            if not isinstance(item, dict):
+                item = {}
+            license_key = item.get('license_key')
+            machine_code = item.get('machine_code')
+            if not license_key or not machine_code:
+                _record_validation('缺少必要参数', license_key, machine_code)
+                results.append({'valid': False, 'message': '缺少必要参数'})
+                continue
+            # 非字符串的值（如列表、对象）只让这一项失败
+            if not isinstance(license_key, str) or not isinstance(machine_code, str):
+                _record_validation(INVALID_PARAMS_MESSAGE, None, None)
+                results.append({'valid': False, 'message': INVALID_PARAMS_MESSAGE})
+                continue
+            if canonical[license_key] is None:
+                _record_validation(MALFORMED_KEY_MESSAGE, license_key, machine_code)
+                results.append({'valid': False, 'message': MALFORMED_KEY_MESSAGE})
+                continue
+            license_key = canonical[license_key]
+            row = rows.get(license_key)
+            if _rate_limited(license_key, row):
+                _record_validation(RATE_LIMITED_MESSAGE, license_key, machine_code)
+                results.append({'valid': False, 'message': RATE_LIMITED_MESSAGE})
+                continue
+                
+            # 同一批次中的新设备按请求顺序占用席位
+            if row and license_key in seats:
+                row = (seats[license_key],) + row[1:]
+            valid, message = _check_license(row, machine_code)
+            if not valid:
+                _record_validation(message, license_key, machine_code)
+                results.append({'valid': False, 'message': message})
+                continue
+                
+            if machine_code not in row[0]:
+                seats[license_key] = row[0] | {machine_code}
+                activations.append((license_key, machine_code))
+            else:
+                activated.append((license_key, machine_code))
+            # 结果在占用席位后确定
+            pending.append((len(results), license_key, machine_code, row))
+            results.append(None)
+            
+        failed = _activate_seats(db, activations) if activations else {}
+        for index, license_key, machine_code, row in pending:
+            message = failed.get((license_key, machine_code))
+            _record_validation(message, license_key, machine_code)
+            if message:
+                results[index] = {'valid': False, 'message': message}
+                continue
+            item_result = {'valid': True}
+            token = _issue_token(license_key, machine_code, row)
+            if token:
+                item_result['token'] = token
+            results[index] = item_result
+            
+        recorder = get_recorder()
+        for seat in activated:
+            if seat not in failed:
+                recorder.record(*seat)
+            
+        return jsonify({'results': results})
+        
+    except Exception as e:
+        logging.error(f"批量验证许可证失败: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def _generate_licenses(count: int, expires_at, metadata, product: int = 0, edition: int = 0,
+                       max_activations: int = 1):
+    """
+    分块批量生成许可证，逐行输出 NDJSON
+
+    每块在一个事务中用 executemany 插入，插入成功后立即输出该块的密钥，
+    服务端和客户端都无需在内存中保留全部结果。
+    """
+    db = get_db()
+    cache = get_cache()
+    chunk_size = app.config['GENERATE_CHUNK_SIZE']
+    created = 0
+    try:
+        while created < count:
+            n = min(chunk_size, count - created)
+            created_at = now()
+            keys = [_new_license_key(product, edition) for _ in range(n)]
+            with db.transaction() as conn:
+                conn.executemany('''
+                    INSERT INTO licenses (license_key, created_at, expires_at, max_activations, metadata)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [(key, created_at, expires_at, max_activations, metadata) for key in keys])
+                generation = bump_generation(conn)
+            cache.invalidate_many([], generation)
+            _refresh_key_filter(db)
+            created += n
+            yield ''.join(
+                json.dumps({'license_key': key, 'expires_at': format_timestamp(expires_at)}) + '\n'
+                for key in keys
+            )
+        logging.info(f"批量生成许可证 {created} 个")
+    except Exception as e:
+        logging.error(f"批量生成许可证失败: {str(e)}")
+        yield json.dumps({'error': str(e), 'created': created}, ensure_ascii=False) + '\n'
+
 @app.route('/admin/generate', methods=['POST'])
 def generate_license():
     """生成新的许可证"""
@@ -133,21 +787,51 @@ def generate_license():
         if not admin_key or admin_key != app.config['ADMIN_KEY']:
             return jsonify({'error': '未授权访问'}), 401
             
-        # 生成许可证密钥
-        import uuid
-        license_key = str(uuid.uuid4())
+        # 获取过期时间和附加信息（可选），批量生成时所有许可证共用
+        try:
+            expires_at = parse_timestamp(data.get('expires_at'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        metadata = data.get('metadata')
+        if metadata is not None:
+            metadata = json.dumps(metadata, ensure_ascii=False)
+        
+        # 产品和版本类型编号写入 base32 格式的密钥中
+        product, edition = data.get('product', 0), data.get('edition', 0)
+        if not isinstance(product, int) or not 0 <= product <= keycodec.MAX_PRODUCT:
+            return jsonify({'success': False, 'error': f"product 必须是 0 到 {keycodec.MAX_PRODUCT} 之间的整数"}), 400
+        if not isinstance(edition, int) or not 0 <= edition <= keycodec.MAX_EDITION:
+            return jsonify({'success': False, 'error': f"edition 必须是 0 到 {keycodec.MAX_EDITION} 之间的整数"}), 400
         
-        # 获取过期时间（可选）
-        expires_at = data.get('expires_at')
+        # 可同时激活的设备数量
+        max_activations = data.get('max_activations', 1)
+        if not isinstance(max_activations, int) or max_activations < 1:
+            return jsonify({'success': False, 'error': 'max_activations 必须是正整数'}), 400
         
-        conn = sqlite3.connect('licenses.db')
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO licenses (license_key, created_at, expires_at)
-            VALUES (?, ?, ?)
-        ''', (license_key, datetime.datetime.now(), expires_at))
-        conn.commit()
-        conn.close()
+        count = data.get('count')
+        if count is not None:
+            if not isinstance(count, int) or not 0 < count <= app.config['GENERATE_BATCH_LIMIT']:
+                return jsonify({
+                    'success': False,
+                    'error': f"count 必须是 1 到 {app.config['GENERATE_BATCH_LIMIT']} 之间的整数"
+                }), 400
+            return Response(
+                stream_with_context(_generate_licenses(count, expires_at, metadata, product, edition,
+                                                       max_activations)),
+                mimetype='application/x-ndjson'
+            )
+            
+        # 生成许可证密钥
+        license_key = _new_license_key(product, edition)
+        
+        with get_db().transaction() as conn:
+            conn.execute('''
+                INSERT INTO licenses (license_key, created_at, expires_at, max_activations, metadata)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (license_key, now(), expires_at, max_activations, metadata))
+            generation = bump_generation(conn)
+        get_cache().invalidate(license_key, generation)
+        _refresh_key_filter(get_db())
         
         return jsonify({
             'success': True,
@@ -163,30 +847,60 @@ def generate_license():
 
 @app.route('/admin/licenses', methods=['GET'])
 def list_licenses():
-    """列出所有许可证"""
+    """
+    列出许可证
+
+    查询参数:
+        limit/after: 键集分页，返回 {"items": [...], "next_cursor": 游标}
+        sort: 排序字段，前面加 - 表示降序，如 -expires_at
+        format: json（默认）、ndjson 或 csv，未指定 limit 时流式输出全部匹配记录
+        fields: 逗号分隔的返回字段
+        active/expired/bound/seats_full/created_after/created_before/machine_code/search: 过滤条件
+    """
     try:
         admin_key = request.headers.get('X-Admin-Key')
         if not admin_key or admin_key != app.config['ADMIN_KEY']:
             return jsonify({'error': '未授权访问'}), 401
             
-        conn = sqlite3.connect('licenses.db')
-        c = conn.cursor()
-        c.execute('''
-            SELECT license_key, machine_code, created_at, expires_at, is_active, activation_count
-            FROM licenses
-        ''')
-        
-        licenses = [{
-            'license_key': row[0],
-            'machine_code': row[1],
-            'created_at': row[2],
-            'expires_at': row[3],
-            'is_active': row[4],
-            'activation_count': row[5]
-        } for row in c.fetchall()]
-        
-        conn.close()
-        return jsonify(licenses)
+        try:
+            fields = listing.parse_fields(request.args.get('fields'))
+            clauses, params = listing.parse_filters(request.args)
+            sort, descending = listing.parse_sort(request.args.get('sort'))
+            after = listing.decode_cursor(sort, request.args.get('after'))
+            limit = request.args.get('limit')
+            if limit is not None:
+                limit = int(limit)
+                if not 0 < limit <= listing.MAX_PAGE_SIZE:
+                    raise ValueError(f"limit 必须在 1 到 {listing.MAX_PAGE_SIZE} 之间")
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+            
+        db = get_db()
+        output_format = request.args.get('format', 'json')
+        
+        # 分页查询：只返回一页
+        if limit is not None and output_format == 'json':
+            items, next_cursor = [], None
+            for position, rows in listing.iter_pages(db, fields, clauses, params, after=after,
+                                                     page_size=limit, limit=limit,
+                                                     sort=sort, descending=descending):
+                items = [listing.row_to_dict(fields, row) for row in rows]
+                if len(rows) == limit:
+                    next_cursor = listing.encode_cursor(sort, position)
+            return jsonify({'items': items, 'next_cursor': next_cursor})
+            
+        # 流式输出：按页读取，内存占用与总记录数无关
+        pages = listing.iter_pages(db, fields, clauses, params, after=after, limit=limit,
+                                   sort=sort, descending=descending)
+        if output_format == 'ndjson':
+            body, mimetype = listing.stream_ndjson(pages, fields), 'application/x-ndjson'
+        elif output_format == 'csv':
+            body, mimetype = listing.stream_csv(pages, fields), 'text/csv'
+        elif output_format == 'json':
+            body, mimetype = listing.stream_json_array(pages, fields), 'application/json'
+        else:
+            return jsonify({'error': f"不支持的格式: {output_format}"}), 400
+        return Response(stream_with_context(body), mimetype=mimetype)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -202,22 +916,447 @@ def deactivate_license():
         license_key = request.json.get('license_key')
         if not license_key:
             return jsonify({'error': '缺少许可证密钥'}), 400
+        license_key = keycodec.normalize_key(license_key)
             
-        conn = sqlite3.connect('licenses.db')
-        c = conn.cursor()
-        c.execute('''
-            UPDATE licenses
-            SET is_active = 0
-            WHERE license_key = ?
-        ''', (license_key,))
-        conn.commit()
-        conn.close()
+        with get_db().transaction() as conn:
+            conn.execute('''
+                UPDATE licenses
+                SET is_active = 0
+                WHERE license_key = ?
+            ''', (license_key,))
+            generation = bump_generation(conn)
+        get_cache().invalidate(license_key, generation)
         
         return jsonify({'success': True})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/admin/activations', methods=['GET'])
+def list_activations():
+    """查看许可证的席位和已激活的设备"""
+    try:
+        admin_key = request.headers.get('X-Admin-Key')
+        if not admin_key or admin_key != app.config['ADMIN_KEY']:
+            return jsonify({'error': '未授权访问'}), 401
+            
+        license_key = request.args.get('license_key')
+        if not license_key:
+            return jsonify({'error': '缺少许可证密钥'}), 400
+        license_key = keycodec.normalize_key(license_key)
+        
+        with get_db().connection() as conn:
+            row = conn.execute('''
+                SELECT id, max_activations FROM licenses WHERE license_key = ?
+            ''', (license_key,)).fetchone()
+            if row is None:
+                return jsonify({'error': '许可证不存在'}), 404
+            activations = conn.execute('''
+                SELECT machine_code, first_seen, last_seen FROM activations
+                WHERE license_id = ? ORDER BY id
+            ''', (row[0],)).fetchall()
+        
+        return jsonify({
+            'license_key': license_key,
+            'max_activations': row[1],
+            'seats_used': len(activations),
+            'activations': [{
+                'machine_code': machine_code,
+                'first_seen': format_timestamp(first_seen),
+                'last_seen': format_timestamp(last_seen),
+            } for machine_code, first_seen, last_seen in activations]
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/release', methods=['POST'])
+def release_activation():
+    """释放设备占用的席位，该设备之后再验证时重新占用空闲席位"""
+    try:
+        admin_key = request.headers.get('X-Admin-Key')
+        if not admin_key or admin_key != app.config['ADMIN_KEY']:
+            return jsonify({'error': '未授权访问'}), 401
+            
+        data = request.json
+        license_key, machine_code = data.get('license_key'), data.get('machine_code')
+        if not license_key or not machine_code:
+            return jsonify({'error': '缺少必要参数'}), 400
+        license_key = keycodec.normalize_key(license_key)
+        
+        with get_db().transaction() as conn:
+            released = conn.execute('''
+                DELETE FROM activations
+                WHERE license_id = (SELECT id FROM licenses WHERE license_key = ?) AND machine_code = ?
+            ''', (license_key, machine_code)).rowcount
+            if not released:
+                return jsonify({'error': '该设备未激活此许可证'}), 404
+            generation = bump_generation(conn)
+        get_cache().invalidate(license_key, generation)
+        logging.info(f"释放许可证 {license_key} 在设备 {machine_code} 上的席位")
+        
+        return jsonify({'success': True})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/transfer', methods=['POST'])
+def transfer_activation():
+    """将席位从一台设备转移到另一台设备，不受席位上限影响"""
+    try:
+        admin_key = request.headers.get('X-Admin-Key')
+        if not admin_key or admin_key != app.config['ADMIN_KEY']:
+            return jsonify({'error': '未授权访问'}), 401
+            
+        data = request.json
+        license_key = data.get('license_key')
+        from_machine, to_machine = data.get('from_machine_code'), data.get('to_machine_code')
+        if not license_key or not from_machine or not to_machine:
+            return jsonify({'error': '缺少必要参数'}), 400
+        license_key = keycodec.normalize_key(license_key)
+        
+        transferred_at = now()
+        try:
+            with get_db().transaction() as conn:
+                moved = conn.execute('''
+                    UPDATE activations
+                    SET machine_code = ?, first_seen = ?, last_seen = ?
+                    WHERE license_id = (SELECT id FROM licenses WHERE license_key = ?) AND machine_code = ?
+                ''', (to_machine, transferred_at, transferred_at, license_key, from_machine)).rowcount
+                if not moved:
+                    return jsonify({'error': '原设备未激活此许可证'}), 404
+                generation = bump_generation(conn)
+        except sqlite3.IntegrityError:
+            return jsonify({'error': '目标设备已激活此许可证'}), 409
+        get_cache().invalidate(license_key, generation)
+        logging.info(f"许可证 {license_key} 的席位从设备 {from_machine} 转移到 {to_machine}")
+        
+        return jsonify({'success': True})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _bulk_target(conn, data) -> tuple:
+    """
+    确定批量操作的目标许可证，返回 (WHERE 条件, 参数, 上传的密钥数)
+
+    请求体为密钥列表（NDJSON、CSV 或每行一个密钥的纯文本）时，流式写入 conn 的临时表后按表匹配；
+    否则按 JSON 请求体中的 filter 过滤，条件为空时必须显式指定 "all": true。
+    conn 处于自动提交模式，接收上传数据期间不持有数据库写锁。
+    """
+    input_format = bulk.input_format(request.mimetype)
+    if input_format is not None:
+        keys = bulk.iter_keys(bulk.read_lines(request.stream), input_format)
+        received = bulk.stage_keys(conn, (keycodec.normalize_key(key) for key in keys))
+        return 'license_key IN (SELECT license_key FROM temp.bulk_keys)', [], received
+
+    filters = data.get('filter') or {}
+    if not isinstance(filters, dict):
+        raise ValueError('filter 必须是对象')
+    unknown = listing.unknown_filters(filters)
+    if unknown:
+        raise ValueError(f"未知的过滤条件: {', '.join(unknown)}")
+    filters = {name: str(value).lower() if isinstance(value, bool) else str(value)
+               for name, value in filters.items() if value is not None}
+    clauses, params = listing.parse_filters(filters)
+    if not clauses and data.get('all') is not True:
+        raise ValueError('未指定过滤条件，修改全部许可证时需设置 "all": true')
+    return ' AND '.join(clauses) or '1', params, None
+
+def _bulk_params():
+    """批量操作的参数：上传密钥列表时来自查询参数，否则来自 JSON 请求体"""
+    if bulk.input_format(request.mimetype) is not None:
+        return request.args
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ValueError('请求体必须是 JSON 对象或密钥列表')
+    return data
+
+def _bulk_update(update: str, values: list, condition: str, data) -> dict:
+    """
+    在一个事务中对选中的许可证执行一条 UPDATE
+
+    上传的密钥先在事务外写入临时表，只有统计和 UPDATE 持有写锁，慢速或很大的上传不会阻塞其他写入。
+
+    Returns:
+        matched 为选中的许可证数，affected 为实际修改的数量（不满足 condition 的不修改）
+    """
+    with get_db().connection() as conn:
+        try:
+            where, params, received = _bulk_target(conn, data)
+            with immediate_transaction(conn):
+                matched = conn.execute(f'SELECT COUNT(*) FROM licenses WHERE {where}', params).fetchone()[0]
+                affected = conn.execute(f'''
+                    UPDATE licenses SET {update} WHERE {condition} AND ({where})
+                ''', values + params).rowcount
+                generation = bump_generation(conn)
+        finally:
+            bulk.drop_staging(conn)
+    # 修改的许可证可能很多，直接清空缓存
+    get_cache().invalidate_many(None, generation)
+
+    result = {'success': True, 'matched': matched, 'affected': affected}
+    if received is not None:
+        result['received'] = received
+    return result
+
+@app.route('/admin/bulk/deactivate', methods=['POST'])
+def bulk_deactivate():
+    """
+    批量禁用许可证
+
+    按过滤条件（{"filter": {...}}）或上传的密钥列表选择许可证，已禁用的许可证不计入 affected。
+    """
+    try:
+        admin_key = request.headers.get('X-Admin-Key')
+        if not admin_key or admin_key != app.config['ADMIN_KEY']:
+            return jsonify({'error': '未授权访问'}), 401
+            
+        try:
+            result = _bulk_update('is_active = 0', [], 'is_active = 1', _bulk_params())
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        logging.info(f"批量禁用许可证 {result['affected']} 个（匹配 {result['matched']} 个）")
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        logging.error(f"批量禁用许可证失败: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/admin/bulk/extend', methods=['POST'])
+def bulk_extend():
+    """
+    批量修改许可证有效期
+
+    days: 在原过期时间上增加的天数（可为负数），永久有效的许可证不受影响
+    expires_at: 直接设置的过期时间，为空时改为永久有效
+    两者只能指定一个，上传密钥列表时通过查询参数传递。
+    """
+    try:
+        admin_key = request.headers.get('X-Admin-Key')
+        if not admin_key or admin_key != app.config['ADMIN_KEY']:
+            return jsonify({'error': '未授权访问'}), 401
+            
+        try:
+            data = _bulk_params()
+            if ('days' in data) == ('expires_at' in data):
+                raise ValueError('必须指定 days 或 expires_at 之一')
+            if 'days' in data:
+                days = data['days']
+                try:
+                    days = int(days) if not isinstance(days, (bool, float)) else 0
+                except ValueError:
+                    days = 0
+                if not days:
+                    raise ValueError('days 必须是非零整数')
+                result = _bulk_update('expires_at = expires_at + ?', [days * 86400],
+                                      'expires_at IS NOT NULL', data)
+            else:
+                expires_at = parse_timestamp(data['expires_at'])
+                result = _bulk_update('expires_at = ?', [expires_at], '1', data)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        logging.info(f"批量修改许可证有效期 {result['affected']} 个（匹配 {result['matched']} 个）")
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        logging.error(f"批量修改许可证有效期失败: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/admin/bulk/import', methods=['POST'])
+def bulk_import():
+    """
+    批量导入从其他系统迁移的许可证
+
+    请求体为 NDJSON 或 CSV，逐行读取写入临时表（不持有写锁），再用一条 INSERT ... SELECT 在一个事务中导入；
+    提供 machine_code 时同时写入该设备的激活记录。已存在的密钥被跳过，不覆盖现有许可证；
+    输入中重复的密钥只导入第一条，计入 duplicates；无法解析的行不导入，返回前若干行的行号和原因。
+    """
+    try:
+        admin_key = request.headers.get('X-Admin-Key')
+        if not admin_key or admin_key != app.config['ADMIN_KEY']:
+            return jsonify({'error': '未授权访问'}), 401
+            
+        input_format = bulk.input_format(request.mimetype)
+        if input_format not in ('ndjson', 'csv'):
+            return jsonify({'success': False, 'error': '请求体必须是 NDJSON 或 CSV'}), 400
+            
+        reader = bulk.ImportReader(bulk.read_lines(request.stream), input_format,
+                                   lambda key: _canonical_key(keycodec.normalize_key(key)))
+        db = get_db()
+        try:
+            with db.connection() as conn:
+                try:
+                    staged = bulk.stage_licenses(conn, reader)
+                    with immediate_transaction(conn):
+                        max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM licenses').fetchone()[0]
+                        imported = conn.execute('''
+                            INSERT OR IGNORE INTO licenses
+                            (license_key, created_at, expires_at, is_active, max_activations, metadata)
+                            SELECT license_key, created_at, expires_at, is_active, max_activations, metadata
+                            FROM temp.bulk_import ORDER BY rowid
+                        ''').rowcount
+                        # 只为本次新增的许可证写入激活记录
+                        conn.execute('''
+                            INSERT OR IGNORE INTO activations (license_id, machine_code, first_seen, last_seen)
+                            SELECT l.id, b.machine_code, b.created_at, b.created_at
+                            FROM temp.bulk_import b JOIN licenses l ON l.license_key = b.license_key
+                            WHERE l.id > ? AND b.machine_code IS NOT NULL
+                        ''', (max_id,))
+                        generation = bump_generation(conn)
+                finally:
+                    bulk.drop_staging(conn)
+        except UnicodeDecodeError:
+            return jsonify({'success': False, 'error': '请求体必须是 UTF-8 编码'}), 400
+        get_cache().invalidate_many([], generation)
+        _refresh_key_filter(db)
+        
+        skipped = staged - imported
+        duplicates = reader.received - reader.invalid - staged
+        logging.info(f"批量导入许可证 {imported} 个，跳过已存在 {skipped} 个，"
+                     f"输入中重复 {duplicates} 行，无效 {reader.invalid} 行")
+        result = {
+            'success': True,
+            'received': reader.received,
+            'imported': imported,
+            'skipped': skipped,
+            'duplicates': duplicates,
+            'invalid': reader.invalid,
+            'errors': reader.errors,
+        }
+        if reader.invalid and app.config['LICENSE_KEY_CHECK']:
+            result['hint'] = ('导入其他系统格式的密钥需要关闭 LICENSE_KEY_CHECK，'
+                              '客户端同时需要使用 LicenseValidator(key_check=False)')
+        return jsonify(result)
+        
+    except Exception as e:
+        logging.error(f"批量导入许可证失败: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def export_metrics():
+    """以 Prometheus 文本格式导出指标"""
+    metrics = get_metrics()
+    if metrics is None:
+        return jsonify({'error': '指标统计未启用'}), 404
+    metrics.update_cache(get_cache().stats())
+    audit = get_audit_log()
+    if audit:
+        metrics.update_audit(audit.stats())
+    key_filter = app.extensions.get('key_filter')
+    if key_filter:
+        metrics.update_key_filter(key_filter.checked, key_filter.rejected)
+    limiters = app.extensions.get('rate_limiters')
+    if limiters:
+        metrics.update_rate_limits(limiters[0].stats(), limiters[1].stats())
+    concurrency = app.extensions.get('concurrency_limiter')
+    if concurrency:
+        metrics.update_concurrency(concurrency.stats())
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/admin/audit', methods=['GET'])
+def audit_summary():
+    """
+    按时间窗口汇总验证审计日志
+
+    查询参数:
+        window: minute、hour（默认）、day 或秒数
+        since/until: 时间范围，默认最近 7 天
+        license_key: 只查询指定许可证
+        limit: 最多返回的条目数，默认 1000
+    """
+    try:
+        admin_key = request.headers.get('X-Admin-Key')
+        if not admin_key or admin_key != app.config['ADMIN_KEY']:
+            return jsonify({'error': '未授权访问'}), 401
+            
+        audit = get_audit_log()
+        if audit is None:
+            return jsonify({'error': '审计日志未启用'}), 404
+            
+        try:
+            window = request.args.get('window', 'hour')
+            if window in WINDOWS:
+                window = WINDOWS[window]
+            elif window.isdigit() and int(window) > 0:
+                window = int(window)
+            else:
+                raise ValueError(f"window 应为 minute、hour、day 或正整数秒数: {window}")
+            until = parse_timestamp(request.args.get('until')) or now() + 1
+            since = parse_timestamp(request.args.get('since')) or until - 7 * 86400
+            limit = int(request.args.get('limit', 1000))
+            if not 0 < limit <= listing.MAX_PAGE_SIZE:
+                raise ValueError(f"limit 必须在 1 到 {listing.MAX_PAGE_SIZE} 之间")
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+            
+        items = audit.aggregate(window, since, until, request.args.get('license_key'), limit)
+        for item in items:
+            item['window_start'] = format_timestamp(item['window_start'])
+        return jsonify({'window': window, 'items': items, 'stats': audit.stats()})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/admin/key-filter', methods=['GET'])
+def key_filter_stats():
+    """查看许可证密钥过滤器的内存占用、误判率和拒绝次数"""
+    admin_key = request.headers.get('X-Admin-Key')
+    if not admin_key or admin_key != app.config['ADMIN_KEY']:
+        return jsonify({'error': '未授权访问'}), 401
+    key_filter = get_key_filter()
+    if key_filter is None:
+        return jsonify({'error': '密钥过滤器未启用'}), 404
+    return jsonify(key_filter.stats())
+
+@app.route('/admin/cache', methods=['GET'])
+def cache_stats():
+    """查看许可证缓存的命中统计"""
+    admin_key = request.headers.get('X-Admin-Key')
+    if not admin_key or admin_key != app.config['ADMIN_KEY']:
+        return jsonify({'error': '未授权访问'}), 401
+    return jsonify(get_cache().stats())
+
+@app.route('/admin/maintenance', methods=['GET'])
+def maintenance_status():
+    """查看各维护任务上次执行的时间、耗时、处理的页数和结果，以及现有的备份"""
+    admin_key = request.headers.get('X-Admin-Key')
+    if not admin_key or admin_key != app.config['ADMIN_KEY']:
+        return jsonify({'error': '未授权访问'}), 401
+    maintenance = get_maintenance()
+    if maintenance is None:
+        return jsonify({'error': '数据库维护未启用'}), 404
+    stats = maintenance.stats()
+    for job in stats['jobs'].values():
+        for name in ('last_run', 'next_run'):
+            if job.get(name):
+                job[name] = format_timestamp(job[name])
+    return jsonify(stats)
+
+@app.route('/admin/maintenance/run', methods=['POST'])
+def run_maintenance():
+    """
+    立即执行一个维护任务（如升级前手动备份），任务在后台线程中执行，完成后通过 GET /admin/maintenance 查看结果
+
+    请求体: {"job": "backup"}，可选 backup、expiry_sweep、checkpoint、optimize、vacuum
+    """
+    admin_key = request.headers.get('X-Admin-Key')
+    if not admin_key or admin_key != app.config['ADMIN_KEY']:
+        return jsonify({'error': '未授权访问'}), 401
+    maintenance = get_maintenance()
+    if maintenance is None:
+        return jsonify({'error': '数据库维护未启用'}), 404
+    data = request.get_json(silent=True)
+    job = data.get('job') if isinstance(data, dict) else None
+    if job not in MAINTENANCE_JOBS:
+        return jsonify({'error': f"job 必须是 {', '.join(MAINTENANCE_JOBS)} 之一"}), 400
+    maintenance.run_now(job)
+    logging.info(f"手动触发维护任务 {job}")
+    return jsonify({'success': True, 'job': job}), 202
+
 if __name__ == '__main__':
     app.config['ADMIN_KEY'] = 'your-admin-key-here'  # 设置管理员密钥
+    init_db()
     app.run(host='0.0.0.0', port=5000) 
\ No newline at end of file
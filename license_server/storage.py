@@ -0,0 +1,163 @@
+import time
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+
+DEFAULT_DB_PATH = 'licenses.db'
+
+# 连接级别的 PRAGMA 设置，每个新连接都会执行一次
+DEFAULT_PRAGMAS = {
+    'synchronous': 'NORMAL',      # WAL 模式下 NORMAL 已能保证一致性
+    'cache_size': -32000,         # 负数表示 KiB，约 32MB 页缓存
+    'mmap_size': 268435456,       # 256MB 内存映射读取
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,         # 毫秒
+}
+
+
+@contextmanager
+def immediate_transaction(conn: sqlite3.Connection):
+    """
+    在已借用的连接上执行 IMMEDIATE 事务
+
+    用于先在同一连接上做不需要写锁的准备工作（如写入临时表），再只在真正修改数据时持有写锁。
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+
+class PooledConnection(sqlite3.Connection):
+    """连接池中的连接，允许其他组件在连接上附加状态（如 data_version）"""
+
+
+class TimedConnection(PooledConnection):
+    """记录每条语句和提交耗时的连接，仅在配置了 observer 时使用"""
+    observer = None
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.observer(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.observer(sql, time.perf_counter() - started)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            self.observer('COMMIT', time.perf_counter() - started)
+
+
+class Database:
+    """
+    SQLite 连接池
+
+    连接在进程生命周期内复用，避免每个请求都重新打开数据库文件。
+    数据库以 WAL 模式运行，读操作不会被写操作阻塞。
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, pool_size: int = 8,
+                 pragmas: dict = None, cached_statements: int = 256, observer=None):
+        """
+        Args:
+            path: 数据库文件路径
+            pool_size: 空闲连接池的最大容量
+            pragmas: 覆盖默认的 PRAGMA 设置
+            cached_statements: 每个连接缓存的预编译语句数量
+            observer: 可选的 observer(sql, 秒数) 回调，用于统计每条语句的耗时
+        """
+        self.path = path
+        self.pool_size = pool_size
+        self.cached_statements = cached_statements
+        self.observer = observer
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._wal_enabled = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建并配置一个新连接"""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.pragmas['busy_timeout'] / 1000,
+            isolation_level=None,  # 自动提交，事务由 transaction() 显式管理
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=TimedConnection if self.observer else PooledConnection,
+        )
+        if self.observer:
+            conn.observer = self.observer
+        if not self._wal_enabled:
+            # 只对尚未建表的新数据库生效，且必须在启用 WAL 之前设置；已有数据库需要离线 VACUUM 一次才能转换
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            # journal_mode 会持久化到数据库文件，只需设置一次
+            mode = conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+            if mode.lower() != 'wal':
+                logging.warning(f"无法启用 WAL 模式，当前模式: {mode}")
+            self._wal_enabled = True
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name}={value}')
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('数据库连接池已关闭')
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def _release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if not self._closed and len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """借用一个连接，用于只读查询或自行管理事务"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """
+        在 IMMEDIATE 事务中执行写操作
+
+        事务开始时即获取写锁，避免读事务升级为写事务时产生 SQLITE_BUSY。
+        """
+        with self.connection() as conn, immediate_transaction(conn):
+            yield conn
+
+    def close(self):
+        """关闭所有空闲连接，之后不再分配新连接"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
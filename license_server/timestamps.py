@@ -0,0 +1,42 @@
+import time
+import datetime
+
+# API 中使用的时间格式（本地时间），数据库中以 Unix 时间戳（秒）存储
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+TIME_FIELDS = ('created_at', 'expires_at', 'last_seen_at')
+
+
+def now() -> int:
+    """当前时间的 Unix 时间戳"""
+    return int(time.time())
+
+
+def parse_timestamp(value):
+    """
+    将 API 传入的时间转换为 Unix 时间戳
+
+    接受整数时间戳、'YYYY-MM-DD HH:MM:SS' 或 'YYYY-MM-DD'，None 原样返回。
+
+    Raises:
+        ValueError: 格式不正确，包括 JSON 中的 true/false（bool 是 int 的子类，需要单独排除）
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"时间格式应为 YYYY-MM-DD[ HH:MM:SS]: {value}")
+    if value is None or isinstance(value, int):
+        return value
+    value = str(value).strip()
+    if not value:
+        return None
+    for fmt in (TIME_FORMAT, '%Y-%m-%d'):
+        try:
+            return int(datetime.datetime.strptime(value, fmt).timestamp())
+        except ValueError:
+            continue
+    raise ValueError(f"时间格式应为 YYYY-MM-DD[ HH:MM:SS]: {value}")
+
+
+def format_timestamp(value):
+    """将 Unix 时间戳格式化为 API 使用的本地时间字符串"""
+    if value is None:
+        return None
+    return datetime.datetime.fromtimestamp(value).strftime(TIME_FORMAT)
@@ -0,0 +1,84 @@
+import sys
+import json
+import base64
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from timestamps import now
+
+TOKEN_VERSION = 1
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+class TokenSigner:
+    """
+    离线许可证令牌签发器
+
+    令牌格式为 base64url(载荷 JSON).base64url(Ed25519 签名)，
+    客户端使用对应的公钥在本地验证，有效期内无需访问服务器。
+    """
+
+    def __init__(self, private_key: Ed25519PrivateKey, ttl: int = 7 * 24 * 3600):
+        """
+        Args:
+            private_key: Ed25519 私钥
+            ttl: 令牌有效期（秒），也决定了禁用许可证后客户端最迟多久失效
+        """
+        self.private_key = private_key
+        self.ttl = ttl
+
+    @classmethod
+    def from_file(cls, path: str, ttl: int = 7 * 24 * 3600) -> 'TokenSigner':
+        """从 PEM 格式的私钥文件创建"""
+        with open(path, 'rb') as f:
+            private_key = serialization.load_pem_private_key(f.read(), password=None)
+        if not isinstance(private_key, Ed25519PrivateKey):
+            raise ValueError('令牌签名私钥必须是 Ed25519 密钥')
+        return cls(private_key, ttl)
+
+    def issue(self, license_key: str, machine_code: str, license_expires_at=None,
+              features=None) -> str:
+        """签发令牌，有效期不超过许可证本身的过期时间"""
+        issued_at = now()
+        expires_at = issued_at + self.ttl
+        if license_expires_at is not None:
+            expires_at = min(expires_at, license_expires_at)
+        payload = json.dumps({
+            'v': TOKEN_VERSION,
+            'license_key': license_key,
+            'machine_code': machine_code,
+            'features': features or [],
+            'issued_at': issued_at,
+            'expires_at': expires_at,
+        }, separators=(',', ':'), sort_keys=True).encode('utf-8')
+        signature = self.private_key.sign(payload)
+        return f"{_b64encode(payload)}.{_b64encode(signature)}"
+
+
+def generate_keypair(private_path: str, public_path: str):
+    """生成 Ed25519 密钥对，私钥留在服务器，公钥随客户端分发"""
+    private_key = Ed25519PrivateKey.generate()
+    with open(private_path, 'wb') as f:
+        f.write(private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        ))
+    with open(public_path, 'wb') as f:
+        f.write(private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        ))
+
+
+if __name__ == '__main__':
+    # python tokens.py token_private.pem token_public.pem
+    if len(sys.argv) != 3:
+        print("用法: python tokens.py <私钥输出路径> <公钥输出路径>")
+        sys.exit(1)
+    generate_keypair(sys.argv[1], sys.argv[2])
+    print(f"已生成密钥对: {sys.argv[1]}, {sys.argv[2]}")
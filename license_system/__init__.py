@@ -1,5 +1,26 @@
-from .validator import LicenseValidator
-from .ui.license_dialog import LicenseDialog
+import importlib
 
 __version__ = "1.0.0"
-__all__ = ['LicenseValidator', 'LicenseDialog'] 
\ No newline at end of file
+__all__ = ['LicenseValidator', 'LocalLicenseStore', 'LicenseDialog', 'ValidationThread', 'RevalidationScheduler']
+
+# 按需导入：仅使用 LicenseValidator 的程序不会加载 PyQt6
+_lazy_attrs = {
+    'LicenseValidator': '.validator',
+    'LocalLicenseStore': '.store',
+    'LicenseDialog': '.ui.license_dialog',
+    'ValidationThread': '.ui.validation',
+    'RevalidationScheduler': '.ui.validation',
+}
+
+
+def __getattr__(name):
+    module = _lazy_attrs.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
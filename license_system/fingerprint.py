@@ -0,0 +1,175 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import platform
+import threading
+from typing import Dict, Optional, Type
+
+
+class FingerprintProvider:
+    """
+    机器指纹提供者
+
+    collect() 采集硬件信息，可能很慢（如 WMI 查询）；
+    stability_key() 必须足够快，用于判断磁盘缓存的机器码是否仍然属于本机。
+    """
+
+    def stability_key(self) -> str:
+        return f"{platform.node()}-{platform.system()}-{platform.machine()}"
+
+    def collect(self) -> str:
+        """返回用于生成机器码的硬件信息字符串"""
+        raise NotImplementedError
+
+    def machine_code(self) -> str:
+        return str(uuid.uuid5(uuid.NAMESPACE_DNS, self.collect()))
+
+
+class FallbackProvider(FingerprintProvider):
+    """无法获取硬件信息时，使用系统信息生成备用标识"""
+
+    def collect(self) -> str:
+        return f"{platform.node()}-{platform.machine()}-{platform.processor()}"
+
+
+class WindowsProvider(FingerprintProvider):
+    """通过 WMI 读取 CPU、主板和 BIOS 序列号"""
+
+    def stability_key(self) -> str:
+        # 注册表中的 MachineGuid 在系统安装时生成，读取开销远小于 WMI 查询
+        try:
+            import winreg
+            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE,
+                                r"SOFTWARE\Microsoft\Cryptography") as key:
+                guid = winreg.QueryValueEx(key, "MachineGuid")[0]
+        except OSError:
+            guid = ''
+        return f"{super().stability_key()}-{guid}"
+
+    def collect(self) -> str:
+        # wmi 仅在 Windows 上可用，且导入较慢，延迟到真正需要时导入
+        import wmi
+
+        c = wmi.WMI()
+        # 获取CPU序列号
+        cpu = c.Win32_Processor()[0].ProcessorId.strip()
+        # 获取主板序列号
+        board = c.Win32_BaseBoard()[0].SerialNumber.strip()
+        # 获取BIOS序列号
+        bios = c.Win32_BIOS()[0].SerialNumber.strip()
+        return f"{cpu}-{board}-{bios}"
+
+
+class LinuxProvider(FingerprintProvider):
+    """读取 systemd machine-id 和 DMI 信息"""
+
+    MACHINE_ID_PATHS = ('/etc/machine-id', '/var/lib/dbus/machine-id')
+    DMI_FIELDS = ('product_uuid', 'board_serial', 'product_serial',
+                  'board_vendor', 'board_name', 'sys_vendor', 'product_name')
+
+    @staticmethod
+    def _read(path: str) -> str:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except OSError:
+            return ''
+
+    def _machine_id(self) -> str:
+        for path in self.MACHINE_ID_PATHS:
+            value = self._read(path)
+            if value:
+                return value
+        return ''
+
+    def stability_key(self) -> str:
+        return f"{super().stability_key()}-{self._machine_id()}"
+
+    def collect(self) -> str:
+        # product_uuid、序列号等字段通常仅 root 可读，读不到时跳过
+        dmi = [self._read(f'/sys/class/dmi/id/{name}') for name in self.DMI_FIELDS]
+        machine_id = self._machine_id()
+        if not machine_id and not any(dmi):
+            raise RuntimeError('无法读取 machine-id 或 DMI 信息')
+        return '-'.join([machine_id] + dmi)
+
+
+_providers: Dict[str, Type[FingerprintProvider]] = {
+    'Windows': WindowsProvider,
+    'Linux': LinuxProvider,
+}
+
+
+def register_provider(system: str, provider: Type[FingerprintProvider]):
+    """为指定的 platform.system() 注册指纹提供者"""
+    _providers[system] = provider
+
+
+def get_provider() -> FingerprintProvider:
+    return _providers.get(platform.system(), FallbackProvider)()
+
+
+def default_cache_path() -> str:
+    """机器码磁盘缓存的默认位置"""
+    if platform.system() == 'Windows':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'license_system', 'machine_code.json')
+
+
+_memo: Dict[Optional[str], str] = {}
+_memo_lock = threading.Lock()
+
+
+def get_machine_code(cache_path: Optional[str] = None) -> str:
+    """
+    获取机器唯一标识码
+
+    结果在进程内缓存；同时写入磁盘缓存，并以 stability_key 的摘要作为校验，
+    之后的进程只要校验一致就直接复用，不再枚举硬件。
+
+    Args:
+        cache_path: 磁盘缓存文件路径，默认见 default_cache_path()
+    """
+    code = _memo.get(cache_path)
+    if code is not None:
+        return code
+
+    with _memo_lock:
+        code = _memo.get(cache_path)
+        if code is None:
+            code = _load_or_compute(cache_path or default_cache_path())
+            _memo[cache_path] = code
+    return code
+
+
+def _load_or_compute(path: str) -> str:
+    provider = get_provider()
+    check = hashlib.sha256(provider.stability_key().encode('utf-8')).hexdigest()
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('check') == check and cached.get('machine_code'):
+            return cached['machine_code']
+    except (OSError, ValueError):
+        pass
+
+    try:
+        code = provider.machine_code()
+    except Exception as e:
+        logging.error(f"获取机器码失败: {str(e)}")
+        code = FallbackProvider().machine_code()
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'check': check, 'machine_code': code}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"写入机器码缓存失败: {str(e)}")
+    return code
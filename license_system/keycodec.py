@@ -0,0 +1,166 @@
+"""
+许可证密钥编码
+
+新格式为 25 个 Crockford Base32 字符，每 5 个一组：XXXXX-XXXXX-XXXXX-XXXXX-XXXXX。
+共 125 位，依次为：
+
+    版本 4 位 | 产品 12 位 | 版本类型 4 位 | 随机数 70 位 | MAC 20 位 | 校验 15 位
+
+校验位是前 110 位的 SHA-256 截断，任何人都可以验证，用于立即发现输入错误；
+MAC 是服务器密钥对前 90 位的 HMAC-SHA256 截断，只有持有密钥的服务器能验证，
+用于在查询数据库之前拒绝伪造的密钥。未配置密钥时 MAC 位为随机数，不做验证。
+旧的 UUID 格式密钥继续有效。
+"""
+import os
+import re
+import uuid
+import hashlib
+from typing import NamedTuple, Optional
+
+KEY_VERSION = 1
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+GROUP_SIZE = 5
+KEY_LENGTH = 25
+
+PRODUCT_BITS = 12
+EDITION_BITS = 4
+RANDOM_BITS = 70
+MAC_BITS = 20
+CHECK_BITS = 15
+
+MAX_PRODUCT = (1 << PRODUCT_BITS) - 1
+MAX_EDITION = (1 << EDITION_BITS) - 1
+
+# Crockford Base32 将易混淆的字符视为对应的数字，并忽略分组符号和空格
+_NORMALIZE = str.maketrans({'O': '0', 'I': '1', 'L': '1', '-': None, ' ': None})
+_KEY_PATTERN = re.compile(f'[{ALPHABET}]{{{KEY_LENGTH}}}')
+# 转换为 int(..., 32) 使用的字母表，解码由 C 实现完成
+_TO_INT_DIGITS = str.maketrans(ALPHABET, '0123456789abcdefghijklmnopqrstuv')
+
+
+class KeyFormatError(ValueError):
+    """许可证密钥格式不正确"""
+
+
+class KeyInfo(NamedTuple):
+    """解析后的许可证密钥"""
+    key: str                # 规范形式
+    version: int            # 0 表示 UUID 格式
+    product: int = 0
+    edition: int = 0
+    mac: Optional[int] = None
+    body: int = 0           # 参与 MAC 计算的前 90 位
+
+
+def _check(payload: int) -> int:
+    digest = hashlib.sha256(payload.to_bytes(14, 'big')).digest()
+    return int.from_bytes(digest[:2], 'big') >> (16 - CHECK_BITS)
+
+
+def _mac(body: int, secret: bytes) -> int:
+    import hmac
+
+    digest = hmac.new(secret, body.to_bytes(12, 'big'), hashlib.sha256).digest()
+    return int.from_bytes(digest[:3], 'big') >> (24 - MAC_BITS)
+
+
+def _group(text: str) -> str:
+    return '-'.join(text[i:i + GROUP_SIZE] for i in range(0, KEY_LENGTH, GROUP_SIZE))
+
+
+def _encode(value: int) -> str:
+    chars = []
+    for _ in range(KEY_LENGTH):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return _group(''.join(reversed(chars)))
+
+
+def generate_key(product: int = 0, edition: int = 0, secret: Optional[bytes] = None) -> str:
+    """
+    生成新格式的许可证密钥
+
+    Args:
+        product: 产品编号（0-4095）
+        edition: 版本类型编号（0-15）
+        secret: 服务器 MAC 密钥，为空时 MAC 位为随机数
+    """
+    if not 0 <= product <= MAX_PRODUCT:
+        raise ValueError(f"产品编号必须在 0 到 {MAX_PRODUCT} 之间")
+    if not 0 <= edition <= MAX_EDITION:
+        raise ValueError(f"版本类型编号必须在 0 到 {MAX_EDITION} 之间")
+
+    random_part = int.from_bytes(os.urandom(9), 'big') >> (72 - RANDOM_BITS)
+    body = (((KEY_VERSION << PRODUCT_BITS | product) << EDITION_BITS | edition) << RANDOM_BITS) | random_part
+    if secret:
+        mac = _mac(body, secret)
+    else:
+        mac = int.from_bytes(os.urandom(3), 'big') >> (24 - MAC_BITS)
+    payload = body << MAC_BITS | mac
+    return _encode(payload << CHECK_BITS | _check(payload))
+
+
+def parse_key(license_key: str) -> KeyInfo:
+    """
+    解析并校验许可证密钥（不验证 MAC）
+
+    新格式不区分大小写，分组符号和空格可省略；UUID 格式原样接受。
+
+    Raises:
+        KeyFormatError: 格式或校验位不正确
+    """
+    if not isinstance(license_key, str):
+        raise KeyFormatError('许可证密钥必须是字符串')
+    text = license_key.strip()
+    if len(text) == 36 and text.count('-') == 4:
+        try:
+            return KeyInfo(str(uuid.UUID(text)), 0)
+        except ValueError:
+            raise KeyFormatError('许可证密钥格式不正确') from None
+
+    text = text.upper().translate(_NORMALIZE)
+    if not _KEY_PATTERN.fullmatch(text):
+        raise KeyFormatError('许可证密钥格式不正确')
+    value = int(text.translate(_TO_INT_DIGITS), 32)
+
+    payload, check = value >> CHECK_BITS, value & ((1 << CHECK_BITS) - 1)
+    if _check(payload) != check:
+        raise KeyFormatError('许可证密钥校验失败，请检查输入')
+    body, mac = payload >> MAC_BITS, payload & ((1 << MAC_BITS) - 1)
+    version = body >> (RANDOM_BITS + EDITION_BITS + PRODUCT_BITS)
+    if version != KEY_VERSION:
+        raise KeyFormatError(f"不支持的许可证密钥版本: {version}")
+    return KeyInfo(
+        key=_group(text),
+        version=version,
+        product=(body >> (RANDOM_BITS + EDITION_BITS)) & MAX_PRODUCT,
+        edition=(body >> RANDOM_BITS) & MAX_EDITION,
+        mac=mac,
+        body=body,
+    )
+
+
+def verify_mac(info: KeyInfo, secret: Optional[bytes]) -> bool:
+    """验证密钥的 MAC；UUID 格式或未配置密钥时总是通过"""
+    if info.version == 0 or not secret:
+        return True
+    import hmac
+
+    return hmac.compare_digest(_mac(info.body, secret).to_bytes(3, 'big'), info.mac.to_bytes(3, 'big'))
+
+
+def is_valid_format(license_key: str) -> bool:
+    """密钥格式和校验位是否正确，供客户端在联网前检查"""
+    try:
+        parse_key(license_key)
+        return True
+    except KeyFormatError:
+        return False
+
+
+def normalize_key(license_key: str) -> str:
+    """返回密钥的规范形式，格式不正确时原样返回"""
+    try:
+        return parse_key(license_key).key
+    except KeyFormatError:
+        return license_key
@@ -0,0 +1,66 @@
+import json
+import time
+import base64
+import logging
+from typing import Optional
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def load_public_key(public_key: str):
+    """
+    加载服务器的 Ed25519 公钥
+
+    Args:
+        public_key: PEM 格式的公钥内容或公钥文件路径
+
+    Returns:
+        公钥对象；未安装 cryptography 时返回 None（退回在线验证）
+    """
+    try:
+        from cryptography.hazmat.primitives import serialization
+    except ImportError:
+        logging.warning("未安装 cryptography，离线令牌验证不可用")
+        return None
+
+    if '-----BEGIN' in public_key:
+        data = public_key.encode('ascii')
+    else:
+        with open(public_key, 'rb') as f:
+            data = f.read()
+    return serialization.load_pem_public_key(data)
+
+
+def verify_token(token: str, public_key, license_key: str, machine_code: str,
+                 now: float = None) -> Optional[dict]:
+    """
+    在本地验证服务器签发的离线令牌
+
+    Returns:
+        签名有效、许可证和机器码匹配且未过期时返回令牌载荷，否则返回 None
+    """
+    if not token or public_key is None:
+        return None
+    try:
+        from cryptography.exceptions import InvalidSignature
+
+        payload_part, signature_part = token.split('.')
+        payload_bytes = _b64decode(payload_part)
+        try:
+            public_key.verify(_b64decode(signature_part), payload_bytes)
+        except InvalidSignature:
+            logging.warning("离线令牌签名无效")
+            return None
+
+        payload = json.loads(payload_bytes)
+        if payload.get('license_key') != license_key or payload.get('machine_code') != machine_code:
+            return None
+        if payload.get('expires_at', 0) <= (time.time() if now is None else now):
+            return None
+        return payload
+
+    except Exception as e:
+        logging.error(f"解析离线令牌失败: {str(e)}")
+        return None
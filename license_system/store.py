@@ -0,0 +1,204 @@
+import os
+import hmac
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+
+class _FileLock:
+    """
+    跨进程的排他文件锁
+
+    锁定单独的 .lock 文件而不是配置文件本身，配置文件被原子替换后锁仍然有效。
+    """
+
+    def __init__(self, path: str, timeout: float = 10):
+        self.path = path
+        self.timeout = timeout
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a+b')
+        try:
+            self._acquire()
+        except BaseException:
+            self._file.close()
+            self._file = None
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self._release()
+        finally:
+            self._file.close()
+            self._file = None
+
+    if os.name == 'nt':
+        def _acquire(self):
+            import msvcrt
+
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+                    return
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f"等待配置文件锁超时: {self.path}")
+                    time.sleep(0.05)
+
+        def _release(self):
+            import msvcrt
+
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        def _acquire(self):
+            import fcntl
+
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f"等待配置文件锁超时: {self.path}")
+                    time.sleep(0.05)
+
+        def _release(self):
+            import fcntl
+
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+
+def _record_signature(license_key: str, machine_code: str, validated_at: int) -> str:
+    """
+    验证记录的 HMAC，密钥由本机机器码派生
+
+    手工修改记录中的时间或把记录复制到其他机器都会使签名失效；密钥仍可在本机推算，
+    需要密码学上不可伪造的本地验证时使用服务器签发的离线令牌。
+    """
+    key = hashlib.sha256(b'license_system.last_validation:' + machine_code.encode('utf-8')).digest()
+    message = f'{license_key}\n{machine_code}\n{validated_at}'.encode('utf-8')
+    return hmac.new(key, message, hashlib.sha256).hexdigest()
+
+
+class LocalLicenseStore:
+    """
+    本地许可证配置（config.json）
+
+    解析后的配置缓存在内存中，每次读取只做一次 stat()，文件被其他进程修改
+    （修改时间、大小或 inode 变化）时才重新解析。写入时先持有跨进程文件锁，
+    重新读取磁盘上的最新内容后合并修改，写入临时文件并 fsync，再原子替换原文件，
+    写到一半崩溃也不会留下损坏的配置。
+    """
+
+    def __init__(self, path: str = 'config.json', lock_timeout: float = 10):
+        """
+        Args:
+            path: 配置文件路径
+            lock_timeout: 等待其他进程释放文件锁的最长时间（秒）
+        """
+        self.path = path
+        self.lock_timeout = lock_timeout
+
+        self._config: Dict[str, Any] = {}
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _read_locked(self) -> Dict[str, Any]:
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            config = {}
+            if stamp is not None:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+            self._config, self._stamp = config, stamp
+        return self._config
+
+    def load(self) -> Dict[str, Any]:
+        """返回当前配置的副本"""
+        with self._lock:
+            return dict(self._read_locked())
+
+    def get(self, name: str, default=None):
+        with self._lock:
+            return self._read_locked().get(name, default)
+
+    def update(self, **values):
+        """更新指定字段，值为 None 时删除该字段"""
+        with self._lock, _FileLock(self.path + '.lock', self.lock_timeout):
+            # 持有文件锁后重新读取，合并其他进程在此期间写入的内容
+            config = dict(self._read_locked())
+            for name, value in values.items():
+                if value is None:
+                    config.pop(name, None)
+                else:
+                    config[name] = value
+            self._write_locked(config)
+
+    def _write_locked(self, config: Dict[str, Any]):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        if os.name != 'nt':
+            # 同步目录项，保证替换本身在断电后仍然有效
+            try:
+                fd = os.open(directory, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                logging.debug(f"同步配置目录失败: {str(e)}")
+        self._config, self._stamp = config, self._file_stamp()
+
+    @staticmethod
+    def validation_record(license_key: str, machine_code: str) -> Dict[str, Any]:
+        """联网验证成功的签名记录，保存在 last_validation 字段中"""
+        validated_at = int(time.time())
+        return {
+            'license_key': license_key,
+            'machine_code': machine_code,
+            'validated_at': validated_at,
+            'signature': _record_signature(license_key, machine_code, validated_at),
+        }
+
+    def last_validation(self, license_key: str, machine_code: str) -> Optional[float]:
+        """返回该许可证在本机最近一次联网验证成功的时间（Unix 时间戳），没有记录或签名不符时返回 None"""
+        record = self.get('last_validation')
+        if not isinstance(record, dict):
+            return None
+        if record.get('license_key') != license_key or record.get('machine_code') != machine_code:
+            return None
+        validated_at, signature = record.get('validated_at'), record.get('signature')
+        if type(validated_at) is not int or not isinstance(signature, str):
+            return None
+        if not hmac.compare_digest(signature, _record_signature(license_key, machine_code, validated_at)):
+            logging.warning("本地验证记录签名无效，已忽略")
+            return None
+        return validated_at
@@ -0,0 +1,202 @@
+import time
+import random
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+# 这些状态码通常是暂时性的（请求过快、网关错误、服务器过载），可以重试
+RETRY_STATUS = frozenset({429, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+
+def _request_not_sent(error) -> bool:
+    """连接阶段就失败的请求没有到达服务器，重试不会造成重复执行"""
+    import requests
+    from urllib3.exceptions import NewConnectionError
+
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或 HTTP 日期），返回需要等待的秒数，无法解析时返回 None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    from email.utils import parsedate_to_datetime
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class HttpTransport:
+    """
+    共享的 HTTP 传输层
+
+    所有请求复用同一个带连接池的 requests.Session（keep-alive），
+    并对暂时性错误按指数退避加随机抖动重试。
+    """
+
+    def __init__(self, base_url: str, connect_timeout: float = 3.05, read_timeout: float = 10,
+                 max_retries: int = 3, backoff_factor: float = 0.5, backoff_max: float = 10,
+                 pool_maxsize: int = 10, verify: bool = False, compress: bool = True,
+                 retry_after_max: float = 30, total_timeout: Optional[float] = None):
+        """
+        Args:
+            base_url: 服务器地址
+            connect_timeout: 建立连接的超时时间（秒）
+            read_timeout: 等待响应的超时时间（秒）
+            max_retries: 暂时性错误的最大重试次数
+            backoff_factor: 退避基数，第 n 次重试前最多等待 backoff_factor * 2^(n-1) 秒
+            backoff_max: 单次等待的上限（秒）
+            pool_maxsize: 连接池大小
+            verify: 是否校验 HTTPS 证书
+            compress: 是否接受 gzip 压缩的响应
+            retry_after_max: 服务器要求等待（Retry-After）超过该秒数时不再重试，直接返回响应
+            total_timeout: 一次请求包括所有重试和等待在内的最长时间（秒），None 表示不限制；
+                下一次重试会超出该时间时不再等待，返回最后一次的响应或抛出最后一次的错误
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.pool_maxsize = pool_maxsize
+        self.verify = verify
+        self.compress = compress
+        self.retry_after_max = retry_after_max
+        self.total_timeout = total_timeout
+
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """延迟创建 Session，避免导入时加载 requests"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    session.verify = self.verify
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize,
+                                          max_retries=0)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    if not self.compress:
+                        session.headers['Accept-Encoding'] = 'identity'
+                    self._session = session
+        return self._session
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重试前的等待时间（full jitter）"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** (attempt - 1))))
+
+    def request(self, method: str, path: str, idempotent: Optional[bool] = None,
+                timeout=None, total_timeout: Optional[float] = None, **kwargs):
+        """
+        发送请求，暂时性错误时自动重试
+
+        建立连接失败总会重试（请求尚未到达服务器）；其他网络错误、读超时和
+        429/502/503/504 仅对幂等请求重试，避免重复执行生成等写操作。
+        响应带有 Retry-After 时按服务器要求的时间等待，而不是按退避时间。
+
+        Args:
+            method: HTTP 方法
+            path: 以 / 开头的路径
+            idempotent: 请求是否可安全重复，默认按 HTTP 方法判断
+            timeout: 覆盖默认的 (连接超时, 读取超时)
+            total_timeout: 覆盖默认的总超时时间
+            kwargs: 传给 requests 的其他参数
+        """
+        import requests
+
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        url = f"{self.base_url}{path}"
+        connect_timeout, read_timeout = timeout or self.timeout
+        if total_timeout is None:
+            total_timeout = self.total_timeout
+        deadline = None if total_timeout is None else time.monotonic() + total_timeout
+
+        attempt = 0
+        while True:
+            retry_after = response = error = None
+            if deadline is not None:
+                # 读取等待不超过剩余时间，最后一次尝试也不会越过总超时
+                read_timeout = min(read_timeout, max(0.1, deadline - time.monotonic()))
+            try:
+                response = self.session.request(method, url, timeout=(connect_timeout, read_timeout),
+                                                **kwargs)
+                if not (idempotent and response.status_code in RETRY_STATUS
+                        and attempt < self.max_retries):
+                    return response
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if retry_after is not None and retry_after > self.retry_after_max:
+                    # 等待时间过长，交给调用方决定何时再试
+                    return response
+                reason = f"服务器响应 {response.status_code}"
+            except requests.exceptions.ConnectionError as e:
+                if attempt >= self.max_retries or not (idempotent or _request_not_sent(e)):
+                    raise
+                error, reason = e, str(e)
+            except requests.exceptions.Timeout as e:
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                error, reason = e, str(e)
+
+            attempt += 1
+            delay = self.backoff(attempt) if retry_after is None else retry_after
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                # 等待后已没有时间再试一次，直接返回最后一次的结果
+                logging.warning(f"请求 {method} {path} 已达到总超时 {total_timeout} 秒，不再重试: {reason}")
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                response.close()
+            logging.warning(f"请求 {method} {path} 失败，{delay:.2f} 秒后进行第 {attempt} 次重试: {reason}")
+            time.sleep(delay)
+
+    def get(self, path: str, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+_transports: Dict[Tuple, HttpTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(base_url: str, **options) -> HttpTransport:
+    """
+    获取进程内共享的传输层
+
+    相同服务器地址和参数的客户端复用同一个连接池。
+    """
+    key = (base_url.rstrip('/'),) + tuple(sorted(options.items()))
+    transport = _transports.get(key)
+    if transport is None:
+        with _transports_lock:
+            transport = _transports.get(key)
+            if transport is None:
+                transport = HttpTransport(base_url, **options)
+                _transports[key] = transport
+    return transport
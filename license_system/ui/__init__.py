@@ -1,4 +1,23 @@
-from .license_dialog import LicenseDialog
-from .styles import LICENSE_DIALOG_STYLE
+import importlib
 
-__all__ = ['LicenseDialog', 'LICENSE_DIALOG_STYLE'] 
\ No newline at end of file
+__all__ = ['LicenseDialog', 'LICENSE_DIALOG_STYLE', 'ValidationThread', 'RevalidationScheduler']
+
+_lazy_attrs = {
+    'LicenseDialog': '.license_dialog',
+    'LICENSE_DIALOG_STYLE': '.styles',
+    'ValidationThread': '.validation',
+    'RevalidationScheduler': '.validation',
+}
+
+
+def __getattr__(name):
+    module = _lazy_attrs.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,13 +1,28 @@
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, 
-                            QLabel, QLineEdit, QPushButton, QMessageBox)
+                            QLabel, QLineEdit, QPushButton, QMessageBox, QProgressBar)
 from PyQt6.QtCore import Qt
 from .styles import LICENSE_DIALOG_STYLE
+from .validation import ValidationThread
+from ..keycodec import is_valid_format, normalize_key, KEY_LENGTH
 
 class LicenseDialog(QDialog):
-    def __init__(self, parent=None):
+    # 对话框关闭时仍在运行的验证线程，保留引用直到线程结束
+    _detached_threads = set()
+    
+    def __init__(self, parent=None, validator=None, key_check=None):
+        """
+        Args:
+            parent: 父窗口
+            validator: 可选的 LicenseValidator，提供后点击激活时在后台验证，验证通过才关闭对话框
+            key_check: 是否在本地检查密钥格式，默认与 validator.key_check 一致（没有 validator 时检查）；
+                为 False 时任何非空输入都可以提交
+        """
         super().__init__(parent)
+        self.validator = validator
+        self.key_check = getattr(validator, 'key_check', True) if key_check is None else key_check
+        self._validation_thread = None
         self.setWindowTitle("软件激活")
-        self.setFixedSize(400, 150)
+        self.setFixedSize(400, 190)
         self.setWindowFlags(Qt.WindowType.WindowStaysOnTopHint)
         
         # 应用样式
@@ -28,13 +43,25 @@ class LicenseDialog(QDialog):
         
         # 添加输入框
         self.key_input = QLineEdit()
-        self.key_input.setPlaceholderText("请输入许可证密钥")
+        self.key_input.setPlaceholderText("XXXXX-XXXXX-XXXXX-XXXXX-XXXXX")
+        self.key_input.textChanged.connect(self._on_text_changed)
         layout.addWidget(self.key_input)
         
+        # 验证状态，仅在后台验证时显示
+        self.status_label = QLabel()
+        self.status_label.hide()
+        layout.addWidget(self.status_label)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 0)  # 不确定进度的忙碌指示
+        self.progress_bar.setTextVisible(False)
+        self.progress_bar.setFixedHeight(6)
+        self.progress_bar.hide()
+        layout.addWidget(self.progress_bar)
+        
         # 添加按钮
         button_layout = QHBoxLayout()
         self.activate_btn = QPushButton("激活")
-        self.activate_btn.clicked.connect(self.accept)
+        self.activate_btn.clicked.connect(self._on_activate)
         self.cancel_btn = QPushButton("取消")
         self.cancel_btn.clicked.connect(self.reject)
         
@@ -42,15 +69,82 @@ class LicenseDialog(QDialog):
         button_layout.addWidget(self.activate_btn)
         button_layout.addWidget(self.cancel_btn)
         layout.addLayout(button_layout)
+        self._on_text_changed('')
     
     def get_license_key(self):
-        """获取输入的许可证密钥"""
-        return self.key_input.text().strip()
+        """获取输入的许可证密钥（规范形式）"""
+        return normalize_key(self.key_input.text().strip())
+    
+    def _acceptable(self, text: str) -> bool:
+        """输入是否可以提交验证"""
+        return is_valid_format(text) if self.key_check else bool(text)
+    
+    def _on_text_changed(self, text: str):
+        """输入时在本地检查密钥格式和校验位，格式正确才允许激活"""
+        text = text.strip()
+        valid = self._acceptable(text)
+        self.activate_btn.setEnabled(valid)
+        # 输入达到完整长度后仍不正确时提示，输入过程中不打扰
+        complete = len(text.replace('-', '').replace(' ', '')) >= KEY_LENGTH
+        if text and not valid and complete:
+            self.status_label.setText("许可证密钥格式不正确，请检查输入")
+            self.status_label.show()
+        else:
+            self.status_label.hide()
+    
+    def _on_activate(self):
+        license_key = self.get_license_key()
+        if not self._acceptable(license_key):
+            QMessageBox.warning(self, "错误", "许可证密钥格式不正确，请检查输入")
+            return
+            
+        if self.validator is None:
+            self.accept()
+            return
+            
+        self._set_busy(True)
+        self._validation_thread = ValidationThread(self.validator, license_key, self)
+        self._validation_thread.validated.connect(self._on_validated)
+        self._validation_thread.start()
+    
+    def _on_validated(self, valid: bool):
+        self._validation_thread = None
+        self._set_busy(False)
+        if valid:
+            self.validator.save_license(self.get_license_key())
+            self.accept()
+        else:
+            self.status_label.setText("许可证无效或无法连接验证服务器")
+            self.status_label.show()
+    
+    def _set_busy(self, busy: bool):
+        """验证期间禁用输入并显示进度"""
+        self.key_input.setEnabled(not busy)
+        self.activate_btn.setEnabled(not busy and self._acceptable(self.key_input.text().strip()))
+        self.progress_bar.setVisible(busy)
+        if busy:
+            self.status_label.setText("正在验证许可证...")
+        self.status_label.setVisible(busy)
+    
+    def reject(self):
+        # 取消时不等待仍在进行的验证，将线程与对话框分离，结束后自行释放
+        thread = self._validation_thread
+        if thread is not None and thread.isRunning():
+            thread.validated.disconnect(self._on_validated)
+            thread.setParent(None)
+            LicenseDialog._detached_threads.add(thread)
+            thread.finished.connect(lambda: LicenseDialog._detached_threads.discard(thread))
+            self._validation_thread = None
+        super().reject()
     
     @staticmethod
-    def get_key(parent=None):
-        """显示对话框并获取许可证密钥"""
-        dialog = LicenseDialog(parent)
+    def get_key(parent=None, validator=None, key_check=None):
+        """
+        显示对话框并获取许可证密钥
+        
+        提供 validator 时，密钥在后台验证通过并保存后才返回，验证期间界面保持响应。
+        """
+        dialog = LicenseDialog(parent, validator, key_check)
         result = dialog.exec()
         
         if result == QDialog.DialogCode.Accepted:
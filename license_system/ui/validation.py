@@ -0,0 +1,90 @@
+from PyQt6.QtCore import QCoreApplication, QObject, QThread, QTimer, pyqtSignal, pyqtSlot
+
+
+class ValidationThread(QThread):
+    """在后台线程中验证许可证，避免阻塞 Qt 事件循环"""
+    validated = pyqtSignal(bool)  # 验证结果信号
+
+    def __init__(self, validator, license_key=None, parent=None):
+        super().__init__(parent)
+        self.validator = validator
+        self.license_key = license_key
+
+    def run(self):
+        self.validated.emit(self.validator.validate_license(self.license_key))
+
+
+class RevalidationScheduler(QObject):
+    """
+    定期在后台重新验证许可证
+
+    每次验证都在独立线程中进行，上一次尚未完成时跳过本轮，
+    因此服务器缓慢或不可达时也不会阻塞界面或堆积请求。
+    """
+    checked = pyqtSignal(bool)    # 每次验证完成
+    invalidated = pyqtSignal()    # 许可证不再有效
+
+    # 尚未结束的验证线程。线程不以调度器为父对象，调度器或所属窗口在验证期间被销毁时，
+    # 线程继续运行到结束再自行释放，不会因为销毁仍在运行的 QThread 而终止进程
+    _running_threads = set()
+
+    def __init__(self, validator, interval_ms: int = 3600 * 1000, parent=None):
+        """
+        Args:
+            validator: LicenseValidator 实例
+            interval_ms: 验证间隔（毫秒）
+        """
+        super().__init__(parent)
+        self.validator = validator
+        self._thread = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.check_now)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stop)
+            app.aboutToQuit.connect(RevalidationScheduler.wait_for_threads)
+
+    def start(self, check_immediately: bool = False):
+        self._timer.start()
+        if check_immediately:
+            self.check_now()
+
+    @pyqtSlot()
+    def stop(self):
+        """停止定期验证，正在进行的验证与调度器分离，结束后不再发出信号"""
+        self._timer.stop()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.validated.disconnect(self._handle_result)
+            thread.finished.disconnect(self._thread_finished)
+
+    @staticmethod
+    def wait_for_threads():
+        """等待所有仍在进行的验证结束，应用退出时调用，避免线程对象随解释器退出被销毁"""
+        for thread in list(RevalidationScheduler._running_threads):
+            thread.wait()
+
+    @pyqtSlot()
+    def check_now(self):
+        """立即在后台验证一次"""
+        if self._thread is not None and self._thread.isRunning():
+            return
+        thread = ValidationThread(self.validator)
+        thread.validated.connect(self._handle_result)
+        thread.finished.connect(self._thread_finished)
+        thread.finished.connect(thread.deleteLater)
+        thread.destroyed.connect(lambda: RevalidationScheduler._running_threads.discard(thread))
+        RevalidationScheduler._running_threads.add(thread)
+        self._thread = thread
+        thread.start()
+
+    @pyqtSlot()
+    def _thread_finished(self):
+        self._thread = None
+
+    @pyqtSlot(bool)
+    def _handle_result(self, valid: bool):
+        self.checked.emit(valid)
+        if not valid:
+            self.invalidated.emit()
@@ -1,79 +1,129 @@
-import os
-import json
-import requests
+import time
 import logging
-import platform
-import uuid
-import wmi
-from typing import Optional
+import threading
+from typing import TYPE_CHECKING, Optional, List, Tuple
+from .offline import load_public_key, verify_token
+from .fingerprint import get_machine_code
+from .keycodec import parse_key, KeyFormatError
+from .transport import HttpTransport, get_transport, parse_retry_after
+from .store import LocalLicenseStore
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """后台验证共用的线程池，首次使用时创建"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='license-validation')
+    return _executor
 
 class LicenseValidator:
-    def __init__(self, server_url: str, config_path: str = "config.json"):
+    def __init__(self, server_url: str, config_path: str = "config.json",
+                 public_key: Optional[str] = None, token_refresh_before: int = 24 * 3600,
+                 machine_cache_path: Optional[str] = None, connect_timeout: float = 3.05,
+                 read_timeout: float = 10, max_retries: int = 3, total_timeout: float = 30,
+                 grace_period: float = 0, key_check: bool = True):
         """
         初始化许可证验证器
         
         Args:
             server_url: 验证服务器地址
             config_path: 配置文件路径
+            public_key: 服务器离线令牌公钥（PEM 内容或文件路径），提供后启用本地验证
+            token_refresh_before: 令牌剩余有效期少于该值（秒）时联网刷新
+            machine_cache_path: 机器码磁盘缓存路径，默认位于用户缓存目录
+            connect_timeout: 连接服务器的超时时间（秒）
+            read_timeout: 等待服务器响应的超时时间（秒）
+            max_retries: 网络错误时的最大重试次数
+            total_timeout: 一次验证包括重试和等待在内的最长时间（秒），超出后按服务器不可达处理
+            grace_period: 联网验证成功后的宽限期（秒），期间服务器不可达时使用本地保存的签名验证记录；
+                0 表示服务器不可达时验证失败（有效的离线令牌除外）
+            key_check: 联网前检查密钥格式和校验位；服务器关闭 LICENSE_KEY_CHECK 并导入了其他系统的密钥时
+                设为 False，无法识别格式的密钥原样交给服务器验证
         """
         self.server_url = server_url
         self.config_file = config_path
+        self.store = LocalLicenseStore(config_path)
+        self.grace_period = grace_period
+        self.key_check = key_check
+        self.public_key = load_public_key(public_key) if public_key else None
+        self.token_refresh_before = token_refresh_before
+        self.machine_cache_path = machine_cache_path
+        self.transport_options = {
+            'connect_timeout': connect_timeout,
+            'read_timeout': read_timeout,
+            'max_retries': max_retries,
+            'total_timeout': total_timeout,
+        }
+        # 服务器返回 429/503 时要求的最早重试时间（time.monotonic()）
+        self._retry_not_before = 0.0
+        
+    @property
+    def transport(self) -> HttpTransport:
+        """与服务器通信的共享连接池"""
+        return get_transport(self.server_url, **self.transport_options)
         
     def get_machine_code(self) -> str:
-        """获取机器唯一标识码"""
-        try:
-            c = wmi.WMI()
-            # 获取CPU序列号
-            cpu = c.Win32_Processor()[0].ProcessorId.strip()
-            # 获取主板序列号
-            board = c.Win32_BaseBoard()[0].SerialNumber.strip()
-            # 获取BIOS序列号
-            bios = c.Win32_BIOS()[0].SerialNumber.strip()
-            
-            # 组合信息并生成唯一标识
-            machine_info = f"{cpu}-{board}-{bios}"
-            return str(uuid.uuid5(uuid.NAMESPACE_DNS, machine_info))
-            
-        except Exception as e:
-            logging.error(f"获取机器码失败: {str(e)}")
-            # 如果获取硬件信息失败，使用系统信息生成备用标识
-            system_info = f"{platform.node()}-{platform.machine()}-{platform.processor()}"
-            return str(uuid.uuid5(uuid.NAMESPACE_DNS, system_info))
+        """获取机器唯一标识码（首次计算后缓存在进程内和磁盘上）"""
+        return get_machine_code(self.machine_cache_path)
     
     def load_license(self) -> Optional[str]:
         """从配置文件加载许可证"""
         try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    return config.get('license_key')
-            return None
+            return self.store.get('license_key')
         except Exception as e:
             logging.error(f"加载许可证失败: {str(e)}")
             return None
     
     def save_license(self, license_key: str) -> bool:
         """保存许可证到配置文件"""
-        try:
-            config = {}
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
+        return self._update_config(license_key=license_key)
             
-            config['license_key'] = license_key
+    def load_token(self) -> Optional[str]:
+        """从配置文件加载离线令牌"""
+        try:
+            return self.store.get('license_token')
+        except Exception as e:
+            logging.error(f"加载离线令牌失败: {str(e)}")
+            return None
             
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=4, ensure_ascii=False)
+    def _update_config(self, **values) -> bool:
+        """更新配置文件中的指定字段，值为 None 时删除该字段"""
+        try:
+            self.store.update(**values)
             return True
-            
         except Exception as e:
             logging.error(f"保存许可证失败: {str(e)}")
             return False
             
+    def _within_grace_period(self, license_key: str, machine_code: str) -> bool:
+        """最近一次联网验证成功是否仍在宽限期内，只在服务器不可达时使用"""
+        if not self.grace_period:
+            return False
+        try:
+            validated_at = self.store.last_validation(license_key, machine_code)
+        except Exception as e:
+            logging.error(f"读取验证记录失败: {str(e)}")
+            return False
+        # 时间晚于当前时间的记录视为无效（系统时间被回拨或记录被修改）
+        return validated_at is not None and 0 <= time.time() - validated_at < self.grace_period
+            
     def validate_license(self, license_key: Optional[str] = None) -> bool:
         """
         验证许可证
         
+        配置了公钥时，优先在本地验证服务器签发的离线令牌，
+        仅在令牌缺失、即将过期或无效时联网验证；联网失败时有效令牌仍然可用。
+        设置了 grace_period 时，服务器不可达且最近一次联网验证成功仍在宽限期内也视为有效。
+        
         Args:
             license_key: 可选的许可证密钥，如果不提供则从配置文件加载
         """
@@ -82,24 +132,120 @@ class LicenseValidator:
                 license_key = self.load_license()
                 if not license_key:
                     return False
+            
+            # 格式或校验位错误的密钥无需联网即可拒绝
+            try:
+                license_key = parse_key(license_key).key
+            except KeyFormatError as e:
+                if self.key_check:
+                    logging.error(f"验证许可证失败: {str(e)}")
+                    return False
+                license_key = license_key.strip()
                 
             machine_code = self.get_machine_code()
+                
+            payload = None
+            if self.public_key is not None:
+                payload = verify_token(self.load_token(), self.public_key, license_key, machine_code)
+                if payload and payload['expires_at'] - time.time() > self.token_refresh_before:
+                    return True
+            
+            if time.monotonic() < self._retry_not_before:
+                # 服务器要求稍后重试，期间只使用本地令牌
+                result = None
+            else:
+                result = self._validate_online(license_key, machine_code)
+            if result is None:
+                # 服务器不可达，令牌仍在有效期内或仍在宽限期内则继续使用
+                return payload is not None or self._within_grace_period(license_key, machine_code)
+                
+            if result.get('valid', False):
+                values = {}
+                if result.get('token') and self.public_key is not None:
+                    values['license_token'] = result['token']
+                if self.grace_period:
+                    values['last_validation'] = self.store.validation_record(license_key, machine_code)
+                if values:
+                    self._update_config(**values)
+                return True
+            # 许可证已被服务器拒绝（禁用、过期等），丢弃本地令牌和验证记录
+            if payload is not None or self.store.get('last_validation') is not None:
+                self._update_config(license_token=None, last_validation=None)
+            return False
             
-            response = requests.post(
-                f"{self.server_url}/validate",
+        except Exception as e:
+            logging.error(f"验证许可证失败: {str(e)}")
+            return False
+            
+    def validate_license_async(self, license_key: Optional[str] = None) -> 'Future':
+        """
+        在后台线程中验证许可证，立即返回 Future
+        
+        适用于非 Qt 程序；Qt 程序可使用 license_system.ui.ValidationThread。
+        
+        Args:
+            license_key: 同 validate_license()
+        """
+        return _get_executor().submit(self.validate_license, license_key)
+            
+    def _validate_online(self, license_key: str, machine_code: str) -> Optional[dict]:
+        """向服务器验证许可证，网络或服务器错误时返回 None"""
+        try:
+            # 验证可以安全重试：重复请求只会多计一次激活次数
+            response = self.transport.post(
+                '/validate',
                 json={
                     'license_key': license_key,
                     'machine_code': machine_code
                 },
-                verify=False,
-                timeout=10
+                idempotent=True
             )
             
             if response.status_code == 200:
-                result = response.json()
-                return result.get('valid', False)
-            return False
+                return response.json()
+            if response.status_code in (429, 503):
+                # 服务器要求稍后重试，在此之前不再联网验证，避免重试加重服务器负担
+                delay = parse_retry_after(response.headers.get('Retry-After'))
+                if delay:
+                    self._retry_not_before = time.monotonic() + delay
+            logging.error(f"验证服务器响应错误: {response.status_code}")
+            return None
             
         except Exception as e:
             logging.error(f"验证许可证失败: {str(e)}")
-            return False 
\ No newline at end of file
+            return None
+
+    def validate_many(self, items: List[Tuple[str, str]]) -> List[dict]:
+        """
+        批量验证许可证，适用于代理多台设备的网关
+
+        Args:
+            items: (license_key, machine_code) 列表
+
+        Returns:
+            与 items 顺序一致的结果列表，每项为 {'valid': bool, 'message': 可选的错误消息}
+        """
+        if not items:
+            return []
+        try:
+            response = self.transport.post(
+                '/validate/batch',
+                json={
+                    'items': [
+                        {'license_key': key, 'machine_code': code}
+                        for key, code in items
+                    ]
+                },
+                idempotent=True,
+                timeout=(self.transport_options['connect_timeout'], 30)
+            )
+            
+            if response.status_code == 200:
+                return response.json()['results']
+            body = response.json()
+            message = body.get('error') or body.get('message') or f"服务器响应错误: {response.status_code}"
+            
+        except Exception as e:
+            logging.error(f"批量验证许可证失败: {str(e)}")
+            message = str(e)
+        return [{'valid': False, 'message': message} for _ in items]
@@ -23,5 +23,6 @@ setup(
     ],
     extras_require={
         "windows": ["wmi>=1.5.1"],
+        "offline": ["cryptography>=3.1"],
     }
 ) 
\ No newline at end of file
@@ -0,0 +1,82 @@
+import os
+import sys
+import atexit
+
+import pytest
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'license_server')
+ADMIN_KEY = 'test-admin-key'
+
+# 每个测试结束后停止并移除的进程内组件，(扩展名, 停止方法)
+_EXTENSIONS = (
+    ('license_maintenance', 'stop'),
+    ('activation_recorder', 'stop'),
+    ('audit_log', 'stop'),
+    ('key_filter', 'save_snapshot'),
+    ('license_db', 'close'),
+)
+
+
+@pytest.fixture(scope='session')
+def server_module(tmp_path_factory):
+    """导入许可证服务器模块，server.log 写入临时目录"""
+    sys.path.insert(0, SERVER_DIR)
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('server'))
+    try:
+        import server
+    finally:
+        os.chdir(cwd)
+    return server
+
+
+def _shutdown(app):
+    db = app.extensions.get('license_db')
+    for name, method in _EXTENSIONS:
+        extension = app.extensions.pop(name, None)
+        if extension is None:
+            continue
+        stop = getattr(extension, method)
+        atexit.unregister(stop)
+        stop(db) if name == 'key_filter' else stop()
+    for name in ('license_cache', 'license_metrics', 'token_signer', 'rate_limiters',
+                 'concurrency_limiter'):
+        app.extensions.pop(name, None)
+
+
+@pytest.fixture
+def app(server_module, tmp_path):
+    """使用临时数据库的服务器，维护线程默认关闭，测试需要时自行开启"""
+    app = server_module.app
+    saved = dict(app.config)
+    app.config.update(
+        ADMIN_KEY=ADMIN_KEY,
+        DATABASE=str(tmp_path / 'licenses.db'),
+        AUDIT_DATABASE=str(tmp_path / 'audit.db'),
+        BACKUP_DIR=str(tmp_path / 'backups'),
+        MAINTENANCE_ENABLED=False,
+    )
+    yield app
+    _shutdown(app)
+    app.config.clear()
+    app.config.update(saved)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_headers():
+    return {'X-Admin-Key': ADMIN_KEY}
+
+
+@pytest.fixture
+def generate(client, admin_headers):
+    """生成一个许可证并返回密钥"""
+    def generate(**body):
+        response = client.post('/admin/generate', json=body, headers=admin_headers)
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()['license_key']
+    return generate
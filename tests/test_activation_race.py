@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+REQUESTS = 300
+CONCURRENCY = 32
+
+
+@pytest.fixture
+def race_app(app):
+    # 所有请求都针对同一个许可证，关闭限流和并发上限
+    app.config.update(RATE_LIMIT_ENABLED=False, MAX_CONCURRENT_REQUESTS=0)
+    return app
+
+
+def _race(app, license_key):
+    """CONCURRENCY 个线程同时开始，每个请求使用不同的机器码，返回 {机器码: 响应}"""
+    results = {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(CONCURRENCY)
+    machine_codes = iter(f'machine-{i}' for i in range(REQUESTS))
+
+    def worker():
+        client = app.test_client()
+        barrier.wait()
+        while True:
+            with lock:
+                machine_code = next(machine_codes, None)
+            if machine_code is None:
+                return
+            response = client.post('/validate', json={'license_key': license_key,
+                                                      'machine_code': machine_code})
+            with lock:
+                results[machine_code] = (response.status_code, response.get_json())
+
+    threads = [threading.Thread(target=worker) for _ in range(CONCURRENCY)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.mark.parametrize('seats', [1, 5])
+def test_concurrent_activation_fills_exactly_the_seats(race_app, server_module, generate, seats):
+    license_key = generate(max_activations=seats)
+
+    results = _race(race_app, license_key)
+
+    assert len(results) == REQUESTS
+    assert {status for status, _ in results.values()} == {200}
+    winners = {machine_code for machine_code, (_, body) in results.items() if body['valid']}
+    assert len(winners) == seats
+    server_module.get_recorder().flush()
+    with server_module.get_db().connection() as conn:
+        machines = {row[0] for row in conn.execute('''
+            SELECT a.machine_code FROM activations a JOIN licenses l ON l.id = a.license_id
+            WHERE l.license_key = ?
+        ''', (license_key,))}
+        activation_count = conn.execute('SELECT activation_count FROM licenses WHERE license_key = ?',
+                                        (license_key,)).fetchone()[0]
+    assert machines == winners
+    assert activation_count == seats
+
+    # 已激活的设备再次验证仍然通过，其他设备仍被拒绝
+    client = race_app.test_client()
+    for machine_code in sorted(winners)[:2] + ['machine-new']:
+        body = client.post('/validate', json={'license_key': license_key,
+                                              'machine_code': machine_code}).get_json()
+        assert body['valid'] is (machine_code in winners)
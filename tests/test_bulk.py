@@ -0,0 +1,117 @@
+import io
+import json
+import sqlite3
+
+import pytest
+
+
+class ProbingUpload(io.BytesIO):
+    """上传过半时从另一个连接尝试获取写锁，记录是否被上传阻塞"""
+
+    def __init__(self, data: bytes, db_path: str):
+        super().__init__(data)
+        self.db_path = db_path
+        self.probed = None
+
+    def _probe(self):
+        if self.probed is None and self.tell() > len(self.getvalue()) // 2:
+            conn = sqlite3.connect(self.db_path, timeout=0.2, isolation_level=None)
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute('ROLLBACK')
+                self.probed = 'ok'
+            except sqlite3.OperationalError as e:
+                self.probed = str(e)
+            finally:
+                conn.close()
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self._probe()
+        return data
+
+    def readline(self, size=-1):
+        line = super().readline(size)
+        self._probe()
+        return line
+
+    def readinto(self, buffer):
+        n = super().readinto(buffer)
+        self._probe()
+        return n
+
+
+def _post_upload(client, path, body, content_type, headers, db_path):
+    upload = ProbingUpload(body, db_path)
+    response = client.post(path, input_stream=upload, content_type=content_type,
+                           content_length=len(body), headers=headers)
+    return response, upload
+
+
+@pytest.mark.parametrize('path', ['/admin/bulk/deactivate', '/admin/bulk/extend?days=7'])
+def test_key_upload_does_not_hold_the_write_lock(app, client, admin_headers, generate, path):
+    keys = [generate() for _ in range(3)]
+    body = '\n'.join(keys * 2000).encode()
+
+    response, upload = _post_upload(client, path, body, 'text/plain', admin_headers,
+                                    app.config['DATABASE'])
+
+    assert upload.probed == 'ok'
+    assert response.get_json()['received'] == 6000
+    assert response.get_json()['matched'] == 3
+
+
+def test_import_upload_does_not_hold_the_write_lock(app, client, admin_headers):
+    app.config['LICENSE_KEY_CHECK'] = False
+    body = ''.join(f'{{"license_key": "legacy-{i:05d}"}}\n' for i in range(6000)).encode()
+
+    response, upload = _post_upload(client, '/admin/bulk/import', body, 'application/x-ndjson',
+                                    admin_headers, app.config['DATABASE'])
+
+    assert upload.probed == 'ok'
+    assert response.get_json()['imported'] == 6000
+
+
+def test_imported_legacy_key_validates_without_key_check(app, client, admin_headers):
+    app.config['LICENSE_KEY_CHECK'] = False
+    response = client.post('/admin/bulk/import', data='{"license_key": "LEGACY-0001-ABCD"}\n',
+                           content_type='application/x-ndjson', headers=admin_headers)
+    assert response.get_json()['imported'] == 1
+
+    result = client.post('/validate', json={'license_key': 'LEGACY-0001-ABCD',
+                                            'machine_code': 'machine-1'}).get_json()
+
+    assert result['valid'] is True
+
+
+def test_import_hint_mentions_client_key_check(client, admin_headers):
+    response = client.post('/admin/bulk/import', data='{"license_key": "LEGACY-0001-ABCD"}\n',
+                           content_type='application/x-ndjson', headers=admin_headers)
+
+    assert response.get_json()['invalid'] == 1
+    assert 'key_check=False' in response.get_json()['hint']
+
+
+def test_import_reports_bad_rows_and_duplicates(app, client, admin_headers, generate):
+    app.config['LICENSE_KEY_CHECK'] = False
+    existing = generate()
+    lines = [
+        {'license_key': 'legacy-a', 'machine_code': 'machine-1'},
+        {'license_key': 'legacy-b', 'machine_code': 42},
+        {'license_key': 'legacy-c', 'machine_code': {'id': 1}},
+        {'license_key': 'legacy-a', 'machine_code': 'machine-2'},
+        {'license_key': existing},
+    ]
+    body = ''.join(json.dumps(line) + '\n' for line in lines)
+
+    response = client.post('/admin/bulk/import', data=body, content_type='application/x-ndjson',
+                           headers=admin_headers)
+
+    assert response.status_code == 200
+    result = response.get_json()
+    assert (result['received'], result['imported'], result['skipped'], result['duplicates'],
+            result['invalid']) == (5, 1, 1, 1, 2)
+    assert [error['line'] for error in result['errors']] == [2, 3]
+    assert all('machine_code' in error['error'] for error in result['errors'])
+    activations = client.get('/admin/activations?license_key=legacy-a', headers=admin_headers).get_json()
+    assert [item['machine_code'] for item in activations['activations']] == ['machine-1']
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from license_system import LicenseValidator
+
+LEGACY_KEY = 'LEGACY-0001-ABCD'
+
+
+@pytest.fixture
+def validator_factory(tmp_path, monkeypatch):
+    """联网验证被替换为记录请求，返回 (validator, 发送给服务器的密钥列表)"""
+    def factory(**options):
+        validator = LicenseValidator('http://license.invalid', config_path=str(tmp_path / 'config.json'),
+                                     **options)
+        sent = []
+
+        def validate_online(license_key, machine_code):
+            sent.append(license_key)
+            return {'valid': True}
+        monkeypatch.setattr(validator, 'get_machine_code', lambda: 'machine-1')
+        monkeypatch.setattr(validator, '_validate_online', validate_online)
+        return validator, sent
+    return factory
+
+
+def test_unrecognised_key_is_rejected_locally_by_default(validator_factory):
+    validator, sent = validator_factory()
+
+    assert validator.validate_license(LEGACY_KEY) is False
+    assert sent == []
+
+
+def test_unrecognised_key_is_sent_to_server_without_key_check(validator_factory):
+    validator, sent = validator_factory(key_check=False)
+
+    assert validator.validate_license(f'  {LEGACY_KEY} ') is True
+    assert sent == [LEGACY_KEY]
+
+
+def test_dialog_accepts_any_key_without_key_check(validator_factory):
+    pytest.importorskip('PyQt6.QtWidgets')
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtWidgets import QApplication
+    from license_system import LicenseDialog
+
+    app = QApplication.instance() or QApplication([])
+    strict = LicenseDialog(validator=validator_factory()[0])
+    relaxed = LicenseDialog(validator=validator_factory(key_check=False)[0])
+    for dialog in (strict, relaxed):
+        dialog.key_input.setText(LEGACY_KEY)
+
+    assert strict.activate_btn.isEnabled() is False
+    assert relaxed.activate_btn.isEnabled() is True
+    assert relaxed.get_license_key() == LEGACY_KEY
+    app.processEvents()
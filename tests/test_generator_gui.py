@@ -0,0 +1,43 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+pytest.importorskip('PyQt6.QtWidgets')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_gui_import_does_not_load_requests(tmp_path):
+    code = 'import sys, license_generator.gui; print("requests" in sys.modules)'
+    env = dict(os.environ, PYTHONPATH=ROOT, QT_QPA_PLATFORM='offscreen')
+    output = subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, check=True).stdout
+
+    assert output.strip() == 'False'
+
+
+def test_single_keys_share_one_export_writer(tmp_path, monkeypatch):
+    monkeypatch.setenv('QT_QPA_PLATFORM', 'offscreen')
+    monkeypatch.chdir(tmp_path)
+    from PyQt6.QtWidgets import QApplication
+    from license_generator import gui
+
+    app = QApplication.instance() or QApplication([])
+    (tmp_path / gui.SINGLE_KEYS_FILE).write_text('密钥: OLD | 有效期至: 永久有效\n', encoding='utf-8')
+
+    window = gui.LicenseGeneratorWindow()
+    try:
+        window.handle_success({'license_key': 'KEY-1'})
+        writer = window.single_writer
+        window.handle_success({'license_key': 'KEY-2'})
+        assert window.single_writer is writer
+        lines = (tmp_path / gui.SINGLE_KEYS_FILE).read_text(encoding='utf-8').splitlines()
+        assert lines == ['密钥: OLD | 有效期至: 永久有效',
+                         '密钥: KEY-1 | 有效期至: 永久有效',
+                         '密钥: KEY-2 | 有效期至: 永久有效']
+    finally:
+        window.close()
+        app.processEvents()
+    assert window.single_writer is None
@@ -0,0 +1,76 @@
+import json
+import time
+
+import pytest
+
+from license_system import LicenseValidator
+
+LICENSE_KEY = 'LEGACY-0001-ABCD'
+DAY = 86400
+
+
+@pytest.fixture
+def validator(tmp_path, monkeypatch):
+    """宽限期一天的验证器，server 列表依次给出每次联网验证的结果，None 表示服务器不可达"""
+    validator = LicenseValidator('http://license.invalid', config_path=str(tmp_path / 'config.json'),
+                                 grace_period=DAY, key_check=False)
+    validator.server = []
+    validator.requests = 0
+
+    def validate_online(license_key, machine_code):
+        validator.requests += 1
+        return validator.server.pop(0)
+    monkeypatch.setattr(validator, 'get_machine_code', lambda: 'machine-1')
+    monkeypatch.setattr(validator, '_validate_online', validate_online)
+    return validator
+
+
+def _edit_record(validator, **values):
+    with open(validator.config_file, encoding='utf-8') as f:
+        config = json.load(f)
+    config['last_validation'].update(values)
+    with open(validator.config_file, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+
+
+def test_server_is_contacted_within_grace_period(validator):
+    validator.server = [{'valid': True}, {'valid': False}]
+
+    assert validator.validate_license(LICENSE_KEY) is True
+    assert validator.validate_license(LICENSE_KEY) is False
+    assert validator.requests == 2
+    assert validator.store.get('last_validation') is None
+
+
+def test_grace_period_covers_server_outage(validator, monkeypatch):
+    validator.server = [{'valid': True}, None]
+    assert validator.validate_license(LICENSE_KEY) is True
+    assert validator.validate_license(LICENSE_KEY) is True
+
+    # 两天前联网验证成功的有效记录，已超出宽限期
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now - 2 * DAY)
+    record = validator.store.validation_record(LICENSE_KEY, 'machine-1')
+    monkeypatch.setattr(time, 'time', lambda: now)
+    validator.store.update(last_validation=record)
+    validator.server = [None]
+    assert validator.validate_license(LICENSE_KEY) is False
+
+
+def test_edited_record_is_ignored(validator):
+    validator.server = [{'valid': True}]
+    assert validator.validate_license(LICENSE_KEY) is True
+    record = validator.store.get('last_validation')
+
+    # 把过期的记录改回当前时间，签名不再匹配
+    _edit_record(validator, validated_at=record['validated_at'] + DAY)
+    validator.server = [None]
+    assert validator.validate_license(LICENSE_KEY) is False
+
+    _edit_record(validator, validated_at=record['validated_at'], signature=None)
+    validator.server = [None]
+    assert validator.validate_license(LICENSE_KEY) is False
+
+    _edit_record(validator, signature=record['signature'])
+    validator.server = [None]
+    assert validator.validate_license(LICENSE_KEY) is True
@@ -0,0 +1,21 @@
+import uuid
+
+
+def _search(client, admin_headers, text):
+    response = client.get('/admin/licenses', query_string={'search': text}, headers=admin_headers)
+    assert response.status_code == 200
+    return [item['license_key'] for item in response.get_json()]
+
+
+def test_search_matches_lowercase_keys_typed_in_uppercase(app, client, admin_headers, generate):
+    app.config['LICENSE_KEY_CHECK'] = False
+    legacy = str(uuid.uuid4())
+    response = client.post('/admin/bulk/import', data=f'{{"license_key": "{legacy}"}}\n',
+                           content_type='application/x-ndjson', headers=admin_headers)
+    assert response.get_json()['imported'] == 1
+    app.config['LICENSE_KEY_CHECK'] = True
+    current = generate()
+
+    assert _search(client, admin_headers, legacy[:8].upper()) == [legacy]
+    assert _search(client, admin_headers, legacy[:8]) == [legacy]
+    assert _search(client, admin_headers, current[:7].lower()) == [current]
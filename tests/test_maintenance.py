@@ -0,0 +1,155 @@
+import os
+import time
+import sqlite3
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def maintenance(app, server_module):
+    """开启维护线程但不自动执行任何任务，测试中直接调用 run_job()"""
+    app.config.update(
+        MAINTENANCE_ENABLED=True,
+        BACKUP_INTERVAL=0,
+        BACKUP_KEEP=2,
+        BACKUP_STEP_PAGES=4,
+        BACKUP_STEP_SLEEP=0,
+        EXPIRY_SWEEP_INTERVAL=0,
+        CHECKPOINT_INTERVAL=0,
+        OPTIMIZE_INTERVAL=0,
+        VACUUM_INTERVAL=0,
+    )
+    return server_module.get_maintenance()
+
+
+def _generate_many(client, admin_headers, count):
+    response = client.post('/admin/generate', json={'count': count}, headers=admin_headers)
+    assert response.status_code == 200
+    return [line for line in response.get_data(as_text=True).splitlines() if line]
+
+
+def _set_expiry(server_module, license_key, expires_at):
+    with server_module.get_db().transaction() as conn:
+        conn.execute('UPDATE licenses SET expires_at = ? WHERE license_key = ?', (expires_at, license_key))
+
+
+def test_backup_is_complete_and_rotated(maintenance, client, admin_headers):
+    _generate_many(client, admin_headers, 2000)
+    os.makedirs(maintenance.backup_dir)
+    for day in (1, 2, 3):
+        open(os.path.join(maintenance.backup_dir, f'licenses-2020010{day}-000000.db'), 'wb').close()
+
+    job = maintenance.run_job('backup')
+
+    assert job['status'] == 'ok'
+    assert job['pages'] > 0 and job['steps'] > 1
+    assert sorted(job['removed']) == ['licenses-20200101-000000.db', 'licenses-20200102-000000.db']
+    backups = maintenance.backups()
+    assert backups[1:] == ['licenses-20200103-000000.db']
+    backup = sqlite3.connect(os.path.join(maintenance.backup_dir, backups[0]))
+    try:
+        assert backup.execute('SELECT COUNT(*) FROM licenses').fetchone()[0] == 2000
+        assert backup.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+        assert backup.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    finally:
+        backup.close()
+    assert not [name for name in os.listdir(maintenance.backup_dir) if name.endswith('.tmp')]
+
+
+def test_backup_finishes_during_concurrent_writes(maintenance, app, admin_headers):
+    client = app.test_client()
+    _generate_many(client, admin_headers, 2000)
+    stop = threading.Event()
+    written = []
+
+    def writer():
+        writer_client = app.test_client()
+        while not stop.is_set():
+            response = writer_client.post('/admin/generate', json={}, headers=admin_headers)
+            written.append(response.status_code)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        maintenance.backup_step_pages = 1
+        job = maintenance.run_job('backup')
+    finally:
+        stop.set()
+        thread.join()
+
+    assert job['status'] == 'ok'
+    assert written and set(written) == {200}
+    backup = sqlite3.connect(job['path'])
+    try:
+        assert 2000 <= backup.execute('SELECT COUNT(*) FROM licenses').fetchone()[0] <= 2000 + len(written)
+    finally:
+        backup.close()
+
+
+def test_expiry_sweep_deactivates_after_grace_period(maintenance, server_module, client, generate):
+    long_expired, recently_expired, current = generate(), generate(), generate()
+    day = 86400
+    _set_expiry(server_module, long_expired, int(time.time()) - 40 * day)
+    _set_expiry(server_module, recently_expired, int(time.time()) - day)
+    _set_expiry(server_module, current, int(time.time()) + day)
+
+    def validate(license_key):
+        return client.post('/validate', json={'license_key': license_key,
+                                              'machine_code': 'machine-1'}).get_json()
+
+    assert validate(long_expired)['message'] == '许可证已过期'
+
+    job = maintenance.run_job('expiry_sweep')
+
+    assert job['status'] == 'ok' and job['deactivated'] == 1
+    assert validate(long_expired)['message'] == '许可证已被禁用'
+    assert validate(recently_expired)['message'] == '许可证已过期'
+    assert validate(current)['valid'] is True
+    assert maintenance.run_job('expiry_sweep')['deactivated'] == 0
+
+
+def test_vacuum_releases_free_pages(maintenance, server_module, client, admin_headers):
+    _generate_many(client, admin_headers, 2000)
+    with server_module.get_db().transaction() as conn:
+        conn.execute('DELETE FROM licenses')
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    assert free > 0
+
+    job = maintenance.run_job('vacuum')
+
+    assert job['status'] == 'ok'
+    assert job['pages'] == free and job['free_pages'] == 0
+
+
+def test_each_job_runs_once_per_period_across_processes(maintenance, server_module):
+    other = server_module.MaintenanceScheduler(server_module.get_db(), maintenance.backup_dir,
+                                               expiry_interval=3600)
+    maintenance._jobs['expiry_sweep']['interval'] = 3600
+
+    assert maintenance._due('expiry_sweep') is True
+    assert other._due('expiry_sweep') is False
+
+
+def test_status_endpoint_reports_jobs(maintenance, client, admin_headers):
+    response = client.post('/admin/maintenance/run', json={'job': 'backup'}, headers=admin_headers)
+    assert response.status_code == 202
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        status = client.get('/admin/maintenance', headers=admin_headers).get_json()
+        if status['jobs']['backup']['runs']:
+            break
+        time.sleep(0.05)
+    backup = status['jobs']['backup']
+    assert backup['status'] == 'ok'
+    assert backup['pages'] > 0 and backup['duration'] is not None
+    assert status['backups'] == [os.path.basename(backup['path'])]
+
+    response = client.post('/admin/maintenance/run', json={'job': 'drop'}, headers=admin_headers)
+    assert response.status_code == 400
+    assert client.get('/admin/maintenance').status_code == 401
+
+
+def test_status_endpoint_when_disabled(client, admin_headers):
+    assert client.get('/admin/maintenance', headers=admin_headers).status_code == 404
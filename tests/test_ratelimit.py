@@ -0,0 +1,39 @@
+import pytest
+
+
+@pytest.fixture
+def rate_limited(app):
+    app.config.update(RATE_LIMIT_ENABLED=True, RATE_LIMIT_KEY_RATE=1, RATE_LIMIT_KEY_BURST=10)
+    return app
+
+
+def _validate(client, license_key, machine_code, ip):
+    return client.post('/validate', json={'license_key': license_key, 'machine_code': machine_code},
+                       environ_base={'REMOTE_ADDR': ip})
+
+
+def test_multi_seat_license_is_not_throttled_below_its_seats(rate_limited, client, generate):
+    license_key = generate(max_activations=50)
+
+    responses = [_validate(client, license_key, f'machine-{i}', f'10.0.0.{i}') for i in range(50)]
+
+    assert [response.status_code for response in responses] == [200] * 50
+    assert all(response.get_json()['valid'] for response in responses)
+
+
+def test_multi_seat_batch_is_not_throttled_below_its_seats(rate_limited, client, generate):
+    license_key = generate(max_activations=50)
+    items = [{'license_key': license_key, 'machine_code': f'machine-{i}'} for i in range(50)]
+
+    results = client.post('/validate/batch', json={'items': items}).get_json()['results']
+
+    assert all(result['valid'] for result in results)
+
+
+def test_single_seat_license_keeps_its_burst(rate_limited, client, generate):
+    license_key = generate()
+
+    responses = [_validate(client, license_key, 'machine-1', f'10.0.1.{i}') for i in range(12)]
+
+    assert [response.status_code for response in responses] == [200] * 10 + [429] * 2
+    assert responses[-1].headers['Retry-After'] == '1'
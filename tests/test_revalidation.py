@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+import pytest
+
+QtCore = pytest.importorskip('PyQt6.QtCore')
+sip = pytest.importorskip('PyQt6.sip')
+
+from license_system.ui.validation import RevalidationScheduler
+
+
+class BlockingValidator:
+    """验证一直阻塞到测试放行，模拟服务器缓慢或传输层正在重试"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def validate_license(self, license_key=None):
+        self.started.set()
+        self.release.wait(10)
+        return False
+
+
+@pytest.fixture(scope='module')
+def qt_app():
+    # 使用 QApplication，同一进程中后续需要窗口部件的测试可以复用
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+def _drain(qt_app, timeout=5):
+    """处理事件直到所有验证线程结束并被释放"""
+    deadline = time.monotonic() + timeout
+    while RevalidationScheduler._running_threads and time.monotonic() < deadline:
+        qt_app.processEvents()
+        QtCore.QCoreApplication.sendPostedEvents(None, QtCore.QEvent.Type.DeferredDelete.value)
+        time.sleep(0.01)
+    assert not RevalidationScheduler._running_threads
+
+
+def test_owner_destroyed_during_check(qt_app):
+    validator = BlockingValidator()
+    window = QtCore.QObject()
+    scheduler = RevalidationScheduler(validator, parent=window)
+    results = []
+    scheduler.checked.connect(results.append)
+
+    scheduler.check_now()
+    assert validator.started.wait(5)
+    sip.delete(window)
+    validator.release.set()
+
+    _drain(qt_app)
+    assert results == []
+
+
+def test_stop_detaches_running_check(qt_app):
+    validator = BlockingValidator()
+    scheduler = RevalidationScheduler(validator)
+    results, invalidated = [], []
+    scheduler.checked.connect(results.append)
+    scheduler.invalidated.connect(lambda: invalidated.append(True))
+
+    scheduler.start(check_immediately=True)
+    assert validator.started.wait(5)
+    scheduler.stop()
+    validator.release.set()
+    RevalidationScheduler.wait_for_threads()
+
+    _drain(qt_app)
+    assert results == [] and invalidated == []
+
+
+def test_results_are_delivered(qt_app):
+    validator = BlockingValidator()
+    validator.release.set()
+    scheduler = RevalidationScheduler(validator)
+    results = []
+    scheduler.checked.connect(results.append)
+
+    scheduler.check_now()
+    deadline = time.monotonic() + 5
+    while not results and time.monotonic() < deadline:
+        qt_app.processEvents()
+        time.sleep(0.01)
+
+    assert results == [False]
+    _drain(qt_app)
+    scheduler.check_now()
+    assert scheduler._thread is not None
+    scheduler.stop()
+    RevalidationScheduler.wait_for_threads()
+    _drain(qt_app)
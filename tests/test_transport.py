@@ -0,0 +1,84 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+requests = pytest.importorskip('requests')
+
+from license_system.transport import HttpTransport
+
+
+class Handler(BaseHTTPRequestHandler):
+    """按 server.behaviour 响应：('status', 状态码, Retry-After) 或 ('sleep', 秒数)"""
+
+    def do_POST(self):
+        self.server.requests += 1
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        behaviour = self.server.behaviour
+        if behaviour[0] == 'sleep':
+            time.sleep(behaviour[1])
+            status, headers = 200, {}
+        else:
+            status, headers = behaviour[1], {'Retry-After': behaviour[2]}
+        body = b'{}'
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.daemon_threads = True
+    httpd.requests = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _transport(server, **options):
+    return HttpTransport(f'http://127.0.0.1:{server.server_address[1]}', **options)
+
+
+def test_retry_after_beyond_deadline_returns_last_response(server):
+    server.behaviour = ('status', 503, '5')
+    transport = _transport(server, total_timeout=1)
+
+    started = time.monotonic()
+    response = transport.post('/validate', json={}, idempotent=True)
+
+    assert response.status_code == 503
+    assert time.monotonic() - started < 1
+    assert server.requests == 1
+
+
+def test_read_timeouts_stop_at_deadline(server):
+    server.behaviour = ('sleep', 3)
+    transport = _transport(server, read_timeout=10, total_timeout=1)
+
+    started = time.monotonic()
+    with pytest.raises(requests.exceptions.Timeout):
+        transport.post('/validate', json={}, idempotent=True)
+
+    assert time.monotonic() - started < 2
+    assert server.requests == 1
+
+
+def test_retries_within_deadline(server):
+    server.behaviour = ('status', 503, '0')
+    transport = _transport(server, max_retries=2, total_timeout=5)
+
+    response = transport.post('/validate', json={}, idempotent=True)
+
+    assert response.status_code == 503
+    assert server.requests == 3
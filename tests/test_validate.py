@@ -0,0 +1,57 @@
+import pytest
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'data': 'not json', 'content_type': 'text/plain'},
+    {'data': '', 'content_type': 'application/json'},
+    {'json': ['license_key', 'machine_code']},
+])
+def test_validate_rejects_non_object_body(client, kwargs):
+    response = client.post('/validate', **kwargs)
+
+    assert response.is_json
+    assert response.get_json()['valid'] is False
+
+
+@pytest.mark.parametrize('body', [
+    {'license_key': ['a', 'b'], 'machine_code': 'machine-1'},
+    {'license_key': {'key': 'value'}, 'machine_code': 'machine-1'},
+    {'license_key': 'placeholder', 'machine_code': ['machine-1']},
+])
+def test_validate_rejects_non_string_fields(client, generate, body):
+    if body['license_key'] == 'placeholder':
+        body = dict(body, license_key=generate())
+
+    response = client.post('/validate', json=body)
+
+    assert response.get_json() == {'valid': False, 'message': '参数格式不正确'}
+
+
+def test_batch_rejects_only_items_with_non_string_fields(client, generate):
+    license_key = generate()
+    items = [
+        {'license_key': ['not', 'hashable'], 'machine_code': 'machine-1'},
+        {'license_key': {'nested': 1}, 'machine_code': 'machine-1'},
+        {'license_key': license_key, 'machine_code': {'nested': 1}},
+        {'license_key': license_key, 'machine_code': 'machine-1'},
+        {'license_key': license_key},
+    ]
+
+    response = client.post('/validate/batch', json={'items': items})
+
+    assert response.status_code == 200
+    assert response.get_json()['results'] == [
+        {'valid': False, 'message': '参数格式不正确'},
+        {'valid': False, 'message': '参数格式不正确'},
+        {'valid': False, 'message': '参数格式不正确'},
+        {'valid': True},
+        {'valid': False, 'message': '缺少必要参数'},
+    ]
+
+
+@pytest.mark.parametrize('value', [True, False])
+def test_boolean_timestamp_is_rejected(client, admin_headers, value):
+    response = client.post('/admin/generate', json={'expires_at': value}, headers=admin_headers)
+
+    assert response.status_code == 400
+    assert '时间格式' in response.get_json()['error']